@@ -1,11 +1,18 @@
 # backend/api/auth.py
 
-from fastapi import APIRouter, HTTPException
-from backend.models.auth_schemas import LoginRequest, TokenResponse, RefreshRequest
+from fastapi import APIRouter, HTTPException, Depends
+from backend.models.auth_schemas import LoginRequest, TokenResponse, RefreshRequest, LogoutResponse
+from backend.models.schemas import CacheStatsResponse
 from backend.utils.jwt_handler import (
     create_access_token,
     create_refresh_token,
-    decode_token
+    decode_token,
+    is_revoked,
+    new_session,
+    revoke_session,
+    revoke_token,
+    token_cache,
+    verify_token,
 )
 
 router = APIRouter(prefix="/api/auth")
@@ -24,7 +31,7 @@ def login(data: LoginRequest):
     if data.username not in valid_credentials or valid_credentials[data.username] != data.password:
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
-    user_data = {"sub": data.username}
+    user_data = {"sub": data.username, "sid": new_session()}
 
     access_token = create_access_token(user_data)
     refresh_token = create_refresh_token(user_data)
@@ -36,21 +43,46 @@ def login(data: LoginRequest):
 
 
 # ----- 2. Refresh Token Endpoint -----
+def _decode_refresh(token: str) -> dict:
+    try:
+        payload = decode_token(token)
+    except Exception:
+        raise HTTPException(status_code=401, detail="Token expired or invalid")
+
+    if payload.get("type") != "refresh" or not payload.get("jti") or not payload.get("sid"):
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    return payload
+
+
 @router.post("/refresh", response_model=TokenResponse)
 def refresh_token(data: RefreshRequest):
-    try:
-        payload = decode_token(data.refresh_token)
+    payload = _decode_refresh(data.refresh_token)
 
-        if payload.get("type") != "refresh":
-            raise HTTPException(status_code=401, detail="Invalid refresh token")
+    if is_revoked({"sid": payload["sid"]}):
+        raise HTTPException(status_code=401, detail="Session has been revoked")
 
-        new_access = create_access_token({"sub": payload["sub"]})
-        new_refresh = create_refresh_token({"sub": payload["sub"]})
+    # Rotate: each refresh token is accepted exactly once. Seeing one again
+    # means it leaked, so the whole session is shut down.
+    if not revoke_token(payload["jti"], payload["exp"]):
+        revoke_session(payload["sid"])
+        raise HTTPException(status_code=401, detail="Refresh token has been revoked")
 
-        return TokenResponse(
-            access_token=new_access,
-            refresh_token=new_refresh
-        )
+    user_data = {"sub": payload["sub"], "sid": payload["sid"]}
+    return TokenResponse(
+        access_token=create_access_token(user_data),
+        refresh_token=create_refresh_token(user_data)
+    )
 
-    except Exception:
-        raise HTTPException(status_code=401, detail="Token expired or invalid")
+
+@router.post("/logout", response_model=LogoutResponse)
+def logout(data: RefreshRequest):
+    """Revoke the session: its refresh and access tokens stop working."""
+    payload = _decode_refresh(data.refresh_token)
+    revoke_session(payload["sid"])
+    return LogoutResponse(status="logged_out")
+
+
+# ----- 4. Token Cache Stats -----
+@router.get("/token-cache", response_model=CacheStatsResponse)
+def token_cache_stats(user=Depends(verify_token)):
+    return CacheStatsResponse(**token_cache.stats())
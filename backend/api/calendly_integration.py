@@ -1,36 +1,85 @@
-from fastapi import APIRouter, HTTPException, Depends
+from typing import Optional
 
+from fastapi import APIRouter, HTTPException, Depends, Header, Response
+from fastapi.responses import StreamingResponse
+
+from backend.db.async_database import run_read, run_write
 from backend.db.database import APPOINTMENT_TYPES
 from backend.models.schemas import (
     AvailabilityResponse,
+    CacheStatsResponse,
+    NextAvailableResponse,
+    OpenSlot,
     TimeSlot,
+    TypedAvailabilityResponse,
     BookingRequest,
     BookingResponse,
+    BulkBookingRequest,
+    BulkBookingResponse,
+    BulkBookingResult,
     RescheduleRequest,
     RescheduleResponse,
     DeleteResponse,
 )
-from backend.tools.availability_tool import generate_daily_slots
+from backend.tools.availability_tool import (
+    availability_etag,
+    find_next_available,
+    generate_daily_slots,
+    generate_range_slots,
+    generate_range_slots_by_type,
+    generate_slots_by_type,
+    parse_appointment_types,
+    parse_date_range,
+    slot_cache,
+)
 from backend.tools.booking_tool import (
     book_appointment,
+    book_appointments,
     delete_appointment,
     reschedule_appointment,
+    InvalidBookingError,
 )
 from backend.utils.jwt_handler import verify_token
 
 router = APIRouter(prefix="/api/calendly")
 
 
+def _not_modified(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def _validators(etag: str):
+    # Clients may keep the body but must revalidate before reusing it
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
 @router.get("/availability", response_model=AvailabilityResponse)
-def get_availability(
+async def get_availability(
     date: str,
     appointment_type: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     user=Depends(verify_token),                # ← Protect this route
 ):
+    """Slots for one date; polls with a matching If-None-Match get 304."""
     if appointment_type not in APPOINTMENT_TYPES:
         raise HTTPException(status_code=400, detail="Invalid appointment type")
+    try:
+        etag = await run_read(availability_etag, date)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    if _not_modified(if_none_match, etag):
+        return Response(status_code=304, headers=_validators(etag))
+    response.headers.update(_validators(etag))
 
-    slots = generate_daily_slots(date, appointment_type)
+    try:
+        slots = await run_read(generate_daily_slots, date, appointment_type)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
 
     return AvailabilityResponse(
         date=date,
@@ -38,13 +87,137 @@ def get_availability(
     )
 
 
+@router.get("/availability/range")
+def get_availability_range(
+    start_date: str,
+    end_date: str,
+    appointment_type: str,
+    user=Depends(verify_token),
+):
+    """Stream one AvailabilityResponse per day as newline-delimited JSON."""
+    if appointment_type not in APPOINTMENT_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid appointment type")
+
+    try:
+        first, last = parse_date_range(start_date, end_date)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    def lines():
+        for date, slots in generate_range_slots(first, last, appointment_type):
+            response = AvailabilityResponse(
+                date=date,
+                available_slots=[TimeSlot(**slot) for slot in slots],
+            )
+            yield response.model_dump_json() + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def _typed_availability(date, slots_by_type):
+    return TypedAvailabilityResponse(
+        date=date,
+        slots_by_type={
+            appointment_type: [TimeSlot(**slot) for slot in slots]
+            for appointment_type, slots in slots_by_type.items()
+        },
+    )
+
+
+@router.get("/availability/types", response_model=TypedAvailabilityResponse)
+async def get_availability_by_type(
+    date: str,
+    response: Response,
+    appointment_types: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    user=Depends(verify_token),
+):
+    """Slots for several appointment types (default all) on one date."""
+    try:
+        selected = parse_appointment_types(appointment_types)
+        etag = await run_read(availability_etag, date)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    if _not_modified(if_none_match, etag):
+        return Response(status_code=304, headers=_validators(etag))
+    response.headers.update(_validators(etag))
+
+    try:
+        slots_by_type = await run_read(generate_slots_by_type, date, selected)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    return _typed_availability(date, slots_by_type)
+
+
+@router.get("/availability/types/range")
+def get_availability_by_type_range(
+    start_date: str,
+    end_date: str,
+    appointment_types: Optional[str] = None,
+    user=Depends(verify_token),
+):
+    """Stream one TypedAvailabilityResponse per day as newline-delimited JSON."""
+    try:
+        selected = parse_appointment_types(appointment_types)
+        first, last = parse_date_range(start_date, end_date)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    def lines():
+        for date, slots_by_type in generate_range_slots_by_type(first, last, selected):
+            yield _typed_availability(date, slots_by_type).model_dump_json() + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/availability/next", response_model=NextAvailableResponse)
+async def get_next_available(
+    appointment_type: str,
+    start_date: str,
+    window_start: Optional[str] = None,
+    window_end: Optional[str] = None,
+    horizon_days: int = 30,
+    limit: int = 5,
+    user=Depends(verify_token),
+):
+    """Earliest free slots from start_date on, optionally within a time-of-day window."""
+    if appointment_type not in APPOINTMENT_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid appointment type")
+
+    try:
+        slots, searched = await run_read(
+            find_next_available,
+            appointment_type,
+            start_date,
+            horizon_days,
+            limit,
+            window_start,
+            window_end,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    return NextAvailableResponse(
+        appointment_type=appointment_type,
+        slots=[OpenSlot(**slot) for slot in slots],
+        days_searched=searched,
+    )
+
+
+@router.get("/availability/cache", response_model=CacheStatsResponse)
+def get_availability_cache_stats(user=Depends(verify_token)):
+    return CacheStatsResponse(**slot_cache.stats())
+
+
 @router.post("/book", response_model=BookingResponse)
-def book(
+async def book(
     data: BookingRequest,
     user=Depends(verify_token),                # ← Protect this route
 ):
     try:
-        result = book_appointment(data)
+        result = await run_write(book_appointment, data)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
@@ -56,10 +229,36 @@ def book(
     )
 
 
+@router.post("/book/bulk", response_model=BulkBookingResponse)
+async def book_bulk(
+    data: BulkBookingRequest,
+    user=Depends(verify_token),
+):
+    """Book many appointments in one write; see book_appointments."""
+    try:
+        results = await run_write(book_appointments, data.bookings, data.atomic)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    booked = sum(result["status"] == "confirmed" for result in results)
+    if booked == len(results):
+        overall = "confirmed"
+    elif booked:
+        overall = "partial"
+    else:
+        overall = "rejected"
+
+    return BulkBookingResponse(
+        status=overall,
+        booked=booked,
+        results=[BulkBookingResult(**result) for result in results],
+    )
+
+
 @router.delete("/appointments/{appointment_id}", response_model=DeleteResponse)
-def delete(appointment_id: str, user=Depends(verify_token)):
+async def delete(appointment_id: str, user=Depends(verify_token)):
     try:
-        delete_appointment(appointment_id)
+        await run_write(delete_appointment, appointment_id)
     except ValueError as exc:
         raise HTTPException(status_code=404, detail=str(exc)) from exc
 
@@ -74,7 +273,7 @@ def delete(appointment_id: str, user=Depends(verify_token)):
     "/appointments/{appointment_id}/reschedule",
     response_model=RescheduleResponse,
 )
-def reschedule(
+async def reschedule(
     appointment_id: str,
     data: RescheduleRequest,
     user=Depends(verify_token),
@@ -87,7 +286,9 @@ def reschedule(
         )
 
     try:
-        result = reschedule_appointment(data)
+        result = await run_write(reschedule_appointment, data)
+    except InvalidBookingError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
     except ValueError as exc:
         status = 400 if "available" in str(exc).lower() else 404
         raise HTTPException(status_code=status, detail=str(exc)) from exc
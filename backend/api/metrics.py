@@ -0,0 +1,36 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from backend.db import database
+from backend.tools.availability_tool import slot_cache
+from backend.utils.jwt_handler import token_cache
+from backend.utils.metrics import (
+    appointments_resident,
+    cache_entries,
+    cache_hit_ratio,
+    cache_hits,
+    cache_misses,
+    registry,
+)
+
+router = APIRouter()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _collect() -> None:
+    # Point-in-time values are read at scrape time rather than tracked
+    for name, cache in (("availability", slot_cache), ("token", token_cache)):
+        stats = cache.stats()
+        cache_hits.set(stats["hits"], cache=name)
+        cache_misses.set(stats["misses"], cache=name)
+        cache_hit_ratio.set(stats["hit_ratio"], cache=name)
+        cache_entries.set(stats["size"], cache=name)
+    appointments_resident.set(database.get_store().count(), storage=database.STORAGE_MODE)
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """Prometheus text exposition of this worker's metrics."""
+    _collect()
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,80 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+
+from backend.db import database
+from backend.db.store import NOT_READY
+from backend.utils import profiling
+
+T = TypeVar("T")
+
+# Writes fsync and hold the writer lock, so they get their own small pool
+# rather than competing with sync routes for Starlette's default threads.
+STORAGE_WRITE_WORKERS = int(os.getenv("STORAGE_WRITE_WORKERS", "4"))
+
+_write_executor = ThreadPoolExecutor(
+    max_workers=STORAGE_WRITE_WORKERS, thread_name_prefix="storage-write"
+)
+
+
+async def run_read(fn: Callable[..., T], *args: Any) -> T:
+    """Run a read against the store without blocking the event loop.
+
+    When the store is warm and unchanged the read only touches memory, so it
+    runs inline; otherwise it goes to the threadpool, where a reload or poll
+    may block on I/O or on a writer.
+    """
+    result = database.get_store().read_nowait(fn, *args)
+    if result is not NOT_READY:
+        return result
+    profile = profiling.current()
+    if profile is not None:
+        return await run_in_threadpool(profile.run, fn, *args)
+    return await run_in_threadpool(fn, *args)
+
+
+async def run_write(fn: Callable[..., T], *args: Any) -> T:
+    """Run ``fn`` on the storage write executor."""
+    loop = asyncio.get_running_loop()
+    profile = profiling.current()
+    if profile is not None:
+        fn, args = profile.run, (fn, *args)
+    call = functools.partial(contextvars.copy_context().run, fn, *args)
+    return await loop.run_in_executor(_write_executor, call)
+
+
+async def load_appointments() -> List[Dict[str, Any]]:
+    return await run_read(database.load_appointments)
+
+
+async def get_appointment(appointment_id: str) -> Optional[Dict[str, Any]]:
+    return await run_read(database.get_appointment, appointment_id)
+
+
+async def appointments_on(date: str) -> List[Dict[str, Any]]:
+    return await run_read(database.appointments_on, date)
+
+
+async def booked_intervals(date: str) -> List[Tuple[int, int, str]]:
+    return await run_read(database.booked_intervals, date)
+
+
+async def upsert_appointment(appointment: Dict[str, Any]) -> None:
+    await run_write(database.upsert_appointment, appointment)
+
+
+async def upsert_appointments(appointments: List[Dict[str, Any]]) -> None:
+    await run_write(database.upsert_appointments, appointments)
+
+
+async def replace_appointment(appointment: Dict[str, Any]) -> bool:
+    return await run_write(database.replace_appointment, appointment)
+
+
+async def remove_appointment(appointment_id: str) -> Optional[Dict[str, Any]]:
+    return await run_write(database.remove_appointment, appointment_id)
@@ -1,10 +1,37 @@
 import json
+import os
+import threading
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
 
-DB_PATH = Path("backend/db/appointments.json")
+from backend.db.journal import Compactor, JournalStorage
+from backend.db.locks import ProcessLock
+from backend.db.record import Appointment
+from backend.db.schedule import Schedule, compile_schedule
+from backend.db.shards import ShardedStorage
+from backend.db.storage import JsonFileStorage, file_signature
+from backend.db.store import AppointmentStore
+from backend.utils.metrics import storage_bytes
+
+DB_PATH = Path(os.getenv("APPOINTMENTS_PATH", "backend/db/appointments.json"))
 SCHEDULE_PATH = Path("backend/db/doctor_schedule.json")
 
+# "json" rewrites appointments.json on every change; "journal" appends each
+# change to appointments.journal and folds it into the snapshot periodically;
+# "sharded" keeps one file per month under shards/ next to appointments.json;
+# "sql" stores rows through SQLAlchemy at DATABASE_URL.
+STORAGE_MODE = os.getenv("APPOINTMENT_STORAGE", "json")
+JOURNAL_COMPACT_INTERVAL = float(os.getenv("JOURNAL_COMPACT_INTERVAL", "30"))
+JOURNAL_COMPACT_THRESHOLD = int(os.getenv("JOURNAL_COMPACT_THRESHOLD", "1000"))
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///backend/db/appointments.sqlite3")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Seconds a SQL-backed worker may serve reads from memory before checking the
+# change log again; 0 checks on every read.
+SQL_POLL_INTERVAL = float(os.getenv("SQL_POLL_INTERVAL", "0"))
+# Seconds between sweeps of change-log entries older than a day in sql mode
+SQL_PRUNE_INTERVAL = float(os.getenv("SQL_PRUNE_INTERVAL", "300"))
+
 APPOINTMENT_TYPES = {
     "consultation": 30,
     "followup": 15,
@@ -13,32 +40,191 @@ APPOINTMENT_TYPES = {
     "general": 30,
 }
 
+_store: Optional[AppointmentStore] = None
+_store_config: Optional[tuple] = None
+_store_lock = threading.Lock()
+_schedule: Optional[tuple] = None
+_compiled_schedule: Optional[tuple] = None
+
 
 def _read_json(path: Path):
     if path.exists():
         with path.open("r", encoding="utf-8") as f:
+            storage_bytes.inc(os.fstat(f.fileno()).st_size, direction="read")
             return json.load(f)
     return None
 
 
 def _write_json(path: Path, data) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as f:
+    # Write a sibling file and swap it in so concurrent readers never see a
+    # half-written document
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
         json.dump(data, f, indent=2)
+        storage_bytes.inc(f.tell(), direction="write")
+    os.replace(tmp, path)
+
+
+def _make_store() -> AppointmentStore:
+    if STORAGE_MODE == "json":
+        lock = ProcessLock(DB_PATH.with_suffix(".lock"))
+        storage = JsonFileStorage(DB_PATH, _read_json, _write_json, lock.counter)
+        return AppointmentStore(storage, lock)
+    if STORAGE_MODE == "journal":
+        lock = ProcessLock(DB_PATH.with_suffix(".lock"))
+        return AppointmentStore(JournalStorage(DB_PATH), lock)
+    if STORAGE_MODE == "sharded":
+        root = DB_PATH.parent / "shards"
+        lock = ProcessLock(root / "shards.lock")
+        return AppointmentStore(ShardedStorage(root, DB_PATH, lock.counter), lock)
+    if STORAGE_MODE == "sql":
+        from backend.db.sql_storage import SqlStorage, make_engine
+
+        # Cross-worker safety comes from the database itself: writers are
+        # serialised and re-check overlaps inside the transaction
+        engine = make_engine(DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW)
+        return AppointmentStore(
+            SqlStorage(engine, APPOINTMENT_TYPES, poll_interval=SQL_POLL_INTERVAL)
+        )
+    raise ValueError(f"Unknown storage mode: {STORAGE_MODE}")
+
+
+def get_store() -> AppointmentStore:
+    """Return the resident store for the current storage configuration."""
+    global _store, _store_config
+    config = (STORAGE_MODE, DB_PATH, DATABASE_URL)
+    store = _store
+    if store is None or _store_config != config:
+        with _store_lock:
+            if _store is None or _store_config != config:
+                _store = _make_store()
+                _store_config = config
+            store = _store
+    return store
+
+
+def start_compactor() -> Optional[Compactor]:
+    """Start folding the journal into the snapshot in journal mode."""
+    if STORAGE_MODE != "journal":
+        return None
+    compactor = Compactor(
+        get_store(), JOURNAL_COMPACT_INTERVAL, JOURNAL_COMPACT_THRESHOLD
+    )
+    compactor.start()
+    return compactor
+
+
+def start_change_log_pruner():
+    """Start trimming the change log in sql mode; returns None otherwise."""
+    if STORAGE_MODE != "sql":
+        return None
+    from backend.db.sql_storage import ChangeLogPruner
+
+    pruner = ChangeLogPruner(get_store().storage, SQL_PRUNE_INTERVAL)
+    pruner.start()
+    return pruner
+
+
+def store_generation() -> int:
+    return get_store().load()
+
+
+def date_lock(date: str):
+    """Hold while checking and writing bookings for ``date``.
+
+    Serialises bookings for the same date across threads and, for the file
+    backends, across worker processes sharing the same files.
+    """
+    return get_store().lock.for_date(date)
+
+
+def date_locks(dates: List[str]):
+    """Hold the booking locks of every date in ``dates`` at once."""
+    return get_store().lock.for_dates(dates)
 
 
 def load_appointments() -> List[Dict[str, Any]]:
-    data = _read_json(DB_PATH)
-    return data if isinstance(data, list) else []
+    return get_store().all()
+
+
+def iter_appointments() -> Iterator[Dict[str, Any]]:
+    """Stream every appointment without building the full list."""
+    return get_store().iter_all()
 
 
 def save_appointments(data: List[Dict[str, Any]]) -> None:
-    _write_json(DB_PATH, data)
+    get_store().replace_all(data)
+
+
+def get_appointment(appointment_id: str) -> Optional[Dict[str, Any]]:
+    return get_store().get(appointment_id)
+
+
+def get_record(appointment_id: str) -> Optional[Appointment]:
+    return get_store().get_record(appointment_id)
+
+
+def appointments_on(date: str) -> List[Dict[str, Any]]:
+    return get_store().on_date(date)
+
+
+def booked_intervals(date: str) -> List[Tuple[int, int, str]]:
+    return get_store().intervals(date)
+
+
+def occupancy(date: str) -> int:
+    return get_store().occupancy(date)
+
+
+def slot_is_free(date: str, start: int, end: int, exclude_id: Optional[str] = None) -> bool:
+    return get_store().is_free(date, start, end, exclude_id)
+
+
+def find_conflicts(
+    date: str, start: int, end: int, exclude_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    return get_store().conflicts(date, start, end, exclude_id)
+
+
+def upsert_appointment(appointment: Union[Dict[str, Any], Appointment]) -> None:
+    get_store().put(appointment)
+
+
+def upsert_appointments(appointments: List[Union[Dict[str, Any], Appointment]]) -> None:
+    get_store().put_many(appointments)
+
+
+def replace_appointment(appointment: Union[Dict[str, Any], Appointment]) -> bool:
+    return get_store().replace(appointment)
+
+
+def remove_appointment(appointment_id: str) -> Optional[Dict[str, Any]]:
+    return get_store().delete(appointment_id)
 
 
 def load_doctor_schedule():
+    global _schedule
+    # Re-read only when the file changes; a stat is cheap enough to run on
+    # the event loop, a parse per request is not
+    key = (SCHEDULE_PATH, file_signature(SCHEDULE_PATH))
+    if _schedule is not None and _schedule[0] == key:
+        return _schedule[1]
     data = _read_json(SCHEDULE_PATH)
     if data is None:
         raise FileNotFoundError(f"Doctor schedule not found at {SCHEDULE_PATH}")
+    _schedule = (key, data)
     return data
 
+
+def get_schedule() -> Schedule:
+    """The doctor schedule compiled into slot grids.
+
+    Rebuilt only when :func:`load_doctor_schedule` reads a changed file.
+    """
+    global _compiled_schedule
+    data = load_doctor_schedule()
+    compiled = _compiled_schedule
+    if compiled is None or compiled[0] is not data:
+        compiled = _compiled_schedule = (data, compile_schedule(data, APPOINTMENT_TYPES))
+    return compiled[1]
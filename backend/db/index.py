@@ -0,0 +1,93 @@
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from backend.db.record import Appointment
+
+# (start_minute, end_minute, appointment_id)
+Interval = Tuple[int, int, str]
+
+
+def minute_mask(start: int, end: int) -> int:
+    """Bitset with the minutes ``[start, end)`` set."""
+    return ((1 << (end - start)) - 1) << start if end > start else 0
+
+
+class DateIndex:
+    """Start-sorted booking intervals per day ordinal.
+
+    Overlap checks bisect into one day's intervals instead of scanning every
+    appointment ever stored. The longest interval seen on a day bounds how far
+    before the query start a conflicting booking can begin, so only that
+    window is examined even if stored bookings overlap each other.
+
+    Each day also keeps an occupancy bitset, bit ``m`` set when minute ``m``
+    is booked, so a free range is confirmed with a single mask test and
+    availability is read off the bits without walking the intervals.
+    """
+
+    def __init__(self):
+        self._days: Dict[int, List[Interval]] = {}
+        self._longest: Dict[int, int] = {}
+        self._occupancy: Dict[int, int] = {}
+
+    @staticmethod
+    def _interval(appointment: Appointment) -> Interval:
+        return (appointment.start, appointment.end, appointment.id)
+
+    def clear(self) -> None:
+        self._days.clear()
+        self._longest.clear()
+        self._occupancy.clear()
+
+    def add(self, appointment: Appointment) -> None:
+        date = appointment.day
+        interval = self._interval(appointment)
+        insort(self._days.setdefault(date, []), interval)
+        length = interval[1] - interval[0]
+        if length > self._longest.get(date, 0):
+            self._longest[date] = length
+        self._occupancy[date] = self._occupancy.get(date, 0) | minute_mask(interval[0], interval[1])
+
+    def remove(self, appointment: Appointment) -> None:
+        date = appointment.day
+        day = self._days.get(date)
+        if not day:
+            return
+        interval = self._interval(appointment)
+        pos = bisect_left(day, interval)
+        if pos < len(day) and day[pos] == interval:
+            day.pop(pos)
+        if not day:
+            del self._days[date]
+            self._longest.pop(date, None)
+            self._occupancy.pop(date, None)
+            return
+        # Stored bookings may overlap, so the remaining ones are re-marked
+        # rather than clearing the removed range
+        occupancy = 0
+        for start, end, _ in day:
+            occupancy |= minute_mask(start, end)
+        self._occupancy[date] = occupancy
+
+    def day(self, date: int) -> List[Interval]:
+        return self._days.get(date, [])
+
+    def occupancy(self, date: int) -> int:
+        """Bitset of the booked minutes on ``date``."""
+        return self._occupancy.get(date, 0)
+
+    def is_free(self, date: int, start: int, end: int, exclude_id: Optional[str] = None) -> bool:
+        """Whether no booking other than ``exclude_id`` overlaps ``[start, end)``."""
+        if not self._occupancy.get(date, 0) & minute_mask(start, end):
+            return True
+        if exclude_id is None:
+            return False
+        return all(appt_id == exclude_id for _, _, appt_id in self.overlapping(date, start, end))
+
+    def overlapping(self, date: int, start: int, end: int) -> List[Interval]:
+        if not self._occupancy.get(date, 0) & minute_mask(start, end):
+            return []
+        day = self._days[date]
+        lo = bisect_left(day, (start - self._longest[date],))
+        hi = bisect_left(day, (end,))
+        return [interval for interval in day[lo:hi] if interval[1] > start]
@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from backend.db.storage import Op, file_signature
+from backend.utils.metrics import storage_bytes
+
+
+# json.dumps builds a new encoder per call when given separators
+_encoder = json.JSONEncoder(separators=(",", ":"))
+
+
+def _encode(op: Op) -> bytes:
+    kind, value = op
+    if kind == "put":
+        record = {"op": "put", "appointment": value}
+    else:
+        record = {"op": "delete", "id": value}
+    return (_encoder.encode(record) + "\n").encode("utf-8")
+
+
+def _decode(line: bytes) -> Op:
+    record = json.loads(line)
+    if record["op"] == "put":
+        return ("put", record["appointment"])
+    return ("delete", record["id"])
+
+
+def write_snapshot(path: Path, appointments: Iterable[Dict[str, Any]]) -> None:
+    """Atomically replace ``path`` with a compact JSON array."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(list(appointments), f, separators=(",", ":"))
+        storage_bytes.inc(f.tell(), direction="write")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class JournalStorage:
+    """Snapshot plus append-only journal.
+
+    Each mutation appends one compact, fsynced line to ``<db>.journal``; the
+    snapshot is only rewritten by :meth:`compact`. Replaying a record twice
+    is harmless, so a crash between writing a new snapshot and truncating the
+    journal loses nothing, and a torn final line is dropped on replay.
+    """
+
+    def __init__(self, path: Path, journal_path: Optional[Path] = None):
+        self.path = path
+        self.journal_path = journal_path or path.with_suffix(".journal")
+        self._snapshot_signature = None
+        self._offset = 0
+        self._records = 0
+
+    def _read_snapshot(self) -> List[Dict[str, Any]]:
+        if not self.path.exists():
+            return []
+        with self.path.open("r", encoding="utf-8") as f:
+            storage_bytes.inc(os.fstat(f.fileno()).st_size, direction="read")
+            data = json.load(f)
+        return data if isinstance(data, list) else []
+
+    def _journal_size(self) -> int:
+        signature = file_signature(self.journal_path)
+        return signature[1] if signature else 0
+
+    def _replay(self) -> List[Op]:
+        ops: List[Op] = []
+        try:
+            f = self.journal_path.open("rb")
+        except FileNotFoundError:
+            return ops
+        start = self._offset
+        with f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn record from an interrupted append
+                ops.append(_decode(line))
+                self._offset += len(line)
+        storage_bytes.inc(self._offset - start, direction="read")
+        self._records += len(ops)
+        return ops
+
+    def load(self) -> List[Dict[str, Any]]:
+        self._snapshot_signature = file_signature(self.path)
+        self._offset = 0
+        self._records = 0
+        appointments = {appt["id"]: appt for appt in self._read_snapshot()}
+        for kind, value in self._replay():
+            if kind == "put":
+                appointments[value["id"]] = value
+            else:
+                appointments.pop(value, None)
+        return list(appointments.values())
+
+    def changed(self) -> bool:
+        return (
+            file_signature(self.path) != self._snapshot_signature
+            or self._journal_size() != self._offset
+        )
+
+    def missing(self, date: Optional[str]) -> bool:
+        return False
+
+    def fetch(self, date: Optional[str]) -> List[Op]:
+        return []
+
+    def missing_id(self, appointment_id: str) -> bool:
+        return False
+
+    def fetch_id(self, appointment_id: str) -> List[Op]:
+        return []
+
+    def poll(self) -> Optional[List[Op]]:
+        if (
+            file_signature(self.path) != self._snapshot_signature
+            or self._journal_size() < self._offset
+        ):
+            return [("reset", self.load())]
+        return self._replay() or None
+
+    def write(self, ops: List[Op], appointments: Iterable[Dict[str, Any]]) -> None:
+        data = b"".join(_encode(op) for op in ops)
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.journal_path.open("ab") as f:
+            if f.tell() > self._offset:
+                f.truncate(self._offset)
+            f.write(data)
+            storage_bytes.inc(len(data), direction="write")
+            f.flush()
+            os.fsync(f.fileno())
+        self._offset += len(data)
+        self._records += len(ops)
+
+    def save_all(self, appointments: Iterable[Dict[str, Any]]) -> None:
+        write_snapshot(self.path, appointments)
+        self._snapshot_signature = file_signature(self.path)
+        with self.journal_path.open("wb") as f:
+            os.fsync(f.fileno())
+        self._offset = 0
+        self._records = 0
+
+    def pending(self) -> int:
+        return self._records
+
+    def compact(self, appointments: Iterable[Dict[str, Any]]) -> None:
+        self.save_all(appointments)
+
+
+class Compactor:
+    """Background thread that folds the journal into the snapshot."""
+
+    def __init__(self, store, interval: float, threshold: int):
+        self.store = store
+        self.interval = interval
+        self.threshold = threshold
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="journal-compactor", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        # Leave a clean snapshot behind on shutdown
+        self.store.compact()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.store.compact(min_records=self.threshold)
@@ -0,0 +1,96 @@
+import os
+import struct
+import threading
+import zlib
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: in-process locking only
+    fcntl = None
+
+DATE_STRIPES = 256
+WRITER_SLOT = 0
+
+_COUNTER = struct.Struct("<Q")
+# Locked byte ranges sit past the counter so locking never touches its data
+_LOCK_OFFSET = 4096
+
+
+class ProcessLock:
+    """Locks shared by every thread and worker process using one store.
+
+    There is one writer slot, held while the backing file is refreshed and
+    rewritten, and ``DATE_STRIPES`` date slots, held across a booking's
+    conflict check and write. Each slot is a thread lock paired with a POSIX
+    byte-range lock on the lock file; record locks belong to the process,
+    so the thread lock is what separates threads within one worker.
+
+    The first eight bytes of the lock file count committed writes, which
+    lets readers notice a rewrite even when it lands within the filesystem's
+    mtime granularity. Without a path (or without ``fcntl``) only the
+    in-process half is used.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path if fcntl is not None else None
+        self._fd: Optional[int] = None
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._threads = [threading.RLock() for _ in range(DATE_STRIPES + 1)]
+        self._depth = [0] * (DATE_STRIPES + 1)
+        self._local_counter = 0
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    @contextmanager
+    def _hold(self, slot: int) -> Iterator[None]:
+        with self._threads[slot]:
+            outermost = self._depth[slot] == 0
+            if outermost and self._fd is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, _LOCK_OFFSET + slot, os.SEEK_SET)
+            self._depth[slot] += 1
+            try:
+                yield
+            finally:
+                self._depth[slot] -= 1
+                if outermost and self._fd is not None:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, _LOCK_OFFSET + slot, os.SEEK_SET)
+
+    def writer(self):
+        return self._hold(WRITER_SLOT)
+
+    @staticmethod
+    def _date_slot(date: str) -> int:
+        # crc32 rather than hash(): every process must map a date to the same slot
+        return 1 + zlib.crc32(date.encode("utf-8")) % DATE_STRIPES
+
+    def for_date(self, date: str):
+        return self._hold(self._date_slot(date))
+
+    @contextmanager
+    def for_dates(self, dates: Iterable[str]) -> Iterator[None]:
+        """Hold the slots of several dates, taken in slot order to avoid deadlock."""
+        with ExitStack() as stack:
+            for slot in sorted({self._date_slot(date) for date in dates}):
+                stack.enter_context(self._hold(slot))
+            yield
+
+    def counter(self) -> int:
+        if self._fd is None:
+            return self._local_counter
+        data = os.pread(self._fd, _COUNTER.size, 0)
+        return _COUNTER.unpack(data)[0] if len(data) == _COUNTER.size else 0
+
+    def bump(self) -> None:
+        """Record a committed write; call while holding the writer slot."""
+        if self._fd is None:
+            self._local_counter += 1
+            return
+        os.pwrite(self._fd, _COUNTER.pack(self.counter() + 1), 0)
@@ -0,0 +1,139 @@
+import sys
+from datetime import date as Date
+from typing import Any, Dict, Optional
+
+from backend.utils.time_utils import from_minutes, to_minutes
+
+_FIELDS = {
+    "id",
+    "appointment_type",
+    "date",
+    "start_time",
+    "end_time",
+    "patient",
+    "reason",
+    "confirmation_code",
+}
+_PATIENT_FIELDS = {"name", "email", "phone"}
+
+
+def day_ordinal(date: str) -> int:
+    """Ordinal of an ISO ``YYYY-MM-DD`` date; ValueError if malformed."""
+    return Date.fromisoformat(date).toordinal()
+
+
+def day_string(ordinal: int) -> str:
+    return Date.fromordinal(ordinal).isoformat()
+
+
+class Appointment:
+    """One booking as the store keeps it in memory.
+
+    Dates are day ordinals and times are minutes after midnight, so overlap
+    checks compare ints and each record costs a fixed slot layout instead of
+    two dicts and three date/time strings. The API and the storage backends
+    still speak the dict format; :meth:`from_dict` and :meth:`to_dict`
+    convert at those boundaries. Keys outside that format are kept in
+    ``extra`` so a round trip never drops data.
+    """
+
+    __slots__ = (
+        "id",
+        "appointment_type",
+        "day",
+        "start",
+        "end",
+        "patient_name",
+        "patient_email",
+        "patient_phone",
+        "reason",
+        "confirmation_code",
+        "extra",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        appointment_type: str,
+        day: int,
+        start: int,
+        end: int,
+        patient_name: str,
+        patient_email: str,
+        patient_phone: Optional[str],
+        reason: Optional[str],
+        confirmation_code: str,
+        extra: Optional[Dict[str, Any]] = None,
+    ):
+        self.id = id
+        # A handful of distinct values shared by every record
+        self.appointment_type = sys.intern(appointment_type)
+        self.day = day
+        self.start = start
+        self.end = end
+        self.patient_name = patient_name
+        self.patient_email = patient_email
+        self.patient_phone = patient_phone
+        self.reason = reason
+        self.confirmation_code = confirmation_code
+        self.extra = extra
+
+    @property
+    def date(self) -> str:
+        return day_string(self.day)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Appointment":
+        patient = data.get("patient") or {}
+        extra = {key: value for key, value in data.items() if key not in _FIELDS}
+        if not _PATIENT_FIELDS.issuperset(patient):
+            extra["patient"] = patient
+        return cls(
+            id=data["id"],
+            appointment_type=data["appointment_type"],
+            day=day_ordinal(data["date"]),
+            start=to_minutes(data["start_time"]),
+            end=to_minutes(data["end_time"]),
+            patient_name=patient.get("name"),
+            patient_email=patient.get("email"),
+            patient_phone=patient.get("phone"),
+            reason=data.get("reason"),
+            confirmation_code=data.get("confirmation_code"),
+            extra=extra or None,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "id": self.id,
+            "appointment_type": self.appointment_type,
+            "date": day_string(self.day),
+            "start_time": from_minutes(self.start),
+            "end_time": from_minutes(self.end),
+            "patient": {
+                "name": self.patient_name,
+                "email": self.patient_email,
+                "phone": self.patient_phone,
+            },
+            "reason": self.reason,
+            "confirmation_code": self.confirmation_code,
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def overlaps(self, start: int, end: int) -> bool:
+        return self.start < end and start < self.end
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Appointment):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    # Records are mutable and compared field by field, so they are unhashable
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return (
+            f"Appointment({self.id!r}, {self.appointment_type!r}, {self.date}, "
+            f"{from_minutes(self.start)}-{from_minutes(self.end)})"
+        )
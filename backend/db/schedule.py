@@ -0,0 +1,159 @@
+"""The doctor schedule compiled into per-weekday slot grids.
+
+``doctor_schedule.json`` is either the legacy ``{"working_hours": {...}}``
+(the same hours every day), a bare list of weekly entries, or an object::
+
+    {
+      "weekly": [{"weekday": 1, "start_time": "09:00", "end_time": "17:00"}, ...],
+      "closures": [{"date": "2030-12-25", "notes": "Christmas"}],
+      "exceptions": [{"date": "2030-12-24", "start_time": "09:00", "end_time": "12:00"}]
+    }
+
+Weekdays are numbered as ISO does, 1 (Monday) to 7 (Sunday); a weekday
+without entries is closed. Several entries for one weekday (or one
+exception date) make a split day. An exception replaces the weekly hours
+on its date and a closure removes them.
+
+Everything is turned into slot grids up front, so looking up a day's slots
+costs a dict lookup and, for a date not seen recently, a weekday lookup.
+Each slot carries its minute mask for testing against the day's occupancy
+bitset.
+"""
+import itertools
+from datetime import date as Date
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Mapping, Tuple
+
+from backend.db.index import minute_mask
+from backend.utils.time_utils import from_minutes, to_minutes
+
+# start and end in minutes after midnight, then as "HH:MM", then the
+# slot's minutes as an occupancy mask
+Slot = Tuple[int, int, str, str, int]
+Blocks = Tuple[Tuple[int, int], ...]
+
+_versions = itertools.count(1)
+
+
+@lru_cache(maxsize=4096)
+def _weekday(date: str) -> int:
+    try:
+        return Date.fromisoformat(date).isoweekday()
+    except ValueError:
+        raise ValueError("Dates must be in YYYY-MM-DD format") from None
+
+
+def _blocks(entries: Iterable[Mapping[str, Any]], where: str) -> Blocks:
+    blocks = []
+    for entry in entries:
+        try:
+            start, end = to_minutes(entry["start_time"]), to_minutes(entry["end_time"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"{where}: entries need start_time and end_time as HH:MM") from None
+        if not 0 <= start < end <= 24 * 60:
+            raise ValueError(f"{where}: {entry['start_time']}-{entry['end_time']} is not a valid time range")
+        blocks.append((start, end))
+    blocks.sort()
+    for (_, previous_end), (start, _) in zip(blocks, blocks[1:]):
+        if start < previous_end:
+            raise ValueError(f"{where}: working hours overlap")
+    return tuple(blocks)
+
+
+def _grid(blocks: Blocks, duration: int) -> Tuple[Slot, ...]:
+    slots = []
+    for block_start, block_end in blocks:
+        current = block_start
+        while current + duration <= block_end:
+            end = current + duration
+            slots.append((current, end, from_minutes(current), from_minutes(end), minute_mask(current, end)))
+            current = end
+    return tuple(slots)
+
+
+class Schedule:
+    """Working hours per weekday and date, with their slot grid per appointment type."""
+
+    def __init__(
+        self,
+        weekly: Mapping[int, Blocks],
+        dates: Mapping[str, Blocks],
+        durations: Mapping[str, int],
+    ):
+        self.version = next(_versions)
+        self.weekly = {weekday: weekly.get(weekday, ()) for weekday in range(1, 8)}
+        self.dates = dict(dates)
+        grids: Dict[Blocks, Dict[str, Tuple[Slot, ...]]] = {}
+        for blocks in itertools.chain(self.weekly.values(), self.dates.values()):
+            if blocks not in grids:
+                grids[blocks] = {name: _grid(blocks, duration) for name, duration in durations.items()}
+        self._weekly_grids = {weekday: grids[blocks] for weekday, blocks in self.weekly.items()}
+        self._date_grids = {date: grids[blocks] for date, blocks in self.dates.items()}
+
+    @property
+    def open_weekly(self) -> bool:
+        """Whether any weekday has working hours."""
+        return any(self.weekly.values())
+
+    def blocks(self, date: str) -> Blocks:
+        """Working hours on ``date``; empty when the doctor is not in."""
+        blocks = self.dates.get(date)
+        return blocks if blocks is not None else self.weekly[_weekday(date)]
+
+    def grid(self, date: str, appointment_type: str) -> Tuple[Slot, ...]:
+        """Slots of ``appointment_type`` on ``date``, booked or not, in order."""
+        grids = self._date_grids.get(date)
+        if grids is None:
+            grids = self._weekly_grids[_weekday(date)]
+        return grids[appointment_type]
+
+
+def _weekly_entries(data: Any) -> List[Mapping[str, Any]]:
+    if isinstance(data, list):
+        return data
+    if "weekly" in data:
+        return data["weekly"]
+    hours = data.get("working_hours")
+    if hours is None:
+        raise ValueError("schedule needs weekly entries or working_hours")
+    try:
+        start_time, end_time = hours["start"], hours["end"]
+    except (KeyError, TypeError):
+        raise ValueError("working_hours needs start and end") from None
+    return [
+        {"weekday": weekday, "start_time": start_time, "end_time": end_time}
+        for weekday in range(1, 8)
+    ]
+
+
+def _date(entry: Mapping[str, Any], where: str) -> str:
+    try:
+        return Date.fromisoformat(entry["date"]).isoformat()
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"{where}: entries need a date as YYYY-MM-DD") from None
+
+
+def compile_schedule(data: Any, durations: Mapping[str, int]) -> Schedule:
+    """Validate parsed ``doctor_schedule.json`` and build its slot grids."""
+    if not isinstance(data, (list, dict)):
+        raise ValueError("schedule must be a JSON object or list")
+
+    by_weekday: Dict[int, List[Mapping[str, Any]]] = {}
+    for entry in _weekly_entries(data):
+        weekday = entry.get("weekday") if isinstance(entry, dict) else None
+        if weekday not in range(1, 8):
+            raise ValueError("weekly entries need a weekday from 1 (Monday) to 7 (Sunday)")
+        by_weekday.setdefault(weekday, []).append(entry)
+    weekly = {
+        weekday: _blocks(entries, f"weekday {weekday}") for weekday, entries in by_weekday.items()
+    }
+
+    special = {} if isinstance(data, list) else data
+    by_date: Dict[str, List[Mapping[str, Any]]] = {}
+    for entry in special.get("exceptions", []):
+        by_date.setdefault(_date(entry, "exceptions"), []).append(entry)
+    dates = {date: _blocks(entries, f"exception {date}") for date, entries in by_date.items()}
+    for entry in special.get("closures", []):
+        dates[_date(entry, "closures")] = ()
+
+    return Schedule(weekly, dates, durations)
@@ -0,0 +1,310 @@
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from backend.db.journal import write_snapshot
+from backend.db.storage import Op, file_signature
+from backend.utils.metrics import storage_bytes
+
+MANIFEST = "manifest.json"
+
+# A line of the id log: an appointment id and its shard, None once deleted
+IdEntry = Tuple[str, Optional[str]]
+
+
+def shard_key(date: str) -> str:
+    """Shard holding ``date``: one file per ``YYYY-MM`` month."""
+    return date[:7]
+
+
+class ShardedStorage:
+    """Appointments split into one JSON file per month, plus a manifest.
+
+    Shards are read lazily, the first time the store needs a date in them,
+    and a write rewrites only the shards it touches, so booking tomorrow
+    costs that month's volume rather than the whole history.
+
+    ``manifest.json`` lists every shard with its row count and a version
+    that each rewrite bumps; polling stats the manifest alone and reloads
+    only resident shards whose version moved. :meth:`save_all` starts a new
+    epoch, which makes other workers drop everything and reload lazily.
+
+    ``ids-<epoch>.ndjson`` maps appointment ids to their month: one
+    ``[id, month]`` line per booking added or moved and ``[id, null]`` per
+    deletion, appended under the writer lock. Lookups by id read the new
+    lines since the last lookup and load only the shard they point to.
+    Shards written before the id log existed fall back to loading every
+    shard until the next write builds the log.
+
+    If there is no manifest yet, the single-file ``legacy`` database is
+    split into shards on first load.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        legacy: Optional[Path] = None,
+        version: Callable[[], int] = lambda: 0,
+    ):
+        self.root = root
+        self.legacy = legacy
+        self.version = version
+        self._manifest: Dict[str, Any] = {"epoch": None, "shards": {}}
+        self._signature = None
+        # Shard -> ids currently resident from it, and the reverse
+        self._resident: Dict[str, Set[str]] = {}
+        self._shard_of: Dict[str, str] = {}
+        # Id -> shard from the id log, read up to _ids_offset
+        self._ids: Dict[str, str] = {}
+        self._ids_offset = 0
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.root / MANIFEST
+
+    def _shard_path(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def _ids_path(self) -> Path:
+        return self.root / f"ids-{self._manifest['epoch']}.ndjson"
+
+    def _current_signature(self):
+        return (self.version(), file_signature(self.manifest_path))
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            with self.manifest_path.open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"epoch": None, "shards": {}}
+
+    def _write_manifest(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        if self._manifest["epoch"] is None:
+            self._manifest["epoch"] = uuid.uuid4().hex
+        tmp = self.manifest_path.with_name(MANIFEST + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, indent=2, sort_keys=True)
+            storage_bytes.inc(f.tell(), direction="write")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.manifest_path)
+        self._signature = self._current_signature()
+
+    def _read_shard(self, key: str) -> List[Dict[str, Any]]:
+        try:
+            with self._shard_path(key).open("r", encoding="utf-8") as f:
+                storage_bytes.inc(os.fstat(f.fileno()).st_size, direction="read")
+                data = json.load(f)
+        except FileNotFoundError:
+            return []
+        return data if isinstance(data, list) else []
+
+    def _read_ids(self) -> Optional[Dict[str, str]]:
+        # Catch up on lines appended since the last read; None if this
+        # epoch's shards predate the id log
+        if self._manifest["epoch"] is None:
+            return self._ids
+        try:
+            with self._ids_path().open("rb") as f:
+                f.seek(self._ids_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        # A line still being appended is picked up once it is complete
+        end = data.rfind(b"\n") + 1
+        storage_bytes.inc(end, direction="read")
+        for line in data[:end].splitlines():
+            appt_id, key = json.loads(line)
+            if key is None:
+                self._ids.pop(appt_id, None)
+            else:
+                self._ids[appt_id] = key
+        self._ids_offset += end
+        return self._ids
+
+    def _write_ids(self, entries: Iterable[IdEntry], append: bool = True) -> None:
+        path = self._ids_path()
+        target = path if append else path.with_name(path.name + ".tmp")
+        data = "".join(json.dumps(entry) + "\n" for entry in entries)
+        self.root.mkdir(parents=True, exist_ok=True)
+        with target.open("a" if append else "w", encoding="utf-8") as f:
+            f.write(data)
+            storage_bytes.inc(len(data), direction="write")
+            f.flush()
+            os.fsync(f.fileno())
+        if not append:
+            os.replace(target, path)
+
+    def _append_ids(self, entries: List[IdEntry]) -> None:
+        if not entries:
+            return
+        if not self._ids_path().exists():
+            # Build the log once for shards written before it existed
+            self._write_ids(
+                ((appt["id"], key) for key in self._manifest["shards"]
+                 for appt in self._read_shard(key)),
+                append=False,
+            )
+        self._write_ids(entries)
+
+    def _forget(self) -> None:
+        self._resident.clear()
+        self._shard_of.clear()
+        self._ids.clear()
+        self._ids_offset = 0
+
+    def _migrate(self) -> None:
+        if self.legacy is None or not self.legacy.exists():
+            return
+        with self.legacy.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.save_all(data if isinstance(data, list) else [])
+        self._forget()
+
+    def load(self) -> List[Dict[str, Any]]:
+        self._signature = self._current_signature()
+        self._manifest = self._read_manifest()
+        if self._manifest["epoch"] is None:
+            self._migrate()
+        self._forget()
+        return []
+
+    def missing(self, date: Optional[str]) -> bool:
+        if date is None:
+            return any(key not in self._resident for key in self._manifest["shards"])
+        key = shard_key(date)
+        return key in self._manifest["shards"] and key not in self._resident
+
+    def missing_id(self, appointment_id: str) -> bool:
+        return appointment_id not in self._shard_of and self.missing(None)
+
+    def fetch(self, date: Optional[str]) -> List[Op]:
+        """Read the shard holding ``date`` (every shard for None) if not resident."""
+        keys = self._manifest["shards"] if date is None else [shard_key(date)]
+        return self._fetch(keys)
+
+    def fetch_id(self, appointment_id: str) -> List[Op]:
+        """Read the shard the id log places ``appointment_id`` in, if not resident."""
+        ids = self._read_ids()
+        if ids is None:
+            return self._fetch(self._manifest["shards"])
+        key = ids.get(appointment_id)
+        return self._fetch([key]) if key is not None else []
+
+    def _fetch(self, keys: Iterable[str]) -> List[Op]:
+        ops: List[Op] = []
+        for key in list(keys):
+            if key in self._resident or key not in self._manifest["shards"]:
+                continue
+            appointments = self._read_shard(key)
+            self._resident[key] = {appt["id"] for appt in appointments}
+            for appt in appointments:
+                self._shard_of[appt["id"]] = key
+                ops.append(("put", appt))
+        return ops
+
+    def changed(self) -> bool:
+        return self._current_signature() != self._signature
+
+    def poll(self) -> Optional[List[Op]]:
+        if not self.changed():
+            return None
+        previous = self._manifest
+        self._signature = self._current_signature()
+        self._manifest = self._read_manifest()
+        if self._manifest["epoch"] != previous["epoch"]:
+            self._forget()
+            return [("reset", [])]
+        deletes: List[Op] = []
+        puts: List[Op] = []
+        for key in list(self._resident):
+            entry = self._manifest["shards"].get(key)
+            if entry == previous["shards"].get(key):
+                continue
+            appointments = self._read_shard(key) if entry else []
+            current = {appt["id"] for appt in appointments}
+            for appt_id in self._resident[key] - current:
+                if self._shard_of.get(appt_id) == key:
+                    del self._shard_of[appt_id]
+                deletes.append(("delete", appt_id))
+            for appt in appointments:
+                self._shard_of[appt["id"]] = key
+                puts.append(("put", appt))
+            self._resident[key] = current
+        # A booking moved between months shows up as a delete in one shard
+        # and a put in another; deleting first keeps the put
+        return deletes + puts or None
+
+    def write(self, ops: List[Op], appointments: Iterable[Dict[str, Any]]) -> None:
+        changes: Dict[str, Dict[str, Optional[Dict[str, Any]]]] = {}
+        placed: Dict[str, Optional[str]] = {}
+        for kind, value in ops:
+            appt_id = value["id"] if kind == "put" else value
+            old_key = self._shard_of.get(appt_id)
+            new_key = shard_key(value["date"]) if kind == "put" else None
+            if old_key is not None and old_key != new_key:
+                changes.setdefault(old_key, {})[appt_id] = None
+            if new_key is not None:
+                changes.setdefault(new_key, {})[appt_id] = value
+            if old_key != new_key:
+                placed[appt_id] = new_key
+        if not changes:
+            return
+        if self._manifest["epoch"] is None:
+            self._manifest["epoch"] = uuid.uuid4().hex
+        # New places are logged before the shards are written and removals
+        # after, so a crash in between leaves the log pointing at a shard
+        # without the id rather than losing track of a stored booking
+        self._append_ids([(i, key) for i, key in placed.items() if key is not None])
+        for key, updates in changes.items():
+            rows = {appt["id"]: appt for appt in self._read_shard(key)}
+            for appt_id, appt in updates.items():
+                if appt is None:
+                    rows.pop(appt_id, None)
+                    self._shard_of.pop(appt_id, None)
+                else:
+                    rows[appt_id] = appt
+                    self._shard_of[appt_id] = key
+            self._write_shard(key, list(rows.values()))
+            self._resident[key] = set(rows)
+        self._append_ids([(i, key) for i, key in placed.items() if key is None])
+        self._write_manifest()
+
+    def _write_shard(self, key: str, appointments: List[Dict[str, Any]]) -> None:
+        shards = self._manifest["shards"]
+        if appointments:
+            write_snapshot(self._shard_path(key), appointments)
+            version = shards.get(key, {}).get("version", 0) + 1
+            shards[key] = {"count": len(appointments), "version": version}
+        else:
+            self._shard_path(key).unlink(missing_ok=True)
+            shards.pop(key, None)
+
+    def save_all(self, appointments: Iterable[Dict[str, Any]]) -> None:
+        by_key: Dict[str, List[Dict[str, Any]]] = {}
+        for appt in appointments:
+            by_key.setdefault(shard_key(appt["date"]), []).append(appt)
+        stale = set(self._manifest["shards"]) - set(by_key)
+        self._manifest = {"epoch": uuid.uuid4().hex, "shards": {}}
+        self._forget()
+        for key, rows in by_key.items():
+            self._write_shard(key, rows)
+            self._resident[key] = {appt["id"] for appt in rows}
+            for appt in rows:
+                self._shard_of[appt["id"]] = key
+        for key in stale:
+            self._shard_path(key).unlink(missing_ok=True)
+        self._write_ids(self._shard_of.items(), append=False)
+        self._write_manifest()
+        for path in self.root.glob("ids-*.ndjson"):
+            if path != self._ids_path():
+                path.unlink(missing_ok=True)
+
+    def pending(self) -> int:
+        return 0
+
+    def compact(self, appointments: Iterable[Dict[str, Any]]) -> None:
+        pass
@@ -0,0 +1,425 @@
+import threading
+import time as clock
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    Table,
+    Text,
+    Time,
+    Uuid,
+    create_engine,
+    delete,
+    event,
+    func,
+    insert,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.engine import Connection, Engine
+
+from backend.db.storage import Op, SlotUnavailableError
+
+# Mirrors medical_appointment_schema.sql so the same code runs against the
+# PostgreSQL schema or a bundled SQLite file created from this metadata.
+metadata = MetaData()
+
+appointment_types = Table(
+    "appointment_types",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", Text, nullable=False, unique=True),
+    Column("duration_minutes", Integer, nullable=False),
+    Column("description", Text),
+)
+
+scheduled_appointments = Table(
+    "scheduled_appointments",
+    metadata,
+    Column("id", Uuid, primary_key=True, default=uuid.uuid4),
+    Column("booking_id", Text, nullable=False, unique=True),
+    Column(
+        "appointment_type_id",
+        Integer,
+        ForeignKey("appointment_types.id", ondelete="RESTRICT"),
+        nullable=False,
+    ),
+    Column("patient_name", Text, nullable=False),
+    Column("patient_email", Text, nullable=False),
+    Column("patient_phone", Text),
+    Column("reason", Text),
+    Column("date", Date, nullable=False),
+    Column("start_time", Time, nullable=False),
+    Column("end_time", Time, nullable=False),
+    Column("confirmation_code", Text, nullable=False, unique=True),
+    Column("status", Text, nullable=False, server_default="confirmed"),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("updated_at", DateTime(timezone=True), server_default=func.now()),
+    Index("idx_sched_date_start", "date", "start_time"),
+    Index("idx_sched_type_date", "appointment_type_id", "date"),
+)
+
+# One row per committed mutation; other workers poll it to pick up changes
+# incrementally instead of reloading the whole table.
+appointment_changes = Table(
+    "appointment_changes",
+    metadata,
+    Column(
+        "seq",
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    ),
+    Column("booking_id", Text, nullable=False),
+    Column("changed_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+RESET_MARKER = "*"
+# pg_advisory_xact_lock key serialising writers; book_appointment() in
+# medical_appointment_schema.sql takes it too
+WRITER_LOCK_KEY = 0x4D454441
+
+
+def make_engine(url: str, pool_size: int, max_overflow: int) -> Engine:
+    if url.startswith("sqlite"):
+        engine = create_engine(
+            url, connect_args={"check_same_thread": False, "timeout": 30}
+        )
+
+        # Take the write lock when a transaction starts. With SQLite's default
+        # deferred BEGIN, two writers that both read first deadlock on the
+        # upgrade and one fails outright instead of waiting.
+        @event.listens_for(engine, "connect")
+        def _disable_implicit_begin(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine, "begin")
+        def _begin_immediate(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+        return engine
+    return create_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_pre_ping=True,
+    )
+
+
+def _parse_time(value: str) -> time:
+    # TIME can't hold 24:00, so a booking ending at midnight is stored as
+    # the last instant of its day
+    if value == "24:00":
+        return time.max
+    hours, minutes = value.split(":")
+    return time(int(hours), int(minutes))
+
+
+def _format_time(value: time) -> str:
+    return "24:00" if value == time.max else value.strftime("%H:%M")
+
+
+class SqlStorage:
+    """SQLAlchemy storage: each mutation is an indexed row write.
+
+    Writes take a transaction-scoped advisory lock on PostgreSQL (SQLite
+    transactions begin IMMEDIATE), so writers are serialised: overlap checks
+    made inside the transaction are race-free across workers, and change-log
+    sequence numbers follow commit order, letting :meth:`poll` resume from
+    the last one seen.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        types: Dict[str, int],
+        change_retention: timedelta = timedelta(days=1),
+        poll_interval: float = 0.0,
+    ):
+        self.engine = engine
+        self.change_retention = change_retention
+        # Reads within poll_interval of the last poll trust memory; writes
+        # always poll and re-check inside the transaction regardless
+        self.poll_interval = poll_interval
+        self._polled_at = float("-inf")
+        self._last_seq = 0
+        self._written = 0
+        metadata.create_all(engine)
+        self._type_ids = self._ensure_types(types)
+
+    def _ensure_types(self, types: Dict[str, int]) -> Dict[str, int]:
+        with self.engine.begin() as conn:
+            known = {
+                row.name: row.id
+                for row in conn.execute(
+                    select(appointment_types.c.name, appointment_types.c.id)
+                )
+            }
+            for name, duration in types.items():
+                if name not in known:
+                    conn.execute(
+                        insert(appointment_types).values(
+                            name=name, duration_minutes=duration
+                        )
+                    )
+            return {
+                row.name: row.id
+                for row in conn.execute(
+                    select(appointment_types.c.name, appointment_types.c.id)
+                )
+            }
+
+    def _select(self):
+        sa = scheduled_appointments
+        return (
+            select(
+                sa.c.booking_id,
+                appointment_types.c.name.label("appointment_type"),
+                sa.c.date,
+                sa.c.start_time,
+                sa.c.end_time,
+                sa.c.patient_name,
+                sa.c.patient_email,
+                sa.c.patient_phone,
+                sa.c.reason,
+                sa.c.confirmation_code,
+                sa.c.status,
+            )
+            .join(appointment_types, sa.c.appointment_type_id == appointment_types.c.id)
+        )
+
+    @staticmethod
+    def _to_dict(row) -> Dict[str, Any]:
+        return {
+            "id": row.booking_id,
+            "appointment_type": row.appointment_type,
+            "date": row.date.isoformat(),
+            "start_time": _format_time(row.start_time),
+            "end_time": _format_time(row.end_time),
+            "patient": {
+                "name": row.patient_name,
+                "email": row.patient_email,
+                "phone": row.patient_phone,
+            },
+            "reason": row.reason,
+            "confirmation_code": row.confirmation_code,
+        }
+
+    def _row_values(self, appointment: Dict[str, Any]) -> Dict[str, Any]:
+        patient = appointment.get("patient") or {}
+        return {
+            "booking_id": appointment["id"],
+            "appointment_type_id": self._type_ids[appointment["appointment_type"]],
+            "patient_name": patient.get("name", ""),
+            "patient_email": patient.get("email", ""),
+            "patient_phone": patient.get("phone"),
+            "reason": appointment.get("reason"),
+            "date": date.fromisoformat(appointment["date"]),
+            "start_time": _parse_time(appointment["start_time"]),
+            "end_time": _parse_time(appointment["end_time"]),
+            "confirmation_code": appointment["confirmation_code"],
+            "status": "confirmed",
+        }
+
+    def _max_seq(self, conn: Connection) -> int:
+        return conn.execute(select(func.max(appointment_changes.c.seq))).scalar() or 0
+
+    def load(self) -> List[Dict[str, Any]]:
+        self._polled_at = clock.monotonic()
+        with self.engine.connect() as conn:
+            self._last_seq = self._max_seq(conn)
+            rows = conn.execute(
+                self._select().where(scheduled_appointments.c.status == "confirmed")
+            )
+            return [self._to_dict(row) for row in rows]
+
+    def changed(self) -> bool:
+        return clock.monotonic() - self._polled_at >= self.poll_interval
+
+    def missing(self, date: Optional[str]) -> bool:
+        return False
+
+    def fetch(self, date: Optional[str]) -> List[Op]:
+        return []
+
+    def missing_id(self, appointment_id: str) -> bool:
+        return False
+
+    def fetch_id(self, appointment_id: str) -> List[Op]:
+        return []
+
+    def poll(self) -> Optional[List[Op]]:
+        self._polled_at = clock.monotonic()
+        changes = appointment_changes
+        with self.engine.connect() as conn:
+            lowest, highest = conn.execute(
+                select(func.min(changes.c.seq), func.max(changes.c.seq))
+            ).one()
+            if highest is None or highest <= self._last_seq:
+                return None
+            if lowest > self._last_seq + 1 and self._last_seq:
+                # Changes we never saw were pruned; start over
+                return [("reset", self.load())]
+            rows = conn.execute(
+                select(changes.c.seq, changes.c.booking_id)
+                .where(changes.c.seq > self._last_seq)
+                .order_by(changes.c.seq)
+            ).all()
+            booking_ids = list(dict.fromkeys(row.booking_id for row in rows))
+            if RESET_MARKER in booking_ids:
+                return [("reset", self.load())]
+            current = {
+                row.booking_id: row
+                for row in conn.execute(
+                    self._select().where(
+                        scheduled_appointments.c.booking_id.in_(booking_ids)
+                    )
+                )
+            }
+        self._last_seq = rows[-1].seq
+        ops: List[Op] = []
+        for booking_id in booking_ids:
+            row = current.get(booking_id)
+            if row is not None and row.status == "confirmed":
+                ops.append(("put", self._to_dict(row)))
+            else:
+                ops.append(("delete", booking_id))
+        return ops
+
+    def _serialize_writers(self, conn: Connection) -> None:
+        if conn.dialect.name == "postgresql":
+            conn.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"), {"key": WRITER_LOCK_KEY}
+            )
+
+    def _check_free(self, conn: Connection, values: Dict[str, Any]) -> None:
+        # Runs after _serialize_writers, so no other booking can commit
+        # between this check and our insert; served by idx_sched_date_start
+        sa = scheduled_appointments
+        clash = conn.execute(
+            select(sa.c.booking_id)
+            .where(sa.c.date == values["date"])
+            .where(sa.c.status == "confirmed")
+            .where(sa.c.start_time < values["end_time"])
+            .where(sa.c.end_time > values["start_time"])
+            .where(sa.c.booking_id != values["booking_id"])
+            .limit(1)
+        ).first()
+        if clash is not None:
+            raise SlotUnavailableError()
+
+    def _record_changes(self, conn: Connection, booking_ids: List[str]) -> None:
+        previous = self._last_seq
+        seqs = [
+            conn.execute(
+                insert(appointment_changes).values(booking_id=booking_id)
+            ).inserted_primary_key[0]
+            for booking_id in booking_ids
+        ]
+        foreign = conn.execute(
+            select(func.count())
+            .select_from(appointment_changes)
+            .where(appointment_changes.c.seq > previous)
+            .where(appointment_changes.c.seq < seqs[0])
+        ).scalar()
+        # Skip re-reading our own writes unless someone else wrote in between
+        if not foreign:
+            self._last_seq = seqs[-1]
+        self._written += len(booking_ids)
+
+    def write(self, ops: List[Op], appointments: Iterable[Dict[str, Any]]) -> None:
+        sa = scheduled_appointments
+        touched = []
+        with self.engine.begin() as conn:
+            self._serialize_writers(conn)
+            for kind, value in ops:
+                if kind == "put":
+                    values = self._row_values(value)
+                    self._check_free(conn, values)
+                    result = conn.execute(
+                        update(sa)
+                        .where(sa.c.booking_id == value["id"])
+                        .values(**values, updated_at=func.now())
+                    )
+                    if result.rowcount == 0:
+                        conn.execute(insert(sa).values(**values))
+                    touched.append(value["id"])
+                elif kind == "delete":
+                    conn.execute(
+                        update(sa)
+                        .where(sa.c.booking_id == value)
+                        .values(status="cancelled", updated_at=func.now())
+                    )
+                    touched.append(value)
+            if touched:
+                self._record_changes(conn, touched)
+
+    def save_all(self, appointments: Iterable[Dict[str, Any]]) -> None:
+        rows = [self._row_values(appt) for appt in appointments]
+        with self.engine.begin() as conn:
+            self._serialize_writers(conn)
+            conn.execute(delete(scheduled_appointments))
+            if rows:
+                conn.execute(insert(scheduled_appointments), rows)
+            self._record_changes(conn, [RESET_MARKER])
+
+    def pending(self) -> int:
+        return self._written
+
+    def compact(self, appointments: Iterable[Dict[str, Any]]) -> None:
+        # Rows are written in place, so there is nothing to fold: only the
+        # change log needs trimming
+        self.prune_changes()
+        self._written = 0
+
+    def prune_changes(self) -> None:
+        """Drop change-log entries older than ``change_retention``.
+
+        The newest entry is always kept so workers polling from it can resume.
+        """
+        cutoff = datetime.now(timezone.utc) - self.change_retention
+        with self.engine.begin() as conn:
+            if conn.dialect.name == "sqlite":
+                # SQLite stores CURRENT_TIMESTAMP as naive UTC text
+                cutoff = cutoff.replace(tzinfo=None)
+            newest = self._max_seq(conn)
+            conn.execute(
+                delete(appointment_changes)
+                .where(appointment_changes.c.changed_at < cutoff)
+                .where(appointment_changes.c.seq < newest)
+            )
+
+
+class ChangeLogPruner:
+    """Background thread that trims the SQL change log."""
+
+    def __init__(self, storage: SqlStorage, interval: float):
+        self.storage = storage
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="change-log-pruner", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.storage.prune_changes()
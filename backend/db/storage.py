@@ -0,0 +1,121 @@
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Protocol, Tuple
+
+# A change to apply to the resident store:
+#   ("reset", [appointment, ...])  replace everything
+#   ("put", appointment)           insert or replace by id
+#   ("delete", appointment_id)     remove by id
+Op = Tuple[str, Any]
+
+
+class SlotUnavailableError(ValueError):
+    """Raised by a backend that detects a conflicting booking at write time."""
+
+    def __init__(self, message: str = "Time slot not available"):
+        super().__init__(message)
+
+
+class Storage(Protocol):
+    """Persistence backend behind the resident AppointmentStore."""
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Read every appointment."""
+
+    def changed(self) -> bool:
+        """Cheap, non-blocking hint that :meth:`poll` may find changes."""
+
+    def missing(self, date: Optional[str]) -> bool:
+        """Whether data for ``date`` (None: any date) hasn't been read yet."""
+
+    def fetch(self, date: Optional[str]) -> List[Op]:
+        """Read the not-yet-loaded data covering ``date`` (None: all of it)."""
+
+    def missing_id(self, appointment_id: str) -> bool:
+        """Whether the data that could hold ``appointment_id`` may be unread."""
+
+    def fetch_id(self, appointment_id: str) -> List[Op]:
+        """Read the not-yet-loaded data that could hold ``appointment_id``."""
+
+    def poll(self) -> Optional[List[Op]]:
+        """Return changes made elsewhere since the last load/poll, or None."""
+
+    def write(self, ops: List[Op], appointments: Iterable[Dict[str, Any]]) -> None:
+        """Persist ``ops``; ``appointments`` is the state after applying them."""
+
+    def save_all(self, appointments: Iterable[Dict[str, Any]]) -> None:
+        """Replace everything with ``appointments``."""
+
+    def pending(self) -> int:
+        """Number of writes a :meth:`compact` call would fold away."""
+
+    def compact(self, appointments: Iterable[Dict[str, Any]]) -> None:
+        """Fold incremental writes into the base representation."""
+
+
+def file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class JsonFileStorage:
+    """Whole-file JSON storage: every write rewrites the file."""
+
+    def __init__(
+        self,
+        path: Path,
+        read: Callable[[Path], Any],
+        write: Callable[[Path, Any], None],
+        version: Callable[[], int] = lambda: 0,
+    ):
+        self.path = path
+        self._read = read
+        self._write = write
+        # Write counter kept by the store's ProcessLock; catches rewrites the
+        # stat signature alone could miss
+        self._version = version
+        self._signature: Optional[tuple] = None
+
+    def _current_signature(self) -> tuple:
+        return (self._version(), file_signature(self.path))
+
+    def load(self) -> List[Dict[str, Any]]:
+        signature = self._current_signature()
+        data = self._read(self.path)
+        self._signature = signature
+        return data if isinstance(data, list) else []
+
+    def changed(self) -> bool:
+        return self._current_signature() != self._signature
+
+    def missing(self, date: Optional[str]) -> bool:
+        return False
+
+    def fetch(self, date: Optional[str]) -> List[Op]:
+        return []
+
+    def missing_id(self, appointment_id: str) -> bool:
+        return False
+
+    def fetch_id(self, appointment_id: str) -> List[Op]:
+        return []
+
+    def poll(self) -> Optional[List[Op]]:
+        if not self.changed():
+            return None
+        return [("reset", self.load())]
+
+    def write(self, ops: List[Op], appointments: Iterable[Dict[str, Any]]) -> None:
+        self.save_all(appointments)
+
+    def save_all(self, appointments: Iterable[Dict[str, Any]]) -> None:
+        self._write(self.path, list(appointments))
+        self._signature = self._current_signature()
+
+    def pending(self) -> int:
+        return 0
+
+    def compact(self, appointments: Iterable[Dict[str, Any]]) -> None:
+        pass
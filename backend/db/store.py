@@ -0,0 +1,329 @@
+import contextlib
+import itertools
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from backend.db.index import DateIndex
+from backend.db.locks import ProcessLock
+from backend.db.record import Appointment, day_ordinal
+from backend.db.storage import Op
+from backend.utils.metrics import storage_duration, timed
+from backend.utils.profiling import layer
+
+_generations = itertools.count(1)
+
+# Returned by read_nowait when the read would have to wait or do I/O
+NOT_READY = object()
+
+
+class _WouldBlock(Exception):
+    """A read inside read_nowait needs data the backend hasn't handed over."""
+
+
+def _record(value: Union[Dict[str, Any], Appointment]) -> Appointment:
+    return value if isinstance(value, Appointment) else Appointment.from_dict(value)
+
+
+def _day(date: str) -> Optional[int]:
+    # A malformed date can't have bookings; reads treat it as an empty day
+    try:
+        return day_ordinal(date)
+    except (TypeError, ValueError):
+        return None
+
+
+def _from_storage(ops: List[Op]) -> List[Op]:
+    records: List[Op] = []
+    for kind, value in ops:
+        if kind == "reset":
+            records.append((kind, [_record(appt) for appt in value]))
+        elif kind == "put":
+            records.append((kind, _record(value)))
+        else:
+            records.append((kind, value))
+    return records
+
+
+def _to_storage(ops: List[Op]) -> List[Op]:
+    return [(kind, value.to_dict() if kind == "put" else value) for kind, value in ops]
+
+
+class AppointmentStore:
+    """Process-resident copy of the appointment data.
+
+    The storage backend is read once and then served from memory; writes go
+    through to the backend. Every access asks the backend whether anything
+    changed (a ``stat`` for file storage) and polls it if so, so changes made
+    by another process are picked up instead of silently drifting from what
+    is on disk.
+
+    Writes hold ``lock``'s writer slot across refresh, apply and persist, so
+    a whole-file rewrite always starts from the latest state on disk and
+    never drops another worker's update.
+
+    Appointments are held as compact :class:`Appointment` records; public
+    methods take and return the dict format used by the API and storage.
+    """
+
+    def __init__(self, storage, lock: Optional[ProcessLock] = None):
+        self.storage = storage
+        self._backend = type(storage).__name__
+        self.lock = lock or ProcessLock()
+        self._lock = threading.RLock()
+        self._appointments: Dict[str, Appointment] = {}
+        self._index = DateIndex()
+        self._loaded = False
+        self._nowait = False
+        # Changes whenever data arrives from outside this store (initial load,
+        # another process's writes), which callers caching derived data can't
+        # attribute to specific dates.
+        self.generation = next(_generations)
+
+    def _apply(self, ops: List[Op]) -> None:
+        for kind, value in ops:
+            if kind == "reset":
+                self._appointments = {appt.id: appt for appt in value}
+                self._index.clear()
+                for appt in self._appointments.values():
+                    self._index.add(appt)
+            elif kind == "put":
+                previous = self._appointments.get(value.id)
+                if previous is not None:
+                    self._index.remove(previous)
+                self._appointments[value.id] = value
+                self._index.add(value)
+            elif kind == "delete":
+                previous = self._appointments.pop(value, None)
+                if previous is not None:
+                    self._index.remove(previous)
+
+    @contextlib.contextmanager
+    def _timed(self, op: str) -> Iterator[None]:
+        with timed(storage_duration, backend=self._backend, op=op), layer("storage"):
+            yield
+
+    def _refresh(self, force: bool = False) -> None:
+        if not self._loaded:
+            with self._timed("load"):
+                appointments = self.storage.load()
+            self._apply(_from_storage([("reset", appointments)]))
+            self._loaded = True
+            self.generation = next(_generations)
+            return
+        if not force and not self.storage.changed():
+            return
+        with self._timed("poll"):
+            ops = self.storage.poll()
+        if ops:
+            self._apply(_from_storage(ops))
+            self.generation = next(_generations)
+
+    def _ensure(self, date: Optional[str]) -> None:
+        # Backends that load lazily (sharded files) hand over the data for
+        # ``date`` on first use; None means everything. It was on disk all
+        # along, so this doesn't count as a change for the generation.
+        if not self.storage.missing(date):
+            return
+        if self._nowait:
+            raise _WouldBlock
+        with self._timed("fetch"):
+            ops = self.storage.fetch(date)
+        self._apply(_from_storage(ops))
+
+    def _ensure_id(self, appointment_id: str) -> None:
+        # Like _ensure, for whichever data holds ``appointment_id``
+        if not self.storage.missing_id(appointment_id):
+            return
+        if self._nowait:
+            raise _WouldBlock
+        with self._timed("fetch"):
+            ops = self.storage.fetch_id(appointment_id)
+        self._apply(_from_storage(ops))
+
+    def _ensure_record(self, record: Appointment) -> None:
+        # A write needs the booking's current month, in case it moves, and
+        # the month it lands in
+        self._ensure_id(record.id)
+        self._ensure(record.date)
+
+    def _dicts(self) -> Iterator[Dict[str, Any]]:
+        return (appt.to_dict() for appt in self._appointments.values())
+
+    def _commit(self, ops: List[Op]) -> None:
+        undo: List[Op] = []
+        for kind, value in ops:
+            appt_id = value.id if kind == "put" else value
+            previous = self._appointments.get(appt_id)
+            undo.append(("put", previous) if previous is not None else ("delete", appt_id))
+        self._apply(ops)
+        try:
+            self.lock.bump()
+            with self._timed("write"):
+                self.storage.write(_to_storage(ops), self._dicts())
+        except Exception:
+            self._apply(list(reversed(undo)))
+            raise
+
+    def count(self) -> int:
+        """Appointments currently held in memory."""
+        return len(self._appointments)
+
+    def load(self) -> int:
+        """Bring the store up to date and return its generation."""
+        with self._lock:
+            self._refresh()
+            return self.generation
+
+    def read_nowait(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Call ``fn(*args)`` only if memory is current and the lock is free.
+
+        Returns ``NOT_READY`` instead of blocking on a writer or touching the
+        backend, so async callers can run cheap reads on the event loop and
+        fall back to a thread otherwise.
+        """
+        if not self._lock.acquire(blocking=False):
+            return NOT_READY
+        try:
+            if not self._loaded or self.storage.changed():
+                return NOT_READY
+            self._nowait = True
+            try:
+                return fn(*args)
+            except _WouldBlock:
+                return NOT_READY
+            finally:
+                self._nowait = False
+        finally:
+            self._lock.release()
+
+    def all(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            self._ensure(None)
+            return list(self._dicts())
+
+    def iter_all(self) -> Iterator[Dict[str, Any]]:
+        """Every appointment, converted to a dict only as it is consumed.
+
+        Holds the store lock until the iteration finishes, so writes in
+        this process wait for it.
+        """
+        with self._lock:
+            self._refresh()
+            self._ensure(None)
+            yield from self._dicts()
+
+    def get(self, appointment_id: str) -> Optional[Dict[str, Any]]:
+        record = self.get_record(appointment_id)
+        return record.to_dict() if record is not None else None
+
+    def get_record(self, appointment_id: str) -> Optional[Appointment]:
+        with self._lock:
+            self._refresh()
+            self._ensure_id(appointment_id)
+            return self._appointments.get(appointment_id)
+
+    def on_date(self, date: str) -> List[Dict[str, Any]]:
+        """Appointments on ``date`` ordered by start time."""
+        with self._lock:
+            self._refresh()
+            self._ensure(date)
+            return [
+                self._appointments[appt_id].to_dict()
+                for _, _, appt_id in self._index.day(_day(date))
+            ]
+
+    def intervals(self, date: str) -> List[Tuple[int, int, str]]:
+        """Start-sorted (start, end, id) minute intervals booked on ``date``."""
+        with self._lock:
+            self._refresh()
+            self._ensure(date)
+            return list(self._index.day(_day(date)))
+
+    def occupancy(self, date: str) -> int:
+        """Bitset of the minutes booked on ``date`` (bit ``m`` is minute ``m``)."""
+        with self._lock:
+            self._refresh()
+            self._ensure(date)
+            return self._index.occupancy(_day(date))
+
+    def is_free(self, date: str, start: int, end: int, exclude_id: Optional[str] = None) -> bool:
+        """Whether the minute range [start, end) on ``date`` is unbooked, apart from ``exclude_id``."""
+        with self._lock:
+            self._refresh()
+            self._ensure(date)
+            return self._index.is_free(_day(date), start, end, exclude_id)
+
+    def conflicts(
+        self,
+        date: str,
+        start: int,
+        end: int,
+        exclude_id: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Appointments on ``date`` overlapping the minute range [start, end)."""
+        with self._lock:
+            self._refresh()
+            self._ensure(date)
+            return [
+                self._appointments[appt_id].to_dict()
+                for _, _, appt_id in self._index.overlapping(_day(date), start, end)
+                if appt_id != exclude_id
+            ]
+
+    def put(self, appointment: Union[Dict[str, Any], Appointment]) -> None:
+        """Insert or update a booking."""
+        record = _record(appointment)
+        with self._lock, self.lock.writer():
+            self._refresh(force=True)
+            self._ensure_record(record)
+            self._commit([("put", record)])
+
+    def put_many(self, appointments: List[Union[Dict[str, Any], Appointment]]) -> None:
+        """Write several appointments as one backend write."""
+        if not appointments:
+            return
+        records = [_record(appt) for appt in appointments]
+        with self._lock, self.lock.writer():
+            self._refresh(force=True)
+            for record in records:
+                self._ensure_record(record)
+            self._commit([("put", record) for record in records])
+
+    def replace(self, appointment: Union[Dict[str, Any], Appointment]) -> bool:
+        """Overwrite an existing appointment; False if it no longer exists."""
+        record = _record(appointment)
+        with self._lock, self.lock.writer():
+            self._refresh(force=True)
+            self._ensure_record(record)
+            if record.id not in self._appointments:
+                return False
+            self._commit([("put", record)])
+            return True
+
+    def delete(self, appointment_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock, self.lock.writer():
+            self._refresh(force=True)
+            self._ensure_id(appointment_id)
+            removed = self._appointments.get(appointment_id)
+            if removed is not None:
+                self._commit([("delete", appointment_id)])
+            return removed.to_dict() if removed is not None else None
+
+    def replace_all(self, appointments: List[Dict[str, Any]]) -> None:
+        with self._lock, self.lock.writer():
+            self.lock.bump()
+            records = [_record(appt) for appt in appointments]
+            with self._timed("save_all"):
+                self.storage.save_all(appointments)
+            self._apply([("reset", records)])
+            self._loaded = True
+            self.generation = next(_generations)
+
+    def compact(self, min_records: int = 1) -> None:
+        with self._lock, self.lock.writer():
+            self._refresh(force=True)
+            self._ensure(None)
+            if self.storage.pending() >= max(min_records, 1):
+                with self._timed("compact"):
+                    self.storage.compact(self._dicts())
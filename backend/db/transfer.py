@@ -0,0 +1,381 @@
+"""Stream appointments in and out of the configured store as NDJSON.
+
+    python -m backend.db.transfer export backup.ndjson
+    python -m backend.db.transfer import backup.ndjson [--replace]
+    python -m backend.db.transfer seed 1000000 [--output synthetic.ndjson]
+
+Each line is one appointment in the store's own format. Imports are
+validated through ``BookingRequest``/``PatientInfo`` a batch at a time and
+written with one store write per batch, so the import holds one batch at
+a time; rows/sec go to stderr. Rows overlapping a stored appointment or an
+earlier row are rejected by line number. Email validation bounds import
+speed at a few thousand rows/sec, so ``seed`` writes its generated rows to
+the store directly.
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import random
+import sys
+import time
+from datetime import date as Date, timedelta
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+from backend.db import database
+from backend.db.index import DateIndex
+from backend.db.record import Appointment
+from backend.db.storage import SlotUnavailableError
+from backend.models.schemas import BookingRequest
+from backend.utils.time_utils import from_minutes, to_minutes
+
+BATCH_SIZE = 10000
+MAX_REPORTED_ERRORS = 10
+
+_batch_adapter = TypeAdapter(List[BookingRequest])
+
+
+# json.dumps builds a new encoder per call when given separators
+_encoder = json.JSONEncoder(separators=(",", ":"))
+
+
+def _encode(appointment: Dict[str, Any]) -> str:
+    return _encoder.encode(appointment) + "\n"
+
+
+def export_ndjson(out: IO[str]) -> int:
+    """Write every stored appointment to ``out``; returns the row count.
+
+    Rows are encoded one at a time from the resident store, so memory use
+    doesn't grow with the export beyond the store itself.
+    """
+    count = 0
+    for appointment in database.iter_appointments():
+        out.write(_encode(appointment))
+        count += 1
+    return count
+
+
+def _check_record(record: Dict[str, Any]) -> Optional[str]:
+    """Store-level checks BookingRequest doesn't cover; None if valid."""
+    for field in ("id", "confirmation_code"):
+        if not isinstance(record.get(field), str) or not record[field]:
+            return f"missing {field}"
+    duration = database.APPOINTMENT_TYPES.get(record.get("appointment_type"))
+    if duration is None:
+        return "invalid appointment type"
+    try:
+        Date.fromisoformat(record["date"])
+        end_min = to_minutes(record["start_time"]) + duration
+    except (TypeError, ValueError):
+        return "invalid date or start_time"
+    if end_min > 24 * 60:
+        return "appointment must end by midnight"
+    end = from_minutes(end_min)
+    if record.get("end_time", end) != end:
+        return "end_time does not match appointment type"
+    return None
+
+
+def _record_errors(records: List[Dict[str, Any]]) -> Dict[int, str]:
+    errors: Dict[int, str] = {}
+    try:
+        # One pydantic-core call per batch; only a failing batch is walked
+        _batch_adapter.validate_python(records)
+    except ValidationError as exc:
+        for error in exc.errors():
+            index = error["loc"][0]
+            if isinstance(index, int) and index not in errors:
+                field = ".".join(str(part) for part in error["loc"][1:])
+                errors[index] = f"{field}: {error['msg']}"
+    for index, record in enumerate(records):
+        if index not in errors:
+            problem = _check_record(record)
+            if problem is not None:
+                errors[index] = problem
+    return errors
+
+
+def _parse(lines: Iterable[str]) -> Iterator[Tuple[int, Any]]:
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield number, exc
+
+
+def _stored_conflicts(
+    date: str, start: int, end: int, appointment_id: str, moved: Dict[str, Appointment]
+) -> bool:
+    if database.slot_is_free(date, start, end, exclude_id=appointment_id):
+        return False
+    # Stored appointments upserted by earlier rows are checked at their new place
+    conflicts = database.find_conflicts(date, start, end, exclude_id=appointment_id)
+    return any(conflict["id"] not in moved for conflict in conflicts)
+
+
+def _overlap_errors(records: List[Dict[str, Any]], check_store: bool) -> Dict[int, str]:
+    """Problems by index for rows that overlap an earlier row of the batch.
+
+    With ``check_store`` rows are checked against stored appointments too.
+    A row never conflicts with the appointment whose id it upserts, nor
+    with stored appointments that earlier rows move elsewhere.
+    """
+    errors: Dict[int, str] = {}
+    batch = DateIndex()
+    accepted: Dict[str, Appointment] = {}
+    for index, record in enumerate(records):
+        appointment = Appointment.from_dict(record)
+        day, start, end = appointment.day, appointment.start, appointment.end
+        if not batch.is_free(day, start, end, exclude_id=appointment.id):
+            errors[index] = "overlaps an earlier row"
+        elif check_store and _stored_conflicts(
+            record["date"], start, end, appointment.id, accepted
+        ):
+            errors[index] = "overlaps a stored appointment"
+        else:
+            previous = accepted.pop(appointment.id, None)
+            if previous is not None:
+                batch.remove(previous)
+            accepted[appointment.id] = appointment
+            batch.add(appointment)
+    return errors
+
+
+def _write_rows(rows: List[Tuple[int, Dict[str, Any]]]) -> Dict[int, str]:
+    """Upsert rows one at a time; returns the errors by line number."""
+    errors = {}
+    for number, record in rows:
+        try:
+            database.upsert_appointment(record)
+        except SlotUnavailableError as exc:
+            errors[number] = str(exc)
+    return errors
+
+
+def import_ndjson(
+    lines: Iterable[str],
+    batch_size: int = BATCH_SIZE,
+    replace: bool = False,
+    log: IO[str] = sys.stderr,
+) -> Tuple[int, int]:
+    """Validate and store appointments from NDJSON ``lines``.
+
+    Rows are upserted by id, one store write per batch. Rows that overlap
+    a stored appointment or an earlier row are rejected like invalid ones.
+    With ``replace`` the first batch replaces the existing appointments and
+    the rest are upserted after it, so only one batch is held at a time;
+    an import that fails part way leaves the batches written so far.
+    Invalid rows are skipped and reported to ``log``. Returns
+    ``(imported, rejected)``.
+    """
+    imported = rejected = 0
+    pending_reset = replace
+    rows = _parse(lines)
+
+    def reject(number: int, problem: str) -> None:
+        nonlocal rejected
+        rejected += 1
+        if rejected <= MAX_REPORTED_ERRORS:
+            print(f"line {number}: {problem}", file=log)
+
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        records = []
+        for number, value in batch:
+            if isinstance(value, dict):
+                records.append((number, value))
+            else:
+                reject(number, "not a JSON object")
+        errors = _record_errors([record for _, record in records])
+        valid = []
+        for index, (number, record) in enumerate(records):
+            if index in errors:
+                reject(number, errors[index])
+                continue
+            duration = database.APPOINTMENT_TYPES[record["appointment_type"]]
+            record.setdefault(
+                "end_time", from_minutes(to_minutes(record["start_time"]) + duration)
+            )
+            valid.append((number, record))
+
+        dates = sorted({record["date"] for _, record in valid})
+        with database.date_locks(dates):
+            # The stored appointments are about to be discarded on a reset
+            overlaps = _overlap_errors(
+                [record for _, record in valid], check_store=not pending_reset
+            )
+            accepted = []
+            for index, (number, record) in enumerate(valid):
+                if index in overlaps:
+                    reject(number, overlaps[index])
+                else:
+                    accepted.append((number, record))
+            if pending_reset:
+                database.save_appointments([record for _, record in accepted])
+                pending_reset = False
+            else:
+                try:
+                    database.upsert_appointments([record for _, record in accepted])
+                except SlotUnavailableError:
+                    # Another writer got in first (SQL storage re-checks in
+                    # its transaction); find the rows it blocked
+                    failed = _write_rows(accepted)
+                    for number, problem in failed.items():
+                        reject(number, problem)
+                    accepted = [row for row in accepted if row[0] not in failed]
+        imported += len(accepted)
+    if pending_reset:
+        database.save_appointments([])
+    if rejected > MAX_REPORTED_ERRORS:
+        print(f"... {rejected - MAX_REPORTED_ERRORS} more invalid rows", file=log)
+    return imported, rejected
+
+
+def synthetic_appointments(
+    count: int, start: Date = Date(2030, 1, 1), seed: int = 0
+) -> Iterator[Dict[str, Any]]:
+    """Yield ``count`` synthetic appointments in working hours that never overlap."""
+    rng = random.Random(seed)
+    schedule = database.get_schedule()
+    if count > 0 and not schedule.open_weekly:
+        raise ValueError("The doctor schedule has no weekly working hours")
+    types = list(database.APPOINTMENT_TYPES.items())
+    clock = [from_minutes(minute) for minute in range(24 * 60 + 1)]
+    made = 0
+    day = start
+    while made < count:
+        date = day.isoformat()
+        for block_start, block_end in schedule.blocks(date):
+            current = block_start
+            while made < count:
+                appointment_type, duration = rng.choice(types)
+                if current + duration > block_end:
+                    break
+                made += 1
+                yield {
+                    "id": f"SEED-{made:08}",
+                    "appointment_type": appointment_type,
+                    "date": date,
+                    "start_time": clock[current],
+                    "end_time": clock[current + duration],
+                    "patient": {
+                        "name": f"Patient {made}",
+                        "email": f"patient{made}@example.com",
+                        "phone": f"555-{made % 10000:04}",
+                    },
+                    "reason": "Synthetic load",
+                    "confirmation_code": f"S{made:08}",
+                }
+                # Leave a gap now and then so the day isn't always fully booked
+                current += duration + rng.choice((0, 0, 0, 15))
+        day += timedelta(days=1)
+
+
+def seed_ndjson(
+    count: int, out: IO[str], start: Date = Date(2030, 1, 1), seed: int = 0
+) -> int:
+    """Write ``count`` synthetic appointments to ``out`` as NDJSON."""
+    written = 0
+    for appointment in synthetic_appointments(count, start, seed):
+        out.write(_encode(appointment))
+        written += 1
+    return written
+
+
+def seed_store(
+    count: int,
+    start: Date = Date(2030, 1, 1),
+    seed: int = 0,
+    batch_size: int = BATCH_SIZE,
+) -> int:
+    """Add ``count`` synthetic appointments to the store, one write per batch.
+
+    Generated rows are valid by construction, so this skips the per-row
+    validation that dominates :func:`import_ndjson`.
+    """
+    seeded = 0
+    appointments = synthetic_appointments(count, start, seed)
+    while True:
+        batch = list(itertools.islice(appointments, batch_size))
+        if not batch:
+            return seeded
+        database.upsert_appointments(batch)
+        seeded += len(batch)
+
+
+def _report(action: str, rows: int, started: float, log: IO[str]) -> None:
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(
+        f"{action} {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s)",
+        file=log,
+    )
+
+
+def _open(path: str, mode: str):
+    if path == "-":
+        # Leave the standard streams open for the caller
+        return contextlib.nullcontext(sys.stdin if "r" in mode else sys.stdout)
+    return open(path, mode, encoding="utf-8")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.db.transfer",
+        description="Import, export and seed appointments as NDJSON.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="write all appointments as NDJSON")
+    export.add_argument(
+        "path", nargs="?", default="-", help="output file, - for stdout"
+    )
+
+    load = commands.add_parser("import", help="validate and store NDJSON appointments")
+    load.add_argument("path", nargs="?", default="-", help="input file, - for stdin")
+    load.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    load.add_argument(
+        "--replace",
+        action="store_true",
+        help="discard existing appointments, replacing them with the first batch",
+    )
+
+    seed = commands.add_parser("seed", help="add synthetic appointments to the store")
+    seed.add_argument("count", type=int)
+    seed.add_argument(
+        "--output", help="write NDJSON here (- for stdout) instead of storing"
+    )
+    seed.add_argument("--start-date", type=Date.fromisoformat, default=Date(2030, 1, 1))
+    seed.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    if args.command == "export":
+        with _open(args.path, "w") as out:
+            rows = export_ndjson(out)
+        _report("exported", rows, started, sys.stderr)
+    elif args.command == "import":
+        with _open(args.path, "r") as lines:
+            rows, rejected = import_ndjson(lines, args.batch_size, args.replace)
+        _report("imported", rows, started, sys.stderr)
+        if rejected:
+            print(f"rejected {rejected} invalid rows", file=sys.stderr)
+            return 1
+    elif args.output:
+        with _open(args.output, "w") as out:
+            rows = seed_ndjson(args.count, out, args.start_date, args.seed)
+        _report("generated", rows, started, sys.stderr)
+    else:
+        rows = seed_store(args.count, args.start_date, args.seed)
+        _report("seeded", rows, started, sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
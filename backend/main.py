@@ -1,17 +1,50 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
 from backend.api.calendly_integration import router as calendly_router
 from backend.api.auth import router as auth_router
+from backend.api.metrics import router as metrics_router
+from backend.db.database import (
+    get_schedule,
+    get_store,
+    start_change_log_pruner,
+    start_compactor,
+)
+from backend.utils.metrics import METRICS_ENABLED, MetricsMiddleware
+from backend.utils.profiling import ProfilingMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Parse the appointments file once up front instead of on the first request
+    get_store().load()
+    # Compile the schedule's slot grids now too, and fail fast if it's invalid
+    get_schedule()
+    jobs = [job for job in (start_compactor(), start_change_log_pruner()) if job]
+    yield
+    for job in jobs:
+        job.stop()
+
 
 app = FastAPI(
     title="Medical Appointment Scheduling Agent",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.include_router(auth_router)
 
 app.include_router(calendly_router)
 
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics_router)
+
+# Outermost, so a profile covers the other middleware too; idle unless
+# PROFILE_SAMPLE_RATE or PROFILE_USERS is set
+app.add_middleware(ProfilingMiddleware)
+
 
 @app.get("/")
 def root():
@@ -13,3 +13,6 @@ class TokenResponse(BaseModel):
 
 class RefreshRequest(BaseModel):
     refresh_token: str
+
+class LogoutResponse(BaseModel):
+    status: str
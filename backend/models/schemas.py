@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List, Optional
 from pydantic import BaseModel, EmailStr
 
 
@@ -13,6 +13,23 @@ class AvailabilityResponse(BaseModel):
     available_slots: List[TimeSlot]
 
 
+class TypedAvailabilityResponse(BaseModel):
+    date: str
+    slots_by_type: Dict[str, List[TimeSlot]]
+
+
+class OpenSlot(BaseModel):
+    date: str
+    start_time: str
+    end_time: str
+
+
+class NextAvailableResponse(BaseModel):
+    appointment_type: str
+    slots: List[OpenSlot]
+    days_searched: int
+
+
 class PatientInfo(BaseModel):
     name: str
     email: EmailStr
@@ -34,6 +51,26 @@ class BookingResponse(BaseModel):
     details: dict
 
 
+class BulkBookingRequest(BaseModel):
+    bookings: List[BookingRequest]
+    atomic: bool = True
+
+
+class BulkBookingResult(BaseModel):
+    index: int
+    status: str
+    booking_id: Optional[str] = None
+    confirmation_code: Optional[str] = None
+    details: Optional[dict] = None
+    error: Optional[str] = None
+
+
+class BulkBookingResponse(BaseModel):
+    status: str
+    booked: int
+    results: List[BulkBookingResult]
+
+
 class RescheduleRequest(BaseModel):
     appointment_id: str
     appointment_type: str
@@ -54,3 +91,12 @@ class DeleteResponse(BaseModel):
     status: str
     message: str
 
+
+
+class CacheStatsResponse(BaseModel):
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    max_entries: int
+    hit_ratio: float
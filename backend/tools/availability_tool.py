@@ -1,47 +1,216 @@
-from datetime import datetime, timedelta
+import os
+from datetime import date as Date, timedelta
 
 from backend.db.database import (
-    load_appointments,
-    load_doctor_schedule,
+    get_schedule,
+    occupancy,
+    store_generation,
     APPOINTMENT_TYPES,
 )
+from backend.db.schedule import Schedule
+from backend.tools.slot_cache import SlotCache
+from backend.utils.profiling import layer
+from backend.utils.time_utils import to_minutes
 
+MAX_RANGE_DAYS = 92
+MAX_SEARCH_DAYS = 366
+MAX_SEARCH_RESULTS = 50
+AVAILABILITY_CACHE_SIZE = int(os.getenv("AVAILABILITY_CACHE_SIZE", "4096"))
 
-def generate_daily_slots(date: str, appointment_type: str):
-    schedule = load_doctor_schedule()["working_hours"]
-    start_time = schedule["start"]
-    end_time = schedule["end"]
+# Shared by every caller of generate_daily_slots; cached slot lists must be
+# treated as read-only.
+slot_cache = SlotCache(AVAILABILITY_CACHE_SIZE)
+
+
+def invalidate_availability(*dates: str) -> None:
+    """Drop cached availability for dates whose bookings just changed."""
+    slot_cache.invalidate(*dates)
 
-    duration = APPOINTMENT_TYPES[appointment_type]
 
-    start_dt = datetime.strptime(f"{date} {start_time}", "%Y-%m-%d %H:%M")
-    end_dt = datetime.strptime(f"{date} {end_time}", "%Y-%m-%d %H:%M")
+def availability_etag(date: str) -> str:
+    """Weak ETag for ``date``'s availability.
 
-    appointments = load_appointments()
+    The tag changes with anything that can change the date's slots.
+    Bookings, deletions and reschedules bump the date's version. Writes by
+    other workers move the store generation, and schedule edits move the
+    schedule version. Read the tag before generating the slots, so that a
+    write landing in between leaves it older than the body, not newer.
+    Raises ValueError for a malformed date, so no tag ever matches one.
+    """
+    try:
+        Date.fromisoformat(date)
+    except ValueError:
+        raise ValueError("Dates must be in YYYY-MM-DD format") from None
+    generation, schedule = store_generation(), get_schedule().version
+    return f'W/"{slot_cache.epoch}-{generation}-{schedule}-{slot_cache.version(date)}"'
 
-    slots = []
 
-    current = start_dt
-    while current + timedelta(minutes=duration) <= end_dt:
-        s = current.strftime("%H:%M")
-        e = (current + timedelta(minutes=duration)).strftime("%H:%M")
+def _free(date: str, grid):
+    """Yield ``(slot, available)`` for each slot of the day's grid."""
+    if not grid:
+        return
+    busy = occupancy(date)
+    for slot in grid:
+        yield slot, not busy & slot[4]
 
-        available = True
-        for appt in appointments:
-            if appt["date"] != date:
-                continue
-            if not (appt["end_time"] <= s or appt["start_time"] >= e):
-                available = False
 
-        slots.append(
-            {
-                "start_time": s,
-                "end_time": e,
-                "available": available,
+def _compute_day_slots(busy: int, grid):
+    return [
+        {
+            "start_time": slot[2],
+            "end_time": slot[3],
+            "available": not busy & slot[4],
+        }
+        for slot in grid
+    ]
+
+
+def _day_slots_by_type(date: str, schedule: Schedule, appointment_types):
+    """Slots per appointment type, from one read of the day's occupancy."""
+    with layer("slots"):
+        stamp = (store_generation(), schedule.version)
+        result = {}
+        missing = []
+        for appointment_type in appointment_types:
+            slots = slot_cache.get(date, appointment_type, stamp)
+            if slots is None:
+                missing.append(appointment_type)
+            else:
+                result[appointment_type] = slots
+        if missing:
+            version = slot_cache.version(date)
+            grids = {
+                appointment_type: schedule.grid(date, appointment_type)
+                for appointment_type in missing
             }
-        )
+            busy = occupancy(date) if any(grids.values()) else 0
+            for appointment_type, grid in grids.items():
+                slots = result[appointment_type] = _compute_day_slots(busy, grid)
+                slot_cache.put(date, appointment_type, stamp, slots, version)
+        return {
+            appointment_type: result[appointment_type]
+            for appointment_type in appointment_types
+        }
+
+
+def _day_slots(date: str, schedule: Schedule, appointment_type: str):
+    return _day_slots_by_type(date, schedule, (appointment_type,))[appointment_type]
+
+
+def generate_daily_slots(date: str, appointment_type: str):
+    return _day_slots(date, get_schedule(), appointment_type)
+
+
+def parse_appointment_types(text):
+    """Validate a comma-separated subset of ``APPOINTMENT_TYPES``; empty means all."""
+    if not text:
+        return list(APPOINTMENT_TYPES)
+    appointment_types = []
+    for name in text.split(","):
+        name = name.strip()
+        if name not in APPOINTMENT_TYPES:
+            raise ValueError(f"Invalid appointment type: {name}")
+        if name not in appointment_types:
+            appointment_types.append(name)
+    return appointment_types
+
+
+def generate_slots_by_type(date: str, appointment_types):
+    """Slots for each of ``appointment_types`` on ``date``, from one booking read."""
+    return _day_slots_by_type(date, get_schedule(), appointment_types)
+
+
+def parse_date_range(start_date: str, end_date: str):
+    """Validate an inclusive date range and return it as ``date`` objects."""
+    try:
+        first = Date.fromisoformat(start_date)
+        last = Date.fromisoformat(end_date)
+    except ValueError as exc:
+        raise ValueError("Dates must be in YYYY-MM-DD format") from exc
+    if last < first:
+        raise ValueError("end_date must not be before start_date")
+    if (last - first).days >= MAX_RANGE_DAYS:
+        raise ValueError(f"Date range may span at most {MAX_RANGE_DAYS} days")
+    return first, last
+
+
+def generate_range_slots(first: Date, last: Date, appointment_type: str):
+    """Yield ``(date, slots)`` for every day from ``first`` to ``last``."""
+    schedule = get_schedule()
+    day = first
+    while day <= last:
+        date = day.isoformat()
+        yield date, _day_slots(date, schedule, appointment_type)
+        day += timedelta(days=1)
+
+
+def generate_range_slots_by_type(first: Date, last: Date, appointment_types):
+    """Yield ``(date, slots_by_type)`` for every day from ``first`` to ``last``."""
+    schedule = get_schedule()
+    day = first
+    while day <= last:
+        date = day.isoformat()
+        yield date, _day_slots_by_type(date, schedule, appointment_types)
+        day += timedelta(days=1)
+
+
+def _parse_window(window_start, window_end):
+    try:
+        start = to_minutes(window_start) if window_start else 0
+        end = to_minutes(window_end) if window_end else 24 * 60
+    except ValueError:
+        raise ValueError("Times must be in HH:MM format") from None
+    if end <= start:
+        raise ValueError("window_end must be after window_start")
+    return start, end
+
 
-        current += timedelta(minutes=duration)
+def find_next_available(
+    appointment_type: str,
+    start_date: str,
+    horizon_days: int = 30,
+    limit: int = 5,
+    window_start=None,
+    window_end=None,
+):
+    """Find the first ``limit`` free slots from ``start_date`` on.
 
-    return slots
+    Days are scanned in order, for at most ``horizon_days``, against that
+    day's indexed bookings, and the search stops as soon as ``limit`` slots
+    are found. Slots lie on the same grid as :func:`generate_daily_slots`
+    and, with a window, start and end within it. Returns
+    ``(slots, days_searched)``; slots are dicts with date, start_time and
+    end_time.
+    """
+    try:
+        day = Date.fromisoformat(start_date)
+    except ValueError as exc:
+        raise ValueError("Dates must be in YYYY-MM-DD format") from exc
+    if not 1 <= horizon_days <= MAX_SEARCH_DAYS:
+        raise ValueError(f"horizon_days must be between 1 and {MAX_SEARCH_DAYS}")
+    if not 1 <= limit <= MAX_SEARCH_RESULTS:
+        raise ValueError(f"limit must be between 1 and {MAX_SEARCH_RESULTS}")
+    earliest, latest = _parse_window(window_start, window_end)
+    schedule = get_schedule()
 
+    found = []
+    searched = 0
+    # Unlike the per-day routes this skips the slot cache, so a long search
+    # doesn't evict the entries clients are polling
+    with layer("slots"):
+        while searched < horizon_days and len(found) < limit:
+            date = day.isoformat()
+            searched += 1
+            for slot, available in _free(date, schedule.grid(date, appointment_type)):
+                if slot[1] > latest:
+                    break
+                if available and slot[0] >= earliest:
+                    found.append(
+                        {"date": date, "start_time": slot[2], "end_time": slot[3]}
+                    )
+                    if len(found) == limit:
+                        break
+            if day == Date.max:
+                break
+            day += timedelta(days=1)
+    return found, searched
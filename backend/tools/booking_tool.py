@@ -1,103 +1,221 @@
+import bisect
+import copy
 import random
+import re
 import string
 import uuid
 
 from backend.db.database import (
-    load_appointments,
-    save_appointments,
+    date_lock,
+    date_locks,
+    get_record,
+    upsert_appointment,
+    upsert_appointments,
+    replace_appointment,
+    remove_appointment,
+    slot_is_free,
     APPOINTMENT_TYPES,
 )
+from backend.db.record import Appointment, day_ordinal
+from backend.db.storage import SlotUnavailableError
+from backend.tools.availability_tool import invalidate_availability
+from backend.utils.time_utils import to_minutes
+
+MAX_BULK_BOOKINGS = 500
+
+_START_TIME = re.compile(r"([01]\d|2[0-3]):[0-5]\d")
+
+
+class InvalidBookingError(ValueError):
+    """A booking or reschedule request with a malformed or unknown field."""
 
 
 def generate_confirmation_code() -> str:
     return "".join(random.choices(string.ascii_uppercase + string.digits, k=6))
 
 
-def book_appointment(data):
-    appointments = load_appointments()
-
-    if data.appointment_type not in APPOINTMENT_TYPES:
-        raise ValueError("Invalid appointment type")
-    
-    duration = APPOINTMENT_TYPES[data.appointment_type]
-    start = data.start_time
-    end_dt = int(start.split(":")[0]) * 60 + int(start.split(":")[1]) + duration
-    end = f"{end_dt // 60:02}:{end_dt % 60:02}"
-
-    for appt in appointments:
-        if appt["date"] == data.date and not (
-            appt["end_time"] <= start or appt["start_time"] >= end
-        ):
-            raise ValueError("Time slot not available")
+def _new_appointment(data) -> Appointment:
+    duration = _parse_duration(data.appointment_type)
+    start_min = _parse_start(data.start_time)
 
     booking_id = f"APPT-{uuid.uuid4().hex[:6].upper()}"
     confirmation = generate_confirmation_code()
 
-    new_appointment = {
-        "id": booking_id,
-        "appointment_type": data.appointment_type,
-        "date": data.date,
-        "start_time": start,
-        "end_time": end,
-        "patient": data.patient.model_dump(),
-        "reason": data.reason,
-        "confirmation_code": confirmation,
-    }
+    return Appointment(
+        id=booking_id,
+        appointment_type=data.appointment_type,
+        day=_parse_day(data.date),
+        start=start_min,
+        end=_end_minute(start_min, duration),
+        patient_name=data.patient.name,
+        patient_email=data.patient.email,
+        patient_phone=data.patient.phone,
+        reason=data.reason,
+        confirmation_code=confirmation,
+    )
 
-    appointments.append(new_appointment)
-    save_appointments(appointments)
 
-    return new_appointment
+def _parse_duration(appointment_type: str) -> int:
+    if appointment_type not in APPOINTMENT_TYPES:
+        raise InvalidBookingError("Invalid appointment type")
+    return APPOINTMENT_TYPES[appointment_type]
 
 
-def delete_appointment(appointment_id: str):
-    appointments = load_appointments()
-    for idx, appt in enumerate(appointments):
-        if appt["id"] == appointment_id:
-            removed = appointments.pop(idx)
-            save_appointments(appointments)
-            return removed
-    raise ValueError("Appointment not found")
+def _parse_day(date: str) -> int:
+    try:
+        return day_ordinal(date)
+    except ValueError:
+        raise InvalidBookingError("Invalid date, expected YYYY-MM-DD") from None
 
 
-def reschedule_appointment(data):
-    appointments = load_appointments()
-    target = None
-    for appt in appointments:
-        if appt["id"] == data.appointment_id:
-            target = appt
-            break
+def _parse_start(start_time: str) -> int:
+    if not _START_TIME.fullmatch(start_time):
+        raise InvalidBookingError(
+            "Invalid start time, expected HH:MM between 00:00 and 23:59"
+        )
+    return to_minutes(start_time)
 
-    if target is None:
-        raise ValueError("Appointment not found")
 
-    if data.appointment_type not in APPOINTMENT_TYPES:
-        raise ValueError("Invalid appointment type")
-    
-    duration = APPOINTMENT_TYPES[data.appointment_type]
-    start = data.start_time
-    end_dt = int(start.split(":")[0]) * 60 + int(start.split(":")[1]) + duration
-    end = f"{end_dt // 60:02}:{end_dt % 60:02}"
+def _end_minute(start_min: int, duration: int) -> int:
+    # Every backend keeps a booking within its day (SQL stores TIME values)
+    if start_min + duration > 24 * 60:
+        raise InvalidBookingError("Appointments must end by midnight")
+    return start_min + duration
 
-    for appt in appointments:
-        if appt["id"] == data.appointment_id:
-            continue
-        if appt["date"] == data.date and not (
-            appt["end_time"] <= start or appt["start_time"] >= end
-        ):
+
+def book_appointment(data):
+    new_appointment = _new_appointment(data)
+    date = new_appointment.date
+
+    # The check and the write must not interleave with another booking
+    # for the same date, in this process or another worker
+    with date_lock(date):
+        if not slot_is_free(date, new_appointment.start, new_appointment.end):
             raise ValueError("Time slot not available")
+        upsert_appointment(new_appointment)
+    invalidate_availability(date)
+
+    return new_appointment.to_dict()
 
-    target.update(
-        {
-            "appointment_type": data.appointment_type,
-            "date": data.date,
-            "start_time": start,
-            "end_time": end,
-            "reason": data.reason or target.get("reason", ""),
-            "confirmation_code": generate_confirmation_code(),
+
+def _overlaps_batch(accepted, start_min, end_min) -> bool:
+    # accepted holds disjoint start-sorted intervals, so only the neighbours
+    # of the insertion point can overlap
+    i = bisect.bisect_left(accepted, (start_min, end_min))
+    if i > 0 and accepted[i - 1][1] > start_min:
+        return True
+    return i < len(accepted) and accepted[i][0] < end_min
+
+
+def _write_each(accepted, results):
+    written = []
+    for index, appointment in accepted:
+        try:
+            upsert_appointment(appointment)
+        except SlotUnavailableError as exc:
+            results[index] = {"index": index, "status": "rejected", "error": str(exc)}
+            continue
+        written.append((index, appointment))
+    return written
+
+
+def book_appointments(requests, atomic: bool = True):
+    """Book several appointments with one conflict pass and one write.
+
+    Each request is checked against existing bookings and against the
+    requests before it. With ``atomic`` nothing is written unless every
+    request can be booked; otherwise the bookable ones are written and the
+    rest are reported as rejected. Returns one result per request, in order.
+    """
+    if len(requests) > MAX_BULK_BOOKINGS:
+        raise ValueError(f"At most {MAX_BULK_BOOKINGS} bookings per request")
+
+    results = []
+    built = []
+    for index, data in enumerate(requests):
+        try:
+            built.append((index, _new_appointment(data)))
+            results.append({"index": index, "status": "pending"})
+        except ValueError as exc:
+            results.append({"index": index, "status": "rejected", "error": str(exc)})
+
+    dates = sorted({appointment.date for _, appointment in built})
+    accepted_by_day = {}
+    accepted = []
+    with date_locks(dates):
+        for index, appointment in built:
+            batch = accepted_by_day.setdefault(appointment.day, [])
+            start_min, end_min = appointment.start, appointment.end
+            if not slot_is_free(appointment.date, start_min, end_min):
+                error = "Time slot not available"
+            elif _overlaps_batch(batch, start_min, end_min):
+                error = "Overlaps another booking in this request"
+            else:
+                bisect.insort(batch, (start_min, end_min))
+                accepted.append((index, appointment))
+                continue
+            results[index] = {"index": index, "status": "rejected", "error": error}
+
+        if atomic and len(accepted) < len(requests):
+            accepted = []
+        elif accepted:
+            try:
+                upsert_appointments([appointment for _, appointment in accepted])
+            except SlotUnavailableError:
+                # Another worker got in first (SQL storage re-checks on
+                # write); find out which bookings are still possible
+                if atomic:
+                    raise
+                accepted = _write_each(accepted, results)
+
+    for index, appointment in accepted:
+        results[index] = {
+            "index": index,
+            "status": "confirmed",
+            "booking_id": appointment.id,
+            "confirmation_code": appointment.confirmation_code,
+            "details": appointment.to_dict(),
         }
-    )
+    for result in results:
+        if result["status"] == "pending":
+            result.update(status="not_booked", error="Batch rejected")
+    invalidate_availability(*{appointment.date for _, appointment in accepted})
+    return results
+
 
-    save_appointments(appointments)
-    return target
+def delete_appointment(appointment_id: str):
+    removed = remove_appointment(appointment_id)
+    if removed is None:
+        raise ValueError("Appointment not found")
+    invalidate_availability(removed["date"])
+    return removed
 
+
+def reschedule_appointment(data):
+    # Malformed input is reported as such even for an unknown id
+    duration = _parse_duration(data.appointment_type)
+    day = _parse_day(data.date)
+    start_min = _parse_start(data.start_time)
+    end_min = _end_minute(start_min, duration)
+
+    target = get_record(data.appointment_id)
+    if target is None:
+        raise ValueError("Appointment not found")
+
+    updated = copy.copy(target)
+    updated.appointment_type = data.appointment_type
+    updated.day = day
+    updated.start = start_min
+    updated.end = end_min
+    updated.reason = data.reason or target.reason or ""
+    updated.confirmation_code = generate_confirmation_code()
+    date = updated.date
+
+    with date_lock(date):
+        if not slot_is_free(date, start_min, end_min, exclude_id=data.appointment_id):
+            raise ValueError("Time slot not available")
+        # Fails if the appointment was deleted since we read it
+        if not replace_appointment(updated):
+            raise ValueError("Appointment not found")
+    invalidate_availability(target.date, date)
+    return updated.to_dict()
@@ -0,0 +1,106 @@
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+
+
+class SlotCache:
+    """LRU cache of generated slots keyed by ``(date, appointment_type)``.
+
+    Each entry remembers the store generation and schedule it was built
+    from and is ignored once either changes. Writers call :meth:`invalidate`
+    with the dates they touched; the per-date version counter it bumps stops
+    a computation that raced with the write from caching a stale result.
+    Versions come from one counter, so once the table outgrows the cache,
+    dates with nothing cached are dropped and read as a raised floor instead,
+    which is newer than any version they had. ``epoch`` is unique to this
+    cache and changes on :meth:`clear`, which resets the counter, so
+    ``(epoch, version)`` never repeats for a date.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Hashable, Any]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._counter = 0
+        self._floor = 0
+        self._types: Set[str] = set()
+        self._lock = threading.Lock()
+        self.epoch = uuid.uuid4().hex[:8]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def version(self, date: str) -> int:
+        with self._lock:
+            return self._versions.get(date, self._floor)
+
+    def get(self, date: str, appointment_type: str, stamp: Hashable) -> Optional[Any]:
+        key = (date, appointment_type)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(
+        self,
+        date: str,
+        appointment_type: str,
+        stamp: Hashable,
+        value: Any,
+        version: int,
+    ) -> None:
+        key = (date, appointment_type)
+        with self._lock:
+            if self._versions.get(date, self._floor) != version:
+                return
+            self._entries[key] = (stamp, value)
+            self._types.add(appointment_type)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *dates: str) -> None:
+        with self._lock:
+            for date in set(dates):
+                self._counter += 1
+                self._versions[date] = self._counter
+                for appointment_type in self._types:
+                    self._entries.pop((date, appointment_type), None)
+            if len(self._versions) > 2 * self.max_entries:
+                self._prune_versions()
+
+    def _prune_versions(self) -> None:
+        # Callers hold the lock. Dates with cached slots keep their version;
+        # the rest read the new floor, which none of them has returned before
+        cached = {date for date, _ in self._entries}
+        self._versions = {
+            date: version for date, version in self._versions.items() if date in cached
+        }
+        self._counter += 1
+        self._floor = self._counter
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._counter = self._floor = 0
+            self.epoch = uuid.uuid4().hex[:8]
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
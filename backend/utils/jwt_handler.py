@@ -1,22 +1,41 @@
 # backend/utils/jwt_handler.py
 
+import os
+import uuid
 from datetime import datetime, timedelta, UTC
+from pathlib import Path
 from fastapi import HTTPException, Security, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
 
+from backend.utils.profiling import layer
+from backend.utils.revocation import RevocationList
+from backend.utils.token_cache import TokenCache
+
 SECRET_KEY = "your-secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "1024"))
+REVOCATION_PATH = Path(os.getenv("REVOCATION_PATH", "backend/db/revoked_tokens.ndjson"))
+# Also reject access tokens from logged-out sessions, not just refreshes
+CHECK_ACCESS_REVOCATION = os.getenv("CHECK_ACCESS_REVOCATION", "true").lower() == "true"
 
 security = HTTPBearer()
 
+# Payloads of tokens verify_token has already accepted, so repeat requests
+# skip the signature check until the token expires
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
+# Ids of rotated refresh tokens and logged-out sessions (``sid``)
+revocations = RevocationList(REVOCATION_PATH)
+
 def create_access_token(data: dict):
     payload = data.copy()
     expire = datetime.now(UTC) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     payload["exp"] = expire
     payload["type"] = "access"
+    payload["jti"] = uuid.uuid4().hex
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
 def create_refresh_token(data: dict):
@@ -24,26 +43,65 @@ def create_refresh_token(data: dict):
     expire = datetime.now(UTC) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     payload["exp"] = expire
     payload["type"] = "refresh"
+    payload["jti"] = uuid.uuid4().hex
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
+def new_session() -> str:
+    """Return a session id shared by every token rotated from one login."""
+    return uuid.uuid4().hex
+
+def revoke_token(jti: str, expires: float) -> bool:
+    """Revoke one token id until it expires; False if it already was."""
+    return revocations.revoke(jti, expires)
+
+def revoke_session(sid: str) -> bool:
+    # No token of the session can outlive the last refresh token issued
+    expires = datetime.now(UTC) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    return revocations.revoke(sid, expires.timestamp())
+
+def is_revoked(payload: dict) -> bool:
+    sid = payload.get("sid")
+    jti = payload.get("jti")
+    return bool(
+        (sid and revocations.is_revoked(sid))
+        or (jti and revocations.is_revoked(jti))
+    )
+
 def decode_token(token: str):
     """Decode and verify a JWT token string. Used internally."""
     return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
 
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)):
-    """FastAPI dependency to verify JWT token from Authorization header."""
-    try:
-        token = credentials.credentials
-        payload = decode_token(token)
-        return payload
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token has expired"
-        )
-    except (jwt.DecodeError, jwt.InvalidTokenError, jwt.InvalidSignatureError):
+async def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)):
+    """FastAPI dependency to verify JWT token from Authorization header.
+
+    Declared async because it never blocks: FastAPI would otherwise hop to
+    the threadpool on every protected request just to check a signature.
+    """
+    with layer("jwt"):
+        return _verify(credentials.credentials)
+
+
+def _verify(token: str) -> dict:
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            payload = decode_token(token)
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has expired"
+            )
+        except (jwt.DecodeError, jwt.InvalidTokenError, jwt.InvalidSignatureError):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid authentication credentials"
+            )
+        token_cache.put(token, payload)
+    # Checked on cache hits too, so a revoked session is never served
+    if CHECK_ACCESS_REVOCATION and is_revoked(payload):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials"
+            detail="Token has been revoked"
         )
+    return payload
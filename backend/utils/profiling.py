@@ -0,0 +1,252 @@
+"""Opt-in per-request profiling.
+
+A request is profiled when it is sampled (``PROFILE_SAMPLE_RATE``) or when
+it carries ``X-Profile: 1`` with an access token whose user is listed in
+``PROFILE_USERS``. Profiled requests get a ``Server-Timing`` header with
+the time spent in the storage, slot-generation and JWT layers, and leave
+two files in ``PROFILE_DIR``: ``<id>.prof`` (cProfile stats, for pstats or
+snakeviz) and ``<id>.json`` (the request, the layer breakdown and the top
+functions by cumulative time).
+
+cProfile follows one thread. The event loop thread is profiled for the
+whole request, so coroutines of concurrent requests can show up in it,
+and only one request is profiled there at a time. Storage calls that
+:mod:`backend.db.async_database` offloads to threads are profiled in
+their thread and merged in. From Python 3.12 only one profiler can be
+active per process, so a profiler that fails to start is skipped and its
+code runs unprofiled; layer times still cover it. Layer times are tracked
+separately and are exclusive: storage time inside slot generation is
+counted as storage.
+"""
+import contextlib
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+
+T = TypeVar("T")
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_USERS = {user for user in os.getenv("PROFILE_USERS", "").split(",") if user}
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "profiles"))
+PROFILE_HEADER = b"x-profile"
+TOP_FUNCTIONS = 25
+
+LAYERS = ("storage", "slots", "jwt")
+
+
+class RequestProfile:
+    """Layer timings and thread profiles collected for one request."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:12]
+        self.layers: Dict[str, float] = dict.fromkeys(LAYERS, 0.0)
+        self.profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def add(self, layer: str, seconds: float) -> None:
+        with self._lock:
+            self.layers[layer] = self.layers.get(layer, 0.0) + seconds
+
+    def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Call ``fn`` under a profiler of its own, for a worker thread."""
+        profiler = cProfile.Profile()
+        if not _enable(profiler):
+            return fn(*args)
+        try:
+            return fn(*args)
+        finally:
+            profiler.disable()
+            with self._lock:
+                self.profiles.append(profiler)
+
+
+def _enable(profiler: cProfile.Profile) -> bool:
+    # Python 3.12+ refuses a second active profiler with ValueError, e.g.
+    # a worker thread's while the event loop's runs
+    try:
+        profiler.enable()
+    except ValueError:
+        return False
+    return True
+
+
+_current: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar(
+    "request_profile", default=None
+)
+# Time spent in nested layers, charged to the enclosing layer's caller
+_children: contextvars.ContextVar[Optional[List[float]]] = contextvars.ContextVar(
+    "profile_layer_children", default=None
+)
+# cProfile can follow only one request on the event loop thread at a time
+_loop_profiler = threading.Lock()
+
+
+def current() -> Optional[RequestProfile]:
+    return _current.get()
+
+
+@contextlib.contextmanager
+def layer(name: str) -> Iterator[None]:
+    """Charge the time in the block to ``name`` if the request is profiled."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    parent = _children.get()
+    children = [0.0]
+    token = _children.set(children)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _children.reset(token)
+        profile.add(name, elapsed - children[0])
+        if parent is not None:
+            parent[0] += elapsed
+
+
+def _header(scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+def _authorized(scope) -> bool:
+    if _header(scope, PROFILE_HEADER) not in (b"1", b"true"):
+        return False
+    authorization = (_header(scope, b"authorization") or b"").decode("latin-1")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    # Imported here: jwt_handler itself reports into the "jwt" layer
+    import jwt
+
+    from backend.utils.jwt_handler import decode_token, is_revoked
+
+    try:
+        payload = decode_token(token)
+    except jwt.InvalidTokenError:
+        return False
+    return payload.get("type") == "access" and payload.get("sub") in PROFILE_USERS and not is_revoked(payload)
+
+
+def _summary(profile: RequestProfile, stats: Optional[pstats.Stats], request: Dict[str, Any]) -> Dict[str, Any]:
+    total = request["duration_ms"]
+    layers = {name: round(seconds * 1e3, 3) for name, seconds in profile.layers.items()}
+    summary = {
+        **request,
+        "layers_ms": {**layers, "other": round(max(total - sum(layers.values()), 0.0), 3)},
+        "top_functions": [],
+    }
+    if stats is not None:
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        summary["top_functions"] = [
+            {
+                "function": f"{filename}:{line}({name})",
+                "calls": calls,
+                "total_ms": round(total_time * 1e3, 3),
+                "cumulative_ms": round(cumulative * 1e3, 3),
+            }
+            for (filename, line, name), (_, calls, total_time, cumulative, _) in rows[:TOP_FUNCTIONS]
+        ]
+    return summary
+
+
+def write_dump(
+    profile: RequestProfile,
+    profiler: Optional[cProfile.Profile],
+    request: Dict[str, Any],
+    directory: Path,
+) -> Path:
+    """Write ``<id>.prof`` (if anything was profiled) and ``<id>.json``."""
+    directory.mkdir(parents=True, exist_ok=True)
+    profiles = ([profiler] if profiler is not None else []) + profile.profiles
+    stats = None
+    if profiles:
+        stats = pstats.Stats(profiles[0])
+        for extra in profiles[1:]:
+            stats.add(extra)
+        stats.dump_stats(directory / f"{profile.id}.prof")
+    path = directory / f"{profile.id}.json"
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(_summary(profile, stats, request), f, indent=2)
+    return path
+
+
+def _server_timing(profile: RequestProfile, total: float) -> bytes:
+    parts = [f"{name};dur={seconds * 1e3:.3f}" for name, seconds in profile.layers.items()]
+    parts.append(f"total;dur={total * 1e3:.3f}")
+    return ", ".join(parts).encode("latin-1")
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling sampled or explicitly requested requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _wanted(self, scope) -> bool:
+        if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            return True
+        return bool(PROFILE_USERS) and _authorized(scope)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        profiler = None
+        if _loop_profiler.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            if not _enable(profiler):
+                profiler = None
+                _loop_profiler.release()
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(profile, time.perf_counter() - started)))
+                headers.append((b"x-profile-id", profile.id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                    _loop_profiler.release()
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            request = {
+                "id": profile.id,
+                "created": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(route, "path", None),
+                "status": status,
+                "duration_ms": round((time.perf_counter() - started) * 1e3, 3),
+                "event_loop_profiled": profiler is not None,
+            }
+            await run_in_threadpool(write_dump, profile, profiler, request, PROFILE_DIR)
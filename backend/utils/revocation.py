@@ -0,0 +1,214 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional
+
+from backend.db.locks import ProcessLock
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings.
+
+    A miss is definite, so most lookups never reach the exact set behind it.
+    Positions come from one BLAKE2b digest split into two halves (double
+    hashing), which keeps a lookup to a single hash call.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = max(capacity, 1)
+        self.size = max(
+            8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterator[int]:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationList:
+    """Revoked token and session ids, each kept until its expiry.
+
+    Membership is answered from memory: a Bloom filter rules out almost every
+    id that was never revoked, and an exact dict of id -> expiry settles the
+    rest. With a ``path``, revocations are appended to a newline-delimited
+    JSON file that other workers pick up incrementally (one ``stat`` per
+    lookup), and :meth:`revoke` holds a process-wide lock so two workers
+    cannot both accept the same refresh token.
+
+    File reads and writes are serialised by their own lock and never happen
+    under the one guarding the in-memory set, which is only held to swap in
+    new state. A lookup that finds another thread reading or writing the
+    file answers from memory rather than wait, so :meth:`is_revoked` never
+    stalls behind a revocation's fsync.
+
+    Expired ids are pruned once ``prune_interval`` seconds have passed or the
+    filter fills up; pruning rebuilds the filter and rewrites the file.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        capacity: int = 10000,
+        error_rate: float = 0.001,
+        prune_interval: float = 300.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.prune_interval = prune_interval
+        self.clock = clock
+        self._entries: Dict[str, float] = {}
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._file_id: Optional[int] = None
+        self._offset = 0
+        self._next_prune = clock() + prune_interval
+        # _io orders file access and all changes to the state; _lock guards
+        # only quick in-memory reads and swaps
+        self._io = threading.RLock()
+        self._lock = threading.Lock()
+        self._process_lock: Optional[ProcessLock] = None
+
+    def __len__(self) -> int:
+        self._sync()
+        with self._lock:
+            return len(self._entries)
+
+    def _writer(self):
+        if self._process_lock is None:
+            self._process_lock = ProcessLock(
+                self.path.with_suffix(".lock") if self.path is not None else None
+            )
+        return self._process_lock.writer()
+
+    def _remember(self, records: Dict[str, float], reset: bool = False) -> None:
+        # Called with _io held; a replacement set is built before the swap
+        if reset:
+            bloom = self._filter_for(records)
+            with self._lock:
+                self._entries, self._bloom = records, bloom
+            return
+        with self._lock:
+            for item, expires in records.items():
+                self._entries[item] = expires
+                self._bloom.add(item)
+
+    def _filter_for(self, entries: Dict[str, float]) -> BloomFilter:
+        bloom = BloomFilter(max(self.capacity, 2 * len(entries)), self.error_rate)
+        for item in entries:
+            bloom.add(item)
+        return bloom
+
+    def _sync(self, wait: bool = True) -> None:
+        """Pick up revocations appended or pruned by other workers.
+
+        Without ``wait``, skips the check if another thread holds the file.
+        """
+        if self.path is None or not self._io.acquire(blocking=wait):
+            return
+        try:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                return
+            # Pruned elsewhere: the file was replaced, so start over
+            reset = st.st_ino != self._file_id or st.st_size < self._offset
+            if reset:
+                self._file_id = st.st_ino
+                self._offset = 0
+            elif st.st_size == self._offset:
+                return
+            records: Dict[str, float] = {}
+            with self.path.open("rb") as f:
+                f.seek(self._offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # torn record from an interrupted append
+                    record = json.loads(line)
+                    records[record["id"]] = record["exp"]
+                    self._offset += len(line)
+            self._remember(records, reset)
+            if len(self._entries) > self._bloom.capacity:
+                bloom = self._filter_for(self._entries)
+                with self._lock:
+                    self._bloom = bloom
+        finally:
+            self._io.release()
+
+    def is_revoked(self, item: str) -> bool:
+        self._sync(wait=False)
+        with self._lock:
+            if item not in self._bloom:
+                return False
+            return item in self._entries
+
+    def revoke(self, item: str, expires: float) -> bool:
+        """Revoke ``item`` until ``expires``; False if it already was."""
+        with self._io, self._writer():
+            self._sync()
+            if item in self._entries:
+                return False
+            if self.path is not None:
+                self._append(item, expires)
+            self._remember({item: expires})
+            if self.clock() >= self._next_prune or len(self._entries) > self._bloom.capacity:
+                self._prune()
+            return True
+
+    def _append(self, item: str, expires: float) -> None:
+        data = (json.dumps({"id": item, "exp": expires}, separators=(",", ":")) + "\n").encode("utf-8")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("ab") as f:
+            if f.tell() > self._offset:
+                f.truncate(self._offset)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if self._file_id is None:
+            self._file_id = os.stat(self.path).st_ino
+        self._offset += len(data)
+
+    def prune(self) -> int:
+        """Forget ids whose expiry has passed; returns how many were dropped."""
+        with self._io, self._writer():
+            self._sync()
+            return self._prune()
+
+    def _prune(self) -> int:
+        # Called with _io held, so nothing else changes the entries meanwhile
+        now = self.clock()
+        self._next_prune = now + self.prune_interval
+        live = {item: exp for item, exp in self._entries.items() if exp > now}
+        dropped = len(self._entries) - len(live)
+        bloom = self._filter_for(live)
+        if self.path is not None and dropped:
+            data = "".join(
+                json.dumps({"id": item, "exp": exp}, separators=(",", ":")) + "\n"
+                for item, exp in live.items()
+            ).encode("utf-8")
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with tmp.open("wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self._file_id = os.stat(self.path).st_ino
+            self._offset = len(data)
+        with self._lock:
+            self._entries, self._bloom = live, bloom
+        return dropped
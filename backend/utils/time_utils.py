@@ -0,0 +1,9 @@
+def to_minutes(hhmm: str) -> int:
+    """Convert an "HH:MM" string to minutes after midnight."""
+    hours, minutes = hhmm.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def from_minutes(minutes: int) -> str:
+    """Convert minutes after midnight to an "HH:MM" string."""
+    return f"{minutes // 60:02}:{minutes % 60:02}"
@@ -0,0 +1,71 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+class TokenCache:
+    """LRU cache of verified JWT payloads keyed by a digest of the token.
+
+    Only tokens carrying an ``exp`` claim are cached, and an entry is dropped
+    on the first lookup at or after that time, so the decoder still gets to
+    reject the token as expired. Revocation is checked on every request,
+    cached or not, so revoked tokens need not be evicted here.
+    """
+
+    def __init__(self, max_entries: int, clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = token_digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self.clock() >= entry[0]:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            # Callers get their own copy so they can't alter the cached claims
+            return dict(entry[1])
+
+    def put(self, token: str, payload: Dict[str, Any]) -> None:
+        expires = payload.get("exp")
+        if not isinstance(expires, (int, float)) or self.max_entries <= 0:
+            return
+        key = token_digest(token)
+        with self._lock:
+            self._entries[key] = (expires, dict(payload))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,423 @@
+"""Drive the API with concurrent clients and check nobody got double-booked.
+
+    python -m benchmarks.load [--workers 4] [--storage journal] [--clients 50] [--duration 30]
+    python -m benchmarks.load --url http://localhost:8000 --store-check
+
+Without ``--url`` a uvicorn server (``backend.main:app``) is started on a
+free port against a scratch store in a temporary directory. Each client
+logs in and then loops over a weighted mix of availability polls,
+bookings, reschedules and cancellations on a handful of days, so bookings
+contend for the same slots. Throughput and latency percentiles are
+reported per route.
+
+Afterwards every booking the server confirmed and did not later cancel is
+checked for overlaps, and the store itself is read back and checked for
+overlapping appointments and for confirmed bookings it lost. Any
+violation makes the command exit non-zero.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import date as Date, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import httpx
+
+from backend.db import database
+from backend.utils.time_utils import from_minutes, to_minutes
+from benchmarks.suite import isolated_store
+
+START_DATE = Date(2031, 1, 6)  # a Monday
+DAY_START, DAY_END = 9 * 60, 17 * 60
+ACTIONS = {"availability": 6, "book": 2, "reschedule": 1, "cancel": 1}
+RELOGIN_PROBABILITY = 0.01
+PERCENTILES = (50, 90, 99)
+
+
+def find_overlaps(appointments: Iterable[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """Pairs of appointment ids that overlap on the same date."""
+    by_date = defaultdict(list)
+    for appt in appointments:
+        by_date[appt["date"]].append(
+            (to_minutes(appt["start_time"]), to_minutes(appt["end_time"]), appt["id"])
+        )
+    clashes = []
+    for intervals in by_date.values():
+        intervals.sort()
+        latest_end, latest_id = -1, None
+        for start, end, appt_id in intervals:
+            if start < latest_end:
+                clashes.append((latest_id, appt_id))
+            if end > latest_end:
+                latest_end, latest_id = end, appt_id
+    return clashes
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class LoadClient:
+    """One simulated user: logs in, then polls and books until stopped."""
+
+    def __init__(
+        self,
+        http: httpx.AsyncClient,
+        rng: random.Random,
+        dates: List[str],
+        latencies: Dict[str, List[float]],
+        statuses: Dict[str, Counter],
+        confirmed: Dict[str, Dict[str, Any]],
+        credentials: Tuple[str, str],
+    ):
+        self.http = http
+        self.rng = rng
+        self.dates = dates
+        self.latencies = latencies
+        self.statuses = statuses
+        self.confirmed = confirmed
+        self.credentials = credentials
+        self.headers: Dict[str, str] = {}
+        self.owned: List[str] = []
+        # Last availability seen per (date, type), to aim bookings at free slots
+        self.seen: Dict[Tuple[str, str], List[str]] = {}
+
+    async def _request(self, route: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.http.request(method, url, headers=self.headers, **kwargs)
+        except httpx.HTTPError:
+            self.statuses[route]["error"] += 1
+            return None
+        self.latencies[route].append(time.perf_counter() - started)
+        self.statuses[route][str(response.status_code)] += 1
+        return response
+
+    def _pick_slot(self, date: str, appointment_type: str) -> str:
+        free = self.seen.get((date, appointment_type))
+        if free:
+            return self.rng.choice(free)
+        duration = database.APPOINTMENT_TYPES[appointment_type]
+        return from_minutes(self.rng.randrange(DAY_START, DAY_END - duration + 1, 15))
+
+    def _pick(self) -> Tuple[str, str]:
+        return self.rng.choice(self.dates), self.rng.choice(list(database.APPOINTMENT_TYPES))
+
+    async def login(self) -> bool:
+        username, password = self.credentials
+        self.headers = {}
+        response = await self._request(
+            "POST /api/auth/login",
+            "POST",
+            "/api/auth/login",
+            json={"username": username, "password": password},
+        )
+        if response is None or response.status_code != 200:
+            return False
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return True
+
+    async def availability(self) -> None:
+        date, appointment_type = self._pick()
+        response = await self._request(
+            "GET /api/calendly/availability",
+            "GET",
+            "/api/calendly/availability",
+            params={"date": date, "appointment_type": appointment_type},
+        )
+        if response is not None and response.status_code == 200:
+            self.seen[(date, appointment_type)] = [
+                slot["start_time"] for slot in response.json()["available_slots"] if slot["available"]
+            ]
+
+    async def book(self) -> None:
+        date, appointment_type = self._pick()
+        response = await self._request(
+            "POST /api/calendly/book",
+            "POST",
+            "/api/calendly/book",
+            json={
+                "appointment_type": appointment_type,
+                "date": date,
+                "start_time": self._pick_slot(date, appointment_type),
+                "patient": {"name": "Load Test", "email": "load@example.com", "phone": "0"},
+                "reason": "Load test",
+            },
+        )
+        if response is not None and response.status_code == 200:
+            details = response.json()["details"]
+            self.confirmed[details["id"]] = details
+            self.owned.append(details["id"])
+
+    async def reschedule(self) -> None:
+        appointment_id = self.rng.choice(self.owned)
+        date, appointment_type = self._pick()
+        response = await self._request(
+            "PUT /api/calendly/appointments/{id}/reschedule",
+            "PUT",
+            f"/api/calendly/appointments/{appointment_id}/reschedule",
+            json={
+                "appointment_id": appointment_id,
+                "appointment_type": appointment_type,
+                "date": date,
+                "start_time": self._pick_slot(date, appointment_type),
+            },
+        )
+        if response is not None and response.status_code == 200:
+            self.confirmed[appointment_id] = response.json()["details"]
+
+    async def cancel(self) -> None:
+        appointment_id = self.owned.pop(self.rng.randrange(len(self.owned)))
+        response = await self._request(
+            "DELETE /api/calendly/appointments/{id}",
+            "DELETE",
+            f"/api/calendly/appointments/{appointment_id}",
+        )
+        if response is not None and response.status_code == 200:
+            del self.confirmed[appointment_id]
+        else:
+            self.owned.append(appointment_id)
+
+    async def run(self, deadline: float, max_requests: Optional[int]) -> None:
+        if not await self.login():
+            return
+        actions, weights = zip(*ACTIONS.items())
+        done = 0
+        while time.perf_counter() < deadline and (max_requests is None or done < max_requests):
+            done += 1
+            if self.rng.random() < RELOGIN_PROBABILITY:
+                await self.login()
+                continue
+            action = self.rng.choices(actions, weights)[0]
+            if action in ("reschedule", "cancel") and not self.owned:
+                action = "book"
+            await getattr(self, action)()
+
+
+def _dates(days: int) -> List[str]:
+    dates, day = [], START_DATE
+    while len(dates) < days:
+        if day.weekday() < 5:
+            dates.append(day.isoformat())
+        day += timedelta(days=1)
+    return dates
+
+
+async def run_load(
+    base_url: str,
+    clients: int = 50,
+    duration: float = 30.0,
+    max_requests: Optional[int] = None,
+    days: int = 5,
+    seed: int = 0,
+    credentials: Tuple[str, str] = ("admin", "admin123"),
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+) -> Dict[str, Any]:
+    """Run ``clients`` concurrent users and return the per-route report.
+
+    Each client stops after ``duration`` seconds or ``max_requests``
+    requests, whichever comes first. The report's ``confirmed`` maps every
+    booking the server confirmed and nobody cancelled to its details.
+    """
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Counter] = defaultdict(Counter)
+    confirmed: Dict[str, Dict[str, Any]] = {}
+    dates = _dates(days)
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(
+        base_url=base_url, transport=transport, limits=limits, timeout=30.0
+    ) as http:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(
+            *(
+                LoadClient(
+                    http, random.Random(seed * 100_003 + n), dates, latencies, statuses, confirmed, credentials
+                ).run(deadline, max_requests)
+                for n in range(clients)
+            )
+        )
+        elapsed = time.perf_counter() - started
+
+    routes = {}
+    for route in sorted(statuses):
+        ordered = sorted(latencies[route])
+        routes[route] = {
+            "requests": sum(statuses[route].values()),
+            "rps": round(len(ordered) / elapsed, 1),
+            "statuses": dict(statuses[route]),
+            **{f"p{pct}_ms": round(percentile(ordered, pct) * 1e3, 2) for pct in PERCENTILES},
+            "max_ms": round(ordered[-1] * 1e3, 2) if ordered else 0.0,
+        }
+    total = sum(route["requests"] for route in routes.values())
+    return {
+        "clients": clients,
+        "elapsed_s": round(elapsed, 2),
+        "requests": total,
+        "rps": round(total / elapsed, 1),
+        "routes": routes,
+        "confirmed": confirmed,
+    }
+
+
+def check_bookings(confirmed: Dict[str, Dict[str, Any]], stored: Optional[List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Overlaps among confirmed bookings and in the store, and lost bookings."""
+    result: Dict[str, Any] = {"confirmed_overlaps": find_overlaps(confirmed.values())}
+    if stored is not None:
+        ids = {appt["id"] for appt in stored}
+        result["stored_overlaps"] = find_overlaps(stored)
+        result["lost"] = sorted(set(confirmed) - ids)
+    result["ok"] = not any(result[key] for key in result)
+    return result
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def local_server(directory: Path, mode: str, workers: int) -> Iterator[str]:
+    """Run uvicorn on a scratch store in ``directory``; yields its URL."""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = dict(
+        os.environ,
+        APPOINTMENTS_PATH=str(directory / "appointments.json"),
+        APPOINTMENT_STORAGE=mode,
+        DATABASE_URL=f"sqlite:///{directory / 'appointments.sqlite3'}",
+        REVOCATION_PATH=str(directory / "revoked_tokens.ndjson"),
+    )
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "backend.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning",
+        ],
+        env=env,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited with status {process.returncode}")
+            try:
+                if httpx.get(url + "/", timeout=1.0).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("server did not start within 30s")
+            time.sleep(0.2)
+        yield url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def _stored_appointments() -> List[Dict[str, Any]]:
+    database._store = None
+    return database.load_appointments()
+
+
+def _print_report(report: Dict[str, Any], check: Dict[str, Any], out=sys.stdout) -> None:
+    print(
+        f"{report['requests']} requests from {report['clients']} clients in "
+        f"{report['elapsed_s']}s ({report['rps']} req/s)",
+        file=out,
+    )
+    for route, stats in report["routes"].items():
+        codes = " ".join(f"{code}:{count}" for code, count in sorted(stats["statuses"].items()))
+        print(
+            f"  {route:<48} {stats['requests']:>7} {stats['rps']:>8} req/s  "
+            f"p50 {stats['p50_ms']:>7} ms  p90 {stats['p90_ms']:>7} ms  "
+            f"p99 {stats['p99_ms']:>7} ms  [{codes}]",
+            file=out,
+        )
+    print(f"{len(report['confirmed'])} bookings held at the end", file=out)
+    for key in ("confirmed_overlaps", "stored_overlaps", "lost"):
+        if check.get(key):
+            print(f"FAILED {key}: {check[key][:10]}", file=out)
+    if check["ok"]:
+        print("no double-bookings" + (", no lost bookings" if "lost" in check else ""), file=out)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.load",
+        description="End-to-end load test with a double-booking check.",
+    )
+    parser.add_argument("--url", help="test a running server instead of starting one")
+    parser.add_argument(
+        "--store-check",
+        action="store_true",
+        help="with --url, also read the store configured in this environment",
+    )
+    parser.add_argument("--workers", type=int, default=4, help="uvicorn workers to start")
+    parser.add_argument(
+        "--storage",
+        choices=["json", "journal", "sharded", "sql"],
+        default=database.STORAGE_MODE,
+        help="storage mode for the started server (default APPOINTMENT_STORAGE)",
+    )
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--requests", type=int, help="stop each client after this many requests")
+    parser.add_argument("--days", type=int, default=5, help="weekdays to spread bookings over")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--output", help="write the report as JSON here")
+    args = parser.parse_args(argv)
+
+    def load(url: str) -> Dict[str, Any]:
+        return asyncio.run(
+            run_load(
+                url,
+                args.clients,
+                args.duration,
+                args.requests,
+                args.days,
+                args.seed,
+                (args.username, args.password),
+            )
+        )
+
+    if args.url:
+        report = load(args.url)
+        stored = _stored_appointments() if args.store_check else None
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            with local_server(directory, args.storage, args.workers) as url:
+                report = load(url)
+            with isolated_store(directory, args.storage):
+                stored = _stored_appointments()
+
+    check = check_bookings(report["confirmed"], stored)
+    _print_report(report, check)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({**report, "check": check}, f, indent=2)
+    return 0 if check["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
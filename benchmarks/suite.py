@@ -0,0 +1,357 @@
+"""Time the tools layer and storage against seeded synthetic stores.
+
+    python -m benchmarks.suite run [--sizes 1k,100k,1M] [--storage journal]
+    python -m benchmarks.suite compare base.json head.json [--threshold 1.2]
+
+``run`` builds a store of each size from :func:`transfer.synthetic_appointments`
+(the same seed always gives the same data) in a temporary directory, then
+times storage save/load, cold and cached ``generate_daily_slots``, cold
+``generate_slots_by_type`` for every type at once, ``slot_is_free`` on each
+slot of a day's grids, and
+``book_appointment``/``reschedule_appointment``/``delete_appointment`` on
+free days after the seeded range, and records the memory per appointment
+of resident records against parsed dicts. Results are written as JSON
+with the git commit they were measured on, to
+``benchmarks/results/<commit>-<storage>.json`` unless ``--output`` is given;
+``compare`` reports the change in median time per operation between two such
+files and exits non-zero when anything got slower than ``--threshold``.
+"""
+import argparse
+import contextlib
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date as Date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from backend.db import database, transfer
+from backend.db.record import Appointment
+from backend.models.schemas import BookingRequest, PatientInfo, RescheduleRequest
+from backend.tools.availability_tool import (
+    generate_daily_slots,
+    generate_slots_by_type,
+    slot_cache,
+)
+from backend.tools.booking_tool import (
+    book_appointment,
+    delete_appointment,
+    reschedule_appointment,
+)
+from backend.utils.time_utils import from_minutes
+
+DEFAULT_SIZES = "1k,100k,1M"
+RESULTS_DIR = Path("benchmarks/results")
+START_DATE = Date(2030, 1, 1)
+# Appointments the memory comparison is measured on; tracemalloc is slow
+MEMORY_SAMPLE = 100_000
+# Bookable 30-minute starts in the default 09:00-17:00 day
+_BOOKING_STARTS = [from_minutes(minute) for minute in range(9 * 60, 17 * 60, 30)]
+
+
+def parse_size(text: str) -> int:
+    """``"100k"`` -> 100000, ``"1M"`` -> 1000000."""
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(text[-1:].lower(), 1)
+    digits = text[:-1] if multiplier > 1 else text
+    try:
+        size = int(digits) * multiplier
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {text}") from None
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"invalid size: {text}")
+    return size
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextlib.contextmanager
+def isolated_store(directory: Path, mode: str) -> Iterator[None]:
+    """Point the database module at a fresh store under ``directory``."""
+    saved = (
+        database.DB_PATH,
+        database.STORAGE_MODE,
+        database.DATABASE_URL,
+        database._store,
+        database._store_config,
+    )
+    database.DB_PATH = directory / "appointments.json"
+    database.STORAGE_MODE = mode
+    database.DATABASE_URL = f"sqlite:///{directory / 'appointments.sqlite3'}"
+    database._store = None
+    slot_cache.clear()
+    try:
+        yield
+    finally:
+        (
+            database.DB_PATH,
+            database.STORAGE_MODE,
+            database.DATABASE_URL,
+            database._store,
+            database._store_config,
+        ) = saved
+        slot_cache.clear()
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    """Milliseconds per call for a list of durations in seconds."""
+    ms = sorted(sample * 1e3 for sample in samples)
+    return {
+        "calls": len(ms),
+        "min_ms": round(ms[0], 4),
+        "median_ms": round(statistics.median(ms), 4),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 4),
+        "max_ms": round(ms[-1], 4),
+        "mean_ms": round(statistics.fmean(ms), 4),
+    }
+
+
+def _timed(fn: Callable[..., Any], *args: Any) -> float:
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def _reload_store() -> None:
+    database._store = None
+    database.get_store().load()
+
+
+def _bookings(first: Date, count: int) -> Iterator[BookingRequest]:
+    patient = PatientInfo(name="Bench", email="bench@example.com", phone="0")
+    for i in range(count):
+        day = first + timedelta(days=i // len(_BOOKING_STARTS))
+        yield BookingRequest(
+            appointment_type="consultation",
+            date=day.isoformat(),
+            start_time=_BOOKING_STARTS[i % len(_BOOKING_STARTS)],
+            patient=patient,
+            reason="Benchmark",
+        )
+
+
+def memory_per_appointment(appointments: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Bytes per appointment as parsed dicts and as resident records."""
+    # Round-trip through JSON so strings aren't shared with the source
+    raw = json.dumps(appointments)
+    measured = {}
+    def records(text: str) -> List[Appointment]:
+        return [Appointment.from_dict(appt) for appt in json.loads(text)]
+
+    for name, build in (("dict_bytes", json.loads), ("record_bytes", records)):
+        tracemalloc.start()
+        rows = build(raw)
+        traced = tracemalloc.get_traced_memory()[0]
+        measured[name] = round(traced / max(len(rows), 1), 1)
+        tracemalloc.stop()
+        del rows
+    return measured
+
+
+def bench_size(
+    count: int,
+    mode: str,
+    calls: int = 20,
+    repeat: int = 3,
+    seed: int = 0,
+    log=sys.stderr,
+) -> Dict[str, Any]:
+    """Time every operation against a store of ``count`` appointments."""
+    appointments = list(transfer.synthetic_appointments(count, START_DATE, seed))
+    last = Date.fromisoformat(appointments[-1]["date"])
+    days = (last - START_DATE).days + 1
+    rng = random.Random(seed)
+    types = list(database.APPOINTMENT_TYPES)
+    timings: Dict[str, Dict[str, Any]] = {}
+
+    def record(name: str, samples: List[float]) -> None:
+        timings[name] = summarize(samples)
+        print(f"  {name:<28} median {timings[name]['median_ms']:.3f} ms", file=log)
+
+    print(f"{count} appointments over {days} days ({mode})", file=log)
+    memory = memory_per_appointment(appointments[:MEMORY_SAMPLE])
+    print(
+        f"  memory per appointment: dict {memory['dict_bytes']:.0f} B, "
+        f"record {memory['record_bytes']:.0f} B",
+        file=log,
+    )
+    with tempfile.TemporaryDirectory() as tmp, isolated_store(Path(tmp), mode):
+        record(
+            "storage.save",
+            [_timed(database.save_appointments, appointments) for _ in range(repeat)],
+        )
+        del appointments
+        record("storage.load", [_timed(_reload_store) for _ in range(repeat)])
+
+        # Closed days have no slots to generate
+        schedule = database.get_schedule()
+        open_days = [
+            date
+            for date in ((START_DATE + timedelta(days=i)).isoformat() for i in range(days))
+            if schedule.blocks(date)
+        ]
+        dates = [rng.choice(open_days) for _ in range(calls)]
+        cold, warm = [], []
+        for i, date in enumerate(dates):
+            appointment_type = types[i % len(types)]
+            slot_cache.clear()
+            cold.append(_timed(generate_daily_slots, date, appointment_type))
+            warm.append(_timed(generate_daily_slots, date, appointment_type))
+        record("generate_daily_slots", cold)
+        record("generate_daily_slots.cached", warm)
+
+        samples = []
+        for date in dates:
+            slot_cache.clear()
+            samples.append(_timed(generate_slots_by_type, date, types))
+        record("generate_slots_by_type", samples)
+
+        # One sample per day: the mean of a check against every slot on it
+        samples = []
+        for date in dates:
+            slots = {slot[:2] for name in types for slot in schedule.grid(date, name)}
+            started = time.perf_counter()
+            for start, end in slots:
+                database.slot_is_free(date, start, end)
+            samples.append((time.perf_counter() - started) / len(slots))
+        record("slot_is_free", samples)
+
+        # Free days after the seeded range, so every call succeeds
+        free = last + timedelta(days=1)
+        booked, samples = [], []
+        for request in _bookings(free, calls):
+            started = time.perf_counter()
+            booked.append(book_appointment(request)["id"])
+            samples.append(time.perf_counter() - started)
+        record("book_appointment", samples)
+
+        later = free + timedelta(days=calls // len(_BOOKING_STARTS) + 1)
+        samples = []
+        for appointment_id, request in zip(booked, _bookings(later, calls)):
+            move = RescheduleRequest(
+                appointment_id=appointment_id,
+                appointment_type=request.appointment_type,
+                date=request.date,
+                start_time=request.start_time,
+            )
+            samples.append(_timed(reschedule_appointment, move))
+        record("reschedule_appointment", samples)
+
+        record("delete_appointment", [_timed(delete_appointment, appointment_id) for appointment_id in booked])
+    return {"appointments": count, "days": days, "memory": memory, "timings": timings}
+
+
+def run(
+    sizes: List[int],
+    mode: str,
+    calls: int = 20,
+    repeat: int = 3,
+    seed: int = 0,
+    log=sys.stderr,
+) -> Dict[str, Any]:
+    """Benchmark every size and return the results document."""
+    return {
+        "commit": _git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "storage": mode,
+        "seed": seed,
+        "results": {
+            str(size): bench_size(size, mode, calls, repeat, seed, log) for size in sizes
+        },
+    }
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any], threshold: float, out=sys.stdout) -> bool:
+    """Print median ratios head/base; False if any exceeds ``threshold``."""
+    ok = True
+    for size, result in head["results"].items():
+        before = base["results"].get(size)
+        if before is None:
+            continue
+        for name, timing in result["timings"].items():
+            if name not in before["timings"]:
+                continue
+            old, new = before["timings"][name]["median_ms"], timing["median_ms"]
+            ratio = new / old if old else 1.0
+            flag = ""
+            if ratio > threshold:
+                flag = "  REGRESSION"
+                ok = False
+            print(f"{size:>8} {name:<28} {old:10.3f} -> {new:10.3f} ms  x{ratio:.2f}{flag}", file=out)
+    return ok
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.suite",
+        description="Benchmark the tools layer against synthetic stores.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    bench = commands.add_parser("run", help="run the benchmarks and write JSON results")
+    bench.add_argument(
+        "--sizes",
+        type=lambda text: [parse_size(part) for part in text.split(",")],
+        default=DEFAULT_SIZES,
+        help=f"comma-separated store sizes (default {DEFAULT_SIZES})",
+    )
+    bench.add_argument(
+        "--storage",
+        choices=["json", "journal", "sharded", "sql"],
+        default=database.STORAGE_MODE,
+        help="storage mode to measure (default APPOINTMENT_STORAGE)",
+    )
+    bench.add_argument("--calls", type=int, default=20, help="calls per tools function")
+    bench.add_argument("--repeat", type=int, default=3, help="repetitions of save and load")
+    bench.add_argument("--seed", type=int, default=0)
+    bench.add_argument(
+        "--output",
+        help="results file (default benchmarks/results/<commit>-<storage>.json)",
+    )
+
+    diff = commands.add_parser("compare", help="compare two results files")
+    diff.add_argument("base")
+    diff.add_argument("head")
+    diff.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="fail when a median grows by more than this factor",
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.head, encoding="utf-8") as f:
+            head = json.load(f)
+        return 0 if compare(base, head, args.threshold) else 1
+
+    results = run(args.sizes, args.storage, args.calls, args.repeat, args.seed)
+    output = Path(args.output or RESULTS_DIR / f"{results['commit'] or 'results'}-{args.storage}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with output.open("w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"wrote {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -22,7 +22,8 @@ VALUES
   ('consultation', 30, 'General consultation - 30 minutes'),
   ('followup', 15, 'Follow-up visit - 15 minutes'),
   ('physical', 45, 'Physical exam - 45 minutes'),
-  ('specialist', 60, 'Specialist consultation - 60 minutes')
+  ('specialist', 60, 'Specialist consultation - 60 minutes'),
+  ('general', 30, 'General appointment - 30 minutes')
 ON CONFLICT (name) DO NOTHING;
 
 -- Table: doctor_schedule (weekly working hours)
@@ -77,9 +78,31 @@ CREATE TABLE IF NOT EXISTS scheduled_appointments (
   updated_at TIMESTAMPTZ DEFAULT now()
 );
 
+-- Application-level booking id (e.g. APPT-1A2B3C) used by the API; rows
+-- inserted without one (book_appointment() below, older rows) get one here
+
+CREATE OR REPLACE FUNCTION generate_booking_id()
+RETURNS TEXT LANGUAGE sql AS $$
+  SELECT 'APPT-' || upper(substr(encode(gen_random_bytes(3), 'hex'), 1, 6));
+$$;
+
+ALTER TABLE scheduled_appointments ADD COLUMN IF NOT EXISTS booking_id TEXT UNIQUE;
+UPDATE scheduled_appointments SET booking_id = generate_booking_id() WHERE booking_id IS NULL;
+ALTER TABLE scheduled_appointments ALTER COLUMN booking_id SET DEFAULT generate_booking_id();
+ALTER TABLE scheduled_appointments ALTER COLUMN booking_id SET NOT NULL;
+
 CREATE INDEX IF NOT EXISTS idx_sched_date_start ON scheduled_appointments (date, start_time);
 CREATE INDEX IF NOT EXISTS idx_sched_type_date ON scheduled_appointments (appointment_type_id, date);
 
+-- Table: appointment_changes (one row per committed mutation; API workers
+-- poll it to refresh their in-memory view incrementally)
+
+CREATE TABLE IF NOT EXISTS appointment_changes (
+  seq BIGSERIAL PRIMARY KEY,
+  booking_id TEXT NOT NULL,
+  changed_at TIMESTAMPTZ DEFAULT now()
+);
+
 -- Trigger function to update updated_at
 
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -175,51 +198,78 @@ BEGIN
 END;
 $$;
 
--- Helper: generate_available_slots(date, appointment_type)
+-- Helper: generate_available_slots_range(start_date, end_date, appointment_type)
+-- Set-based: the slot grid for every working day comes from generate_series
+-- and is joined once against the confirmed bookings in the range (a single
+-- idx_sched_date_start range scan) instead of probing the index per slot.
 
-CREATE OR REPLACE FUNCTION generate_available_slots(p_date DATE, p_appointment_type TEXT)
-RETURNS TABLE(start_time TIME, end_time TIME, is_available BOOLEAN) LANGUAGE plpgsql AS $$
+CREATE OR REPLACE FUNCTION generate_available_slots_range(
+  p_start_date DATE,
+  p_end_date DATE,
+  p_appointment_type TEXT
+)
+RETURNS TABLE(slot_date DATE, start_time TIME, end_time TIME, is_available BOOLEAN)
+LANGUAGE plpgsql STABLE AS $$
+#variable_conflict use_column
 DECLARE
-  dur_minutes INTEGER;
-  clinic_start TIME;
-  clinic_end TIME;
-  slot_start TIMESTAMP;
-  slot_end TIMESTAMP;
+  dur INTERVAL;
 BEGIN
-  SELECT duration_minutes INTO dur_minutes FROM appointment_types WHERE name = p_appointment_type;
+  SELECT make_interval(mins => apt.duration_minutes) INTO dur
+  FROM appointment_types apt WHERE apt.name = p_appointment_type;
   IF NOT FOUND THEN
     RAISE EXCEPTION 'Unknown appointment_type: %', p_appointment_type;
   END IF;
 
-  SELECT start_time, end_time INTO clinic_start, clinic_end FROM get_working_hours_for_date(p_date) LIMIT 1;
-  IF clinic_start IS NULL THEN
-    RETURN;
-  END IF;
-
-  slot_start := (p_date + clinic_start)::timestamp;
-  slot_end := (p_date + clinic_end)::timestamp;
-
-  WHILE slot_start + (dur_minutes || ' minutes')::interval <= slot_end LOOP
-    IF EXISTS (
-      SELECT 1 FROM scheduled_appointments sa
-      WHERE sa.date = p_date
-        AND NOT (sa.end_time <= slot_start::time OR sa.start_time >= (slot_start + (dur_minutes || ' minutes')::interval)::time)
-        AND sa.status = 'confirmed'
-    ) THEN
-      is_available := FALSE;
-    ELSE
-      is_available := TRUE;
-    END IF;
-
-    start_time := slot_start::time;
-    end_time := (slot_start + (dur_minutes || ' minutes')::interval)::time;
-    RETURN NEXT;
-    slot_start := slot_start + (dur_minutes || ' minutes')::interval;
-  END LOOP;
+  RETURN QUERY
+  WITH days AS (
+    SELECT d::date AS day, wh.start_time AS opens_at, wh.end_time AS closes_at
+    FROM generate_series(p_start_date::timestamp, p_end_date::timestamp, interval '1 day') AS d
+    CROSS JOIN LATERAL get_working_hours_for_date(d::date) AS wh
+  ),
+  slots AS (
+    SELECT days.day, g.slot_start, g.slot_start + dur AS slot_end
+    FROM days
+    CROSS JOIN LATERAL generate_series(
+      days.day + days.opens_at,
+      days.day + days.closes_at - dur,
+      dur
+    ) AS g(slot_start)
+  ),
+  booked AS (
+    SELECT sa.date, sa.start_time, sa.end_time
+    FROM scheduled_appointments sa
+    WHERE sa.date BETWEEN p_start_date AND p_end_date
+      AND sa.status = 'confirmed'
+  )
+  SELECT
+    slots.day,
+    slots.slot_start::time,
+    slots.slot_end::time,
+    bool_and(booked.date IS NULL)
+  FROM slots
+  LEFT JOIN booked
+    ON booked.date = slots.day
+   AND booked.start_time < slots.slot_end::time
+   AND booked.end_time > slots.slot_start::time
+  GROUP BY slots.day, slots.slot_start, slots.slot_end
+  ORDER BY slots.day, slots.slot_start;
 END;
 $$;
 
--- Helper: book_appointment(...) - atomic booking with overlap checks
+-- Helper: generate_available_slots(date, appointment_type)
+
+CREATE OR REPLACE FUNCTION generate_available_slots(p_date DATE, p_appointment_type TEXT)
+RETURNS TABLE(start_time TIME, end_time TIME, is_available BOOLEAN)
+LANGUAGE sql STABLE AS $$
+  SELECT r.start_time, r.end_time, r.is_available
+  FROM generate_available_slots_range(p_date, p_date, p_appointment_type) r;
+$$;
+
+-- Helper: book_appointment(...) - atomic booking with overlap checks.
+-- Returns the API booking id, and logs the booking in appointment_changes
+-- so running API workers pick it up.
+
+DROP FUNCTION IF EXISTS book_appointment(TEXT, DATE, TIME, TEXT, TEXT, TEXT, TEXT);
 
 CREATE OR REPLACE FUNCTION book_appointment(
   p_appointment_type TEXT,
@@ -230,15 +280,19 @@ CREATE OR REPLACE FUNCTION book_appointment(
   p_patient_phone TEXT,
   p_reason TEXT
 )
-RETURNS TABLE(booking_id UUID, status TEXT, confirmation_code TEXT) LANGUAGE plpgsql AS $$
+RETURNS TABLE(booking_id TEXT, status TEXT, confirmation_code TEXT) LANGUAGE plpgsql AS $$
 DECLARE
   type_id INTEGER;
   dur INTEGER;
   p_end_time TIME;
   overlap_count INTEGER;
-  new_id UUID;
+  new_id TEXT;
   conf_code TEXT;
 BEGIN
+  -- Same key as the API's writers (WRITER_LOCK_KEY in sql_storage.py), so
+  -- the overlap check below can't race them
+  PERFORM pg_advisory_xact_lock(1296385089);
+
   SELECT id, duration_minutes INTO type_id, dur FROM appointment_types WHERE name = p_appointment_type;
   IF NOT FOUND THEN
     RAISE EXCEPTION 'Invalid appointment type: %', p_appointment_type;
@@ -267,12 +321,14 @@ BEGIN
   conf_code := generate_confirmation_code();
 
   INSERT INTO scheduled_appointments (
-    appointment_type_id, patient_name, patient_email, patient_phone, reason,
+    booking_id, appointment_type_id, patient_name, patient_email, patient_phone, reason,
     date, start_time, end_time, confirmation_code, status
   ) VALUES (
-    type_id, p_patient_name, p_patient_email, p_patient_phone, p_reason,
+    generate_booking_id(), type_id, p_patient_name, p_patient_email, p_patient_phone, p_reason,
     p_date, p_start_time, p_end_time, conf_code, 'confirmed'
-  ) RETURNING id INTO new_id;
+  ) RETURNING scheduled_appointments.booking_id INTO new_id;
+
+  INSERT INTO appointment_changes (booking_id) VALUES (new_id);
 
   booking_id := new_id;
   status := 'confirmed';
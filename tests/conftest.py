@@ -3,12 +3,51 @@ Pytest configuration and shared fixtures for testing the FastAPI application.
 """
 import json
 from pathlib import Path
-from typing import Generator
+from typing import Generator, Optional
 
 import pytest
 from fastapi.testclient import TestClient
 
 from backend.main import app
+from backend.models.schemas import BookingRequest, PatientInfo
+
+
+def make_booking(date: str = "2024-01-15", start_time: str = "10:00") -> BookingRequest:
+    """Build a consultation BookingRequest for ``date`` at ``start_time``."""
+    return BookingRequest(
+        appointment_type="consultation",
+        date=date,
+        start_time=start_time,
+        patient=PatientInfo(name="John Doe", email="john.doe@example.com", phone="1"),
+        reason="Checkup",
+    )
+
+
+def make_appointment(
+    appt_id: Optional[str] = None,
+    date: str = "2024-01-15",
+    start_time: str = "10:00",
+    end_time: Optional[str] = "10:30",
+    **fields,
+) -> dict:
+    """Build a consultation appointment dict for ``date`` at ``start_time``.
+
+    With ``appt_id`` it is a stored row with a confirmation code, without one
+    a booking request body. ``end_time=None`` leaves the end out, and
+    ``fields`` replace any other key.
+    """
+    appointment = {} if appt_id is None else {"id": appt_id}
+    appointment.update(
+        appointment_type="consultation", date=date, start_time=start_time
+    )
+    if end_time is not None:
+        appointment["end_time"] = end_time
+    appointment["patient"] = {"name": "Test", "email": "test@example.com", "phone": "1"}
+    appointment["reason"] = "Test"
+    if appt_id is not None:
+        appointment["confirmation_code"] = f"CODE-{appt_id}"
+    appointment.update(fields)
+    return appointment
 
 
 @pytest.fixture
@@ -66,7 +105,18 @@ def mock_schedule_file(test_db_dir: Path, monkeypatch) -> Generator[Path, None,
 
 
 @pytest.fixture
-def client(mock_appointments_file, mock_schedule_file) -> TestClient:
+def revocation_list(test_db_dir: Path, monkeypatch):
+    """Keep revoked token ids in a temporary file."""
+    from backend.utils import jwt_handler
+    from backend.utils.revocation import RevocationList
+
+    revocations = RevocationList(test_db_dir / "revoked_tokens.ndjson")
+    monkeypatch.setattr(jwt_handler, "revocations", revocations)
+    yield revocations
+
+
+@pytest.fixture
+def client(mock_appointments_file, mock_schedule_file, revocation_list) -> TestClient:
     """Create a test client for the FastAPI application."""
     return TestClient(app)
 
@@ -1,9 +1,13 @@
 """
 Tests for appointment booking endpoints.
 """
+import json
+
 import pytest
 from fastapi import status
 
+from tests.conftest import make_appointment
+
 
 class TestAvailability:
     """Test cases for the availability endpoint."""
@@ -75,6 +79,283 @@ class TestAvailability:
             assert response.status_code == status.HTTP_200_OK
 
 
+class TestAvailabilityRange:
+    """Test cases for the multi-day availability endpoint."""
+    
+    def test_range_streams_one_line_per_day(self, client, auth_headers):
+        """Test that every day in the range is returned as an NDJSON line."""
+        response = client.get(
+            "/api/calendly/availability/range",
+            params={
+                "start_date": "2024-01-15",
+                "end_date": "2024-01-21",
+                "appointment_type": "consultation",
+            },
+            headers=auth_headers
+        )
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        days = [json.loads(line) for line in response.text.splitlines()]
+        assert [day["date"] for day in days] == [
+            "2024-01-15", "2024-01-16", "2024-01-17", "2024-01-18",
+            "2024-01-19", "2024-01-20", "2024-01-21",
+        ]
+        assert all(isinstance(day["available_slots"], list) for day in days)
+    
+    def test_range_matches_single_day_endpoint(self, client, auth_headers):
+        """Test that range results agree with per-day availability after a booking."""
+        client.post(
+            "/api/calendly/book",
+            json={
+                "appointment_type": "consultation",
+                "date": "2024-01-16",
+                "start_time": "10:00",
+                "patient": {
+                    "name": "John Doe",
+                    "email": "john.doe@example.com",
+                    "phone": "123-456-7890"
+                },
+                "reason": "Regular checkup"
+            },
+            headers=auth_headers
+        )
+        
+        response = client.get(
+            "/api/calendly/availability/range",
+            params={
+                "start_date": "2024-01-15",
+                "end_date": "2024-01-17",
+                "appointment_type": "consultation",
+            },
+            headers=auth_headers
+        )
+        days = [json.loads(line) for line in response.text.splitlines()]
+        
+        for day in days:
+            single = client.get(
+                "/api/calendly/availability",
+                params={"date": day["date"], "appointment_type": "consultation"},
+                headers=auth_headers
+            )
+            assert single.json() == day
+        booked = {s["start_time"]: s["available"] for s in days[1]["available_slots"]}
+        assert booked["10:00"] is False
+    
+    def test_range_end_before_start(self, client, auth_headers):
+        """Test that an inverted range is rejected."""
+        response = client.get(
+            "/api/calendly/availability/range",
+            params={
+                "start_date": "2024-01-20",
+                "end_date": "2024-01-15",
+                "appointment_type": "consultation",
+            },
+            headers=auth_headers
+        )
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_range_too_long(self, client, auth_headers):
+        """Test that an unbounded range is rejected."""
+        response = client.get(
+            "/api/calendly/availability/range",
+            params={
+                "start_date": "2024-01-01",
+                "end_date": "2024-12-31",
+                "appointment_type": "consultation",
+            },
+            headers=auth_headers
+        )
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "at most" in response.json()["detail"]
+    
+    def test_range_invalid_appointment_type(self, client, auth_headers):
+        """Test range availability with invalid appointment type."""
+        response = client.get(
+            "/api/calendly/availability/range",
+            params={
+                "start_date": "2024-01-15",
+                "end_date": "2024-01-16",
+                "appointment_type": "invalid_type",
+            },
+            headers=auth_headers
+        )
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class TestAvailabilityByType:
+    """Test cases for availability of several appointment types in one call."""
+
+    def test_defaults_to_every_type(self, client, auth_headers):
+        """Test that each type matches the single-type endpoint."""
+        response = client.get(
+            "/api/calendly/availability/types",
+            params={"date": "2024-01-15"},
+            headers=auth_headers
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["date"] == "2024-01-15"
+        assert list(data["slots_by_type"]) == ["consultation", "followup", "physical", "specialist", "general"]
+        for apt_type, slots in data["slots_by_type"].items():
+            single = client.get(
+                "/api/calendly/availability",
+                params={"date": "2024-01-15", "appointment_type": apt_type},
+                headers=auth_headers
+            )
+            assert single.json()["available_slots"] == slots
+
+    def test_subset_keeps_requested_order(self, client, auth_headers):
+        """Test that only the chosen types are returned, once each, in order."""
+        response = client.get(
+            "/api/calendly/availability/types",
+            params={"date": "2024-01-15", "appointment_types": "specialist, followup,specialist"},
+            headers=auth_headers
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert list(response.json()["slots_by_type"]) == ["specialist", "followup"]
+
+    def test_invalid_type(self, client, auth_headers):
+        """Test that an unknown type in the list is rejected."""
+        response = client.get(
+            "/api/calendly/availability/types",
+            params={"date": "2024-01-15", "appointment_types": "consultation,dental"},
+            headers=auth_headers
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "dental" in response.json()["detail"]
+
+    def test_range_streams_one_line_per_day(self, client, auth_headers):
+        """Test that the range variant returns every type for every day."""
+        response = client.get(
+            "/api/calendly/availability/types/range",
+            params={
+                "start_date": "2024-01-15",
+                "end_date": "2024-01-17",
+                "appointment_types": "consultation,general",
+            },
+            headers=auth_headers
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        days = [json.loads(line) for line in response.text.splitlines()]
+        assert [day["date"] for day in days] == ["2024-01-15", "2024-01-16", "2024-01-17"]
+        assert all(list(day["slots_by_type"]) == ["consultation", "general"] for day in days)
+
+    def test_range_too_long(self, client, auth_headers):
+        """Test that the range variant shares the range limit."""
+        response = client.get(
+            "/api/calendly/availability/types/range",
+            params={"start_date": "2024-01-01", "end_date": "2024-12-31"},
+            headers=auth_headers
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_requires_authentication(self, client):
+        """Test that the endpoint is protected."""
+        response = client.get("/api/calendly/availability/types", params={"date": "2024-01-15"})
+
+        assert response.status_code in (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN)
+
+
+class TestNextAvailable:
+    """Test cases for the next-available-slot search."""
+
+    def _book(self, client, auth_headers, date, starts, appointment_type="consultation"):
+        bookings = [
+            {
+                "appointment_type": appointment_type,
+                "date": date,
+                "start_time": start,
+                "patient": {"name": "John Doe", "email": "john.doe@example.com", "phone": "1"},
+                "reason": "Checkup",
+            }
+            for start in starts
+        ]
+        response = client.post("/api/calendly/book/bulk", json={"bookings": bookings}, headers=auth_headers)
+        assert response.json()["status"] == "confirmed"
+
+    def _next(self, client, auth_headers, **params):
+        params.setdefault("appointment_type", "consultation")
+        params.setdefault("start_date", "2024-01-15")
+        return client.get("/api/calendly/availability/next", params=params, headers=auth_headers)
+
+    def test_skips_fully_booked_days(self, client, auth_headers):
+        """Test that the search moves past a full day and stops at the limit."""
+        full_day = [f"{hour:02}:{minute:02}" for hour in range(9, 17) for minute in (0, 30)]
+        self._book(client, auth_headers, "2024-01-15", full_day)
+        self._book(client, auth_headers, "2024-01-16", ["09:00"])
+
+        response = self._next(client, auth_headers, limit=2)
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["slots"] == [
+            {"date": "2024-01-16", "start_time": "09:30", "end_time": "10:00"},
+            {"date": "2024-01-16", "start_time": "10:00", "end_time": "10:30"},
+        ]
+        assert data["days_searched"] == 2
+
+    def test_matches_daily_availability_grid(self, client, auth_headers):
+        """Test that found slots are slots the per-day endpoint offers as free."""
+        self._book(client, auth_headers, "2024-01-15", ["09:00", "09:45"], appointment_type="followup")
+
+        found = self._next(client, auth_headers, appointment_type="physical", limit=3).json()["slots"]
+        daily = client.get(
+            "/api/calendly/availability",
+            params={"date": "2024-01-15", "appointment_type": "physical"},
+            headers=auth_headers,
+        ).json()["available_slots"]
+
+        free = [(slot["start_time"], slot["end_time"]) for slot in daily if slot["available"]]
+        assert [(slot["start_time"], slot["end_time"]) for slot in found] == free[:3]
+
+    def test_time_of_day_window(self, client, auth_headers):
+        """Test that only slots inside the window are returned."""
+        response = self._next(
+            client, auth_headers, window_start="14:00", window_end="15:00", limit=4
+        )
+
+        slots = response.json()["slots"]
+        assert [(slot["date"], slot["start_time"]) for slot in slots] == [
+            ("2024-01-15", "14:00"),
+            ("2024-01-15", "14:30"),
+            ("2024-01-16", "14:00"),
+            ("2024-01-16", "14:30"),
+        ]
+
+    def test_horizon_bounds_the_search(self, client, auth_headers):
+        """Test that nothing is returned once the horizon is exhausted."""
+        response = self._next(
+            client, auth_headers, appointment_type="specialist", window_start="16:30", horizon_days=10
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["slots"] == []
+        assert response.json()["days_searched"] == 10
+
+    def test_invalid_parameters(self, client, auth_headers):
+        """Test that malformed search parameters are rejected."""
+        for params in (
+            {"appointment_type": "invalid_type"},
+            {"start_date": "15-01-2024"},
+            {"window_start": "2pm"},
+            {"window_start": "15:00", "window_end": "14:00"},
+            {"horizon_days": 0},
+            {"limit": 1000},
+        ):
+            response = self._next(client, auth_headers, **params)
+            assert response.status_code == status.HTTP_400_BAD_REQUEST, params
+
+
 class TestBooking:
     """Test cases for the booking endpoint."""
     
@@ -144,6 +425,33 @@ class TestBooking:
         
         assert response.status_code == status.HTTP_400_BAD_REQUEST
     
+    def test_book_appointment_invalid_date(self, client, auth_headers, booking_request):
+        """Test booking with a date that does not exist."""
+        booking_request["date"] = "2024-02-30"
+
+        response = client.post(
+            "/api/calendly/book",
+            json=booking_request,
+            headers=auth_headers
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "Invalid date" in response.json()["detail"]
+    
+    def test_book_appointment_past_midnight(self, client, auth_headers, booking_request):
+        """Test that a booking running past midnight is rejected."""
+        booking_request["appointment_type"] = "specialist"
+        booking_request["start_time"] = "23:30"
+
+        response = client.post(
+            "/api/calendly/book",
+            json=booking_request,
+            headers=auth_headers
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "midnight" in response.json()["detail"]
+
     def test_book_appointment_missing_fields(self, client, auth_headers):
         """Test booking with missing required fields."""
         incomplete_request = {
@@ -173,6 +481,106 @@ class TestBooking:
         assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
 
 
+def _bulk_item(start_time: str, date: str = "2024-01-15", appointment_type: str = "consultation") -> dict:
+    return make_appointment(
+        date=date,
+        start_time=start_time,
+        end_time=None,
+        appointment_type=appointment_type,
+    )
+
+
+class TestBulkBooking:
+    """Test cases for the bulk booking endpoint."""
+
+    def test_bulk_booking_writes_once(self, client, auth_headers, monkeypatch):
+        """Test that a whole batch is persisted with a single backend write."""
+        from backend.db.database import get_store
+
+        store = get_store()
+        writes = []
+        write = store.storage.write
+        monkeypatch.setattr(
+            store.storage, "write", lambda ops, appts: writes.append(len(ops)) or write(ops, appts)
+        )
+        items = [_bulk_item(f"{hour:02}:00") for hour in range(9, 14)]
+        items.append(_bulk_item("09:00", date="2024-01-16"))
+
+        response = client.post(
+            "/api/calendly/book/bulk",
+            json={"bookings": items},
+            headers=auth_headers
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["status"] == "confirmed"
+        assert data["booked"] == 6
+        assert [r["index"] for r in data["results"]] == list(range(6))
+        assert all(r["booking_id"] for r in data["results"])
+        assert writes == [6]
+
+    def test_atomic_batch_is_all_or_nothing(self, client, auth_headers):
+        """Test that one clash inside an atomic batch books nothing."""
+        items = [_bulk_item("10:00"), _bulk_item("11:00"), _bulk_item("10:15")]
+
+        response = client.post(
+            "/api/calendly/book/bulk",
+            json={"bookings": items},
+            headers=auth_headers
+        )
+
+        data = response.json()
+        assert data["status"] == "rejected"
+        assert data["booked"] == 0
+        assert [r["status"] for r in data["results"]] == ["not_booked", "not_booked", "rejected"]
+        assert "in this request" in data["results"][2]["error"]
+        slots = client.get(
+            "/api/calendly/availability",
+            params={"date": "2024-01-15", "appointment_type": "consultation"},
+            headers=auth_headers
+        ).json()["available_slots"]
+        assert all(slot["available"] for slot in slots)
+
+    def test_best_effort_books_what_it_can(self, client, auth_headers):
+        """Test that best-effort mode skips clashes and bad items only."""
+        client.post("/api/calendly/book", json=_bulk_item("09:00"), headers=auth_headers)
+        items = [
+            _bulk_item("09:00"),
+            _bulk_item("10:00"),
+            _bulk_item("10:00", appointment_type="invalid_type"),
+            _bulk_item("10:00", date="2024-01-17"),
+        ]
+
+        response = client.post(
+            "/api/calendly/book/bulk",
+            json={"bookings": items, "atomic": False},
+            headers=auth_headers
+        )
+
+        data = response.json()
+        assert data["status"] == "partial"
+        assert data["booked"] == 2
+        assert [r["status"] for r in data["results"]] == ["rejected", "confirmed", "rejected", "confirmed"]
+        assert data["results"][0]["error"] == "Time slot not available"
+        assert data["results"][2]["error"] == "Invalid appointment type"
+
+    def test_bulk_booking_limit(self, client, auth_headers, monkeypatch):
+        """Test that oversized batches are refused."""
+        from backend.tools import booking_tool
+
+        monkeypatch.setattr(booking_tool, "MAX_BULK_BOOKINGS", 2)
+        items = [_bulk_item(f"{hour:02}:00") for hour in range(9, 12)]
+
+        response = client.post(
+            "/api/calendly/book/bulk",
+            json={"bookings": items},
+            headers=auth_headers
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
 class TestDeleteAppointment:
     """Test cases for the delete appointment endpoint."""
     
@@ -323,6 +731,35 @@ class TestRescheduleAppointment:
         assert response.status_code == status.HTTP_400_BAD_REQUEST
         assert "not available" in response.json()["detail"].lower()
     
+    def test_reschedule_malformed_input(self, client, auth_headers, created_appointment):
+        """Test that malformed dates and times are rejected with 400, known id or not."""
+        cases = [
+            ({"date": "17-01-2024"}, "invalid date"),
+            ({"start_time": "1500"}, "invalid start time"),
+            ({"start_time": "-1:00"}, "invalid start time"),
+            ({"start_time": "24:00"}, "invalid start time"),
+            ({"start_time": "09:75"}, "invalid start time"),
+            ({"appointment_type": "surgery"}, "invalid appointment type"),
+        ]
+        for appointment_id in (created_appointment, "APPT-NONEXISTENT"):
+            for change, detail in cases:
+                reschedule_request = {
+                    "appointment_id": appointment_id,
+                    "appointment_type": "consultation",
+                    "date": "2024-01-17",
+                    "start_time": "15:00",
+                    **change,
+                }
+
+                response = client.put(
+                    f"/api/calendly/appointments/{appointment_id}/reschedule",
+                    json=reschedule_request,
+                    headers=auth_headers
+                )
+
+                assert response.status_code == status.HTTP_400_BAD_REQUEST, change
+                assert detail in response.json()["detail"].lower()
+
     def test_reschedule_id_mismatch(self, client, auth_headers, created_appointment):
         """Test rescheduling with mismatched appointment_id in path and body."""
         reschedule_request = {
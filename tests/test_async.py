@@ -0,0 +1,113 @@
+"""
+Tests for the async storage API used by the calendly routes.
+"""
+import asyncio
+import threading
+
+import pytest
+
+from backend.db import async_database, database
+from backend.db.store import NOT_READY
+from backend.tools.availability_tool import generate_daily_slots
+from backend.tools.booking_tool import book_appointment
+from tests.conftest import make_booking
+
+
+@pytest.fixture
+def warm_store(mock_appointments_file, mock_schedule_file):
+    """Load the store so reads can be served from memory."""
+    store = database.get_store()
+    store.load()
+    return store
+
+
+@pytest.fixture
+def no_threadpool(monkeypatch):
+    """Fail any read that is offloaded to the threadpool."""
+    async def offload(fn, *args):
+        raise AssertionError(f"{fn.__name__} was offloaded")
+
+    monkeypatch.setattr(async_database, "run_in_threadpool", offload)
+
+
+class TestAsyncReads:
+    """Test cases for reads served on or off the event loop."""
+
+    def test_warm_read_stays_on_event_loop(self, warm_store, no_threadpool):
+        """Test that an unchanged, loaded store is read inline."""
+        loop_thread = threading.get_ident()
+        seen = []
+
+        def read(date):
+            seen.append(threading.get_ident())
+            return generate_daily_slots(date, "consultation")
+
+        slots = asyncio.run(async_database.run_read(read, "2024-01-15"))
+
+        assert slots == generate_daily_slots("2024-01-15", "consultation")
+        assert seen == [loop_thread]
+
+    def test_external_change_is_read_in_threadpool(self, warm_store, mock_appointments_file):
+        """Test that a changed backing file is reloaded off the event loop."""
+        database._write_json(
+            mock_appointments_file, [book_appointment(make_booking())]
+        )
+        warm_store.lock.bump()  # as another worker's write would
+
+        assert warm_store.read_nowait(database.load_appointments) is NOT_READY
+        appointments = asyncio.run(async_database.load_appointments())
+
+        assert len(appointments) == 1
+
+    def test_read_does_not_wait_for_a_writer(self, warm_store):
+        """Test that a read falls back instead of blocking on a held lock."""
+        held = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with warm_store._lock:
+                held.set()
+                release.wait()
+
+        writer = threading.Thread(target=hold)
+        writer.start()
+        held.wait()
+        try:
+            assert warm_store.read_nowait(database.load_appointments) is NOT_READY
+        finally:
+            release.set()
+            writer.join()
+
+
+class TestAsyncWrites:
+    """Test cases for writes offloaded to the storage executor."""
+
+    def test_writes_run_on_storage_executor(self, warm_store):
+        """Test that writes leave the event loop for the storage pool."""
+        names = []
+
+        def write(data):
+            names.append(threading.current_thread().name)
+            return book_appointment(data)
+
+        result = asyncio.run(async_database.run_write(write, make_booking()))
+
+        assert names[0].startswith("storage-write")
+        assert database.get_appointment(result["id"]) == result
+
+    def test_async_mirrors_round_trip(self, warm_store):
+        """Test the async database helpers against the sync store."""
+        appointment = book_appointment(make_booking())
+
+        async def scenario():
+            moved = dict(appointment, start_time="11:00", end_time="11:30")
+            assert await async_database.replace_appointment(moved)
+            intervals = await async_database.booked_intervals("2024-01-15")
+            removed = await async_database.remove_appointment(appointment["id"])
+            return intervals, removed, await async_database.load_appointments()
+
+        intervals, removed, remaining = asyncio.run(scenario())
+
+        assert intervals == [(660, 690, appointment["id"])]
+        assert removed["start_time"] == "11:00"
+        assert remaining == []
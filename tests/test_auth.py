@@ -1,9 +1,16 @@
 """
 Tests for authentication endpoints.
 """
+import threading
+
+import jwt
 import pytest
 from fastapi import status
 
+from backend.utils import jwt_handler
+from backend.utils.revocation import BloomFilter, RevocationList
+from backend.utils.token_cache import TokenCache
+
 
 class TestLogin:
     """Test cases for the login endpoint."""
@@ -177,3 +184,260 @@ class TestProtectedEndpoints:
         
         assert response.status_code == status.HTTP_200_OK
 
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def empty_token_cache():
+    """Start with an empty verified-token cache."""
+    jwt_handler.token_cache.clear()
+    yield jwt_handler.token_cache
+    jwt_handler.token_cache.clear()
+
+
+class TestTokenCache:
+    """Test cases for the verified-token cache."""
+
+    def test_repeat_requests_skip_decoding(self, client, auth_headers, empty_token_cache, monkeypatch):
+        """Test that a token is decoded once and then served from the cache."""
+        url = "/api/calendly/availability?date=2024-01-15&appointment_type=consultation"
+        decoded = []
+        decode = jwt_handler.decode_token
+        monkeypatch.setattr(
+            jwt_handler, "decode_token", lambda t: decoded.append(t) or decode(t)
+        )
+
+        for _ in range(3):
+            assert client.get(url, headers=auth_headers).status_code == status.HTTP_200_OK
+
+        assert len(decoded) == 1
+        assert empty_token_cache.stats()["hits"] == 2
+
+    def test_expired_entry_is_never_served(self):
+        """Test that an entry stops hitting once its exp has passed."""
+        clock = FakeClock()
+        cache = TokenCache(8, clock=clock)
+        cache.put("token", {"sub": "admin", "exp": 1060})
+
+        assert cache.get("token") == {"sub": "admin", "exp": 1060}
+        clock.now = 1060
+        assert cache.get("token") is None
+        assert cache.stats()["size"] == 0
+
+    def test_expired_token_is_rejected(self, client, empty_token_cache, monkeypatch):
+        """Test that a cached token is rejected by the decoder once expired."""
+        token = jwt.encode(
+            {"sub": "admin", "exp": 4102444800}, jwt_handler.SECRET_KEY, algorithm=jwt_handler.ALGORITHM
+        )
+        headers = {"Authorization": f"Bearer {token}"}
+        url = "/api/calendly/availability?date=2024-01-15&appointment_type=consultation"
+        assert client.get(url, headers=headers).status_code == status.HTTP_200_OK
+
+        def expired(token):
+            raise jwt.ExpiredSignatureError()
+
+        monkeypatch.setattr(empty_token_cache, "clock", lambda: 4102444800)
+        monkeypatch.setattr(jwt_handler, "decode_token", expired)
+        response = client.get(url, headers=headers)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert response.json()["detail"] == "Token has expired"
+
+    def test_eviction(self):
+        """Test that the least recently used token is dropped when full."""
+        cache = TokenCache(2, clock=FakeClock())
+        for name in ("a", "b", "c"):
+            cache.put(name, {"exp": 2000})
+
+        assert cache.get("a") is None
+        assert cache.get("b") is not None
+        assert cache.get("c") is not None
+        assert cache.stats()["evictions"] == 1
+
+    def test_tokens_without_exp_are_not_cached(self):
+        """Test that a token without an expiry is always re-verified."""
+        cache = TokenCache(8, clock=FakeClock())
+        cache.put("token", {"sub": "admin"})
+
+        assert cache.get("token") is None
+
+    def test_cached_payload_cannot_be_mutated(self):
+        """Test that callers cannot alter the cached claims."""
+        cache = TokenCache(8, clock=FakeClock())
+        cache.put("token", {"sub": "admin", "exp": 2000})
+        cache.get("token")["sub"] = "mallory"
+
+        assert cache.get("token")["sub"] == "admin"
+
+    def test_stats_endpoint(self, client, auth_headers, empty_token_cache):
+        """Test that the token cache reports its counters."""
+        response = client.get("/api/auth/token-cache", headers=auth_headers)
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["misses"] == 1
+        assert data["size"] == 1
+        assert data["max_entries"] == jwt_handler.TOKEN_CACHE_SIZE
+
+
+def _login(client) -> dict:
+    response = client.post(
+        "/api/auth/login",
+        json={"username": "admin", "password": "admin123"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()
+
+
+def _refresh(client, token: str):
+    return client.post("/api/auth/refresh", json={"refresh_token": token})
+
+
+AVAILABILITY_URL = "/api/calendly/availability?date=2024-01-15&appointment_type=consultation"
+
+
+class TestTokenRevocation:
+    """Test cases for refresh-token rotation and session revocation."""
+
+    def test_refresh_token_is_single_use(self, client):
+        """Test that a rotated refresh token cannot be used again."""
+        tokens = _login(client)
+
+        rotated = _refresh(client, tokens["refresh_token"])
+        replayed = _refresh(client, tokens["refresh_token"])
+
+        assert rotated.status_code == status.HTTP_200_OK
+        assert replayed.status_code == status.HTTP_401_UNAUTHORIZED
+        assert replayed.json()["detail"] == "Refresh token has been revoked"
+
+    def test_replay_revokes_the_session(self, client):
+        """Test that reusing a refresh token shuts down the rotated chain too."""
+        tokens = _login(client)
+        rotated = _refresh(client, tokens["refresh_token"]).json()
+
+        _refresh(client, tokens["refresh_token"])
+
+        assert _refresh(client, rotated["refresh_token"]).status_code == status.HTTP_401_UNAUTHORIZED
+        headers = {"Authorization": f"Bearer {rotated['access_token']}"}
+        assert client.get(AVAILABILITY_URL, headers=headers).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_logout_revokes_cached_access_token(self, client, empty_token_cache):
+        """Test that logout rejects access tokens already in the token cache."""
+        tokens = _login(client)
+        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+        assert client.get(AVAILABILITY_URL, headers=headers).status_code == status.HTTP_200_OK
+
+        response = client.post("/api/auth/logout", json={"refresh_token": tokens["refresh_token"]})
+
+        assert response.status_code == status.HTTP_200_OK
+        denied = client.get(AVAILABILITY_URL, headers=headers)
+        assert denied.status_code == status.HTTP_401_UNAUTHORIZED
+        assert denied.json()["detail"] == "Token has been revoked"
+        assert _refresh(client, tokens["refresh_token"]).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_access_check_can_be_disabled(self, client, monkeypatch):
+        """Test that access tokens skip the revocation check when configured."""
+        monkeypatch.setattr(jwt_handler, "CHECK_ACCESS_REVOCATION", False)
+        tokens = _login(client)
+        client.post("/api/auth/logout", json={"refresh_token": tokens["refresh_token"]})
+
+        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+        assert client.get(AVAILABILITY_URL, headers=headers).status_code == status.HTTP_200_OK
+
+    def test_revocations_are_shared_through_the_file(self, client, revocation_list):
+        """Test that another worker's list sees revocations and rejects reuse."""
+        tokens = _login(client)
+        _refresh(client, tokens["refresh_token"])
+        other = RevocationList(revocation_list.path)
+        payload = jwt.decode(
+            tokens["refresh_token"], jwt_handler.SECRET_KEY, algorithms=[jwt_handler.ALGORITHM]
+        )
+
+        assert other.is_revoked(payload["jti"])
+        assert not other.revoke(payload["jti"], payload["exp"])
+
+
+class TestRevocationList:
+    """Test cases for the revocation list and its Bloom filter."""
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        """Test that every added item is reported present."""
+        bloom = BloomFilter(1000, 0.01)
+        items = [f"id-{n}" for n in range(1000)]
+        for item in items:
+            bloom.add(item)
+
+        assert all(item in bloom for item in items)
+        false_positives = sum(f"other-{n}" in bloom for n in range(10000))
+        assert false_positives < 300
+
+    def test_prune_drops_expired_ids(self, tmp_path):
+        """Test that pruning forgets expired ids in memory and on disk."""
+        clock = FakeClock()
+        revocations = RevocationList(tmp_path / "revoked.ndjson", clock=clock)
+        revocations.revoke("old", 1100)
+        revocations.revoke("new", 5000)
+
+        clock.now = 2000
+        assert revocations.prune() == 1
+
+        assert not revocations.is_revoked("old")
+        assert revocations.is_revoked("new")
+        reloaded = RevocationList(tmp_path / "revoked.ndjson", clock=clock)
+        assert len(reloaded) == 1
+
+    def test_filter_grows_past_capacity(self):
+        """Test that ids beyond the initial capacity are still tracked."""
+        revocations = RevocationList(capacity=4, clock=FakeClock())
+        for n in range(50):
+            revocations.revoke(f"id-{n}", 2000)
+
+        assert all(revocations.is_revoked(f"id-{n}") for n in range(50))
+        assert not revocations.is_revoked("id-50")
+
+    def test_other_worker_sees_prune(self, tmp_path):
+        """Test that a list reloads after another worker rewrote the file."""
+        clock = FakeClock()
+        path = tmp_path / "revoked.ndjson"
+        first = RevocationList(path, clock=clock)
+        second = RevocationList(path, clock=clock)
+        first.revoke("old", 1100)
+        first.revoke("new", 5000)
+        assert second.is_revoked("old")
+
+        clock.now = 2000
+        first.prune()
+
+        assert not second.is_revoked("old")
+        assert second.is_revoked("new")
+
+    def test_lookups_do_not_wait_for_a_revocation(self, tmp_path, monkeypatch):
+        """Test that is_revoked answers from memory while a revoke is writing."""
+        revocations = RevocationList(tmp_path / "revoked.ndjson", clock=FakeClock())
+        revocations.revoke("old", 5000)
+        writing, release = threading.Event(), threading.Event()
+        original = revocations._append
+
+        def slow_append(item, expires):
+            writing.set()
+            release.wait(5)
+            original(item, expires)
+
+        monkeypatch.setattr(revocations, "_append", slow_append)
+        worker = threading.Thread(target=revocations.revoke, args=("new", 5000))
+        worker.start()
+        try:
+            assert writing.wait(5)
+            assert revocations.is_revoked("old")
+            assert not revocations.is_revoked("new")
+        finally:
+            release.set()
+            worker.join()
+
+        assert revocations.is_revoked("new")
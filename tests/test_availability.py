@@ -0,0 +1,385 @@
+"""
+Tests for availability generation and its cache.
+"""
+import json
+
+import pytest
+from fastapi import status
+
+from backend.db import database
+from backend.db.schedule import compile_schedule
+from backend.models.schemas import RescheduleRequest
+from backend.tools.availability_tool import (
+    find_next_available,
+    generate_daily_slots,
+    generate_slots_by_type,
+    slot_cache,
+)
+from backend.tools.booking_tool import (
+    book_appointment,
+    delete_appointment,
+    reschedule_appointment,
+)
+from backend.tools.slot_cache import SlotCache
+from tests.conftest import make_booking
+
+
+def _is_free(date: str, start_time: str) -> bool:
+    slots = generate_daily_slots(date, "consultation")
+    return {s["start_time"]: s["available"] for s in slots}[start_time]
+
+
+@pytest.fixture
+def empty_cache(mock_appointments_file, mock_schedule_file):
+    """Start every test with an empty availability cache."""
+    slot_cache.clear()
+    yield slot_cache
+    slot_cache.clear()
+
+
+def _weekly(*weekdays, start_time="09:00", end_time="17:00"):
+    return [
+        {"weekday": weekday, "start_time": start_time, "end_time": end_time}
+        for weekday in weekdays
+    ]
+
+
+@pytest.fixture
+def write_schedule(empty_cache, mock_schedule_file):
+    """Replace the doctor schedule file with the given data."""
+    def write(data):
+        mock_schedule_file.write_text(json.dumps(data))
+    return write
+
+
+class TestAvailabilityCache:
+    """Test cases for cached availability and its invalidation."""
+
+    def test_repeat_reads_hit_the_cache(self, empty_cache):
+        """Test that the second identical lookup is served from the cache."""
+        first = generate_daily_slots("2024-01-15", "consultation")
+        second = generate_daily_slots("2024-01-15", "consultation")
+
+        assert first == second
+        assert empty_cache.stats()["misses"] == 1
+        assert empty_cache.stats()["hits"] == 1
+
+    def test_booking_invalidates_its_date(self, empty_cache):
+        """Test that booking makes the cached slot unavailable immediately."""
+        assert _is_free("2024-01-15", "10:00")
+        generate_daily_slots("2024-01-16", "consultation")
+
+        book_appointment(make_booking())
+
+        assert not _is_free("2024-01-15", "10:00")
+        hits_before = empty_cache.hits
+        generate_daily_slots("2024-01-16", "consultation")
+        assert empty_cache.hits == hits_before + 1
+
+    def test_delete_invalidates_its_date(self, empty_cache):
+        """Test that deleting frees the cached slot."""
+        appointment = book_appointment(make_booking())
+        assert not _is_free("2024-01-15", "10:00")
+
+        delete_appointment(appointment["id"])
+
+        assert _is_free("2024-01-15", "10:00")
+
+    def test_reschedule_invalidates_both_dates(self, empty_cache):
+        """Test that rescheduling refreshes the old and the new date."""
+        appointment = book_appointment(make_booking())
+        assert not _is_free("2024-01-15", "10:00")
+        assert _is_free("2024-01-16", "11:00")
+
+        reschedule_appointment(
+            RescheduleRequest(
+                appointment_id=appointment["id"],
+                appointment_type="consultation",
+                date="2024-01-16",
+                start_time="11:00",
+            )
+        )
+
+        assert _is_free("2024-01-15", "10:00")
+        assert not _is_free("2024-01-16", "11:00")
+
+    def test_all_types_read_bookings_once(self, empty_cache, monkeypatch):
+        """Test that several types are derived from one read of the day's bookings."""
+        from backend.tools import availability_tool
+
+        reads = []
+        original = availability_tool.occupancy
+        monkeypatch.setattr(availability_tool, "occupancy", lambda date: reads.append(date) or original(date))
+        book_appointment(make_booking())
+
+        slots = generate_slots_by_type("2024-01-15", ["followup", "consultation"])
+
+        assert reads == ["2024-01-15"]
+        assert slots["consultation"] == generate_daily_slots("2024-01-15", "consultation")
+        assert {s["start_time"]: s["available"] for s in slots["followup"]}["10:15"] is False
+        assert reads == ["2024-01-15"]  # the single-type call was a cache hit
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted at the cap."""
+        cache = SlotCache(max_entries=2)
+        cache.put("2024-01-15", "consultation", 1, ["a"], 0)
+        cache.put("2024-01-16", "consultation", 1, ["b"], 0)
+        cache.get("2024-01-15", "consultation", 1)
+        cache.put("2024-01-17", "consultation", 1, ["c"], 0)
+
+        assert cache.get("2024-01-16", "consultation", 1) is None
+        assert cache.get("2024-01-15", "consultation", 1) == ["a"]
+        assert cache.stats()["evictions"] == 1
+
+    def test_stale_computation_is_not_cached(self):
+        """Test that a result computed before an invalidation is discarded."""
+        cache = SlotCache(max_entries=8)
+        version = cache.version("2024-01-15")
+        cache.invalidate("2024-01-15")
+        cache.put("2024-01-15", "consultation", 1, ["stale"], version)
+
+        assert cache.get("2024-01-15", "consultation", 1) is None
+
+    def test_versions_stay_bounded_without_repeating(self):
+        """Test that pruned dates read a version none of them had before."""
+        cache = SlotCache(max_entries=2)
+        cache.put("2024-01-01", "consultation", 1, ["kept"], 0)
+        untouched = cache.version("2024-02-01")
+        history = {}
+        for day in range(2, 30):
+            date = f"2024-01-{day:02d}"
+            history[date] = [cache.version(date)]
+            cache.invalidate(date)
+            history[date].append(cache.version(date))
+
+        assert len(cache._versions) <= 2 * cache.max_entries
+        assert cache.get("2024-01-01", "consultation", 1) == ["kept"]
+        for date, versions in history.items():
+            current = cache.version(date)
+            assert current == versions[-1] or current not in versions
+        cache.put("2024-02-01", "consultation", 1, ["stale"], untouched)
+        assert cache.get("2024-02-01", "consultation", 1) is None
+
+    def test_cache_stats_endpoint(self, client, auth_headers, empty_cache):
+        """Test that hit/miss counters are exposed over the API."""
+        params = {"date": "2024-01-15", "appointment_type": "consultation"}
+        client.get("/api/calendly/availability", params=params, headers=auth_headers)
+        client.get("/api/calendly/availability", params=params, headers=auth_headers)
+
+        response = client.get("/api/calendly/availability/cache", headers=auth_headers)
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["hits"] == 1
+        assert data["misses"] == 1
+        assert data["hit_ratio"] == 0.5
+
+
+class TestWeeklySchedule:
+    """Test cases for weekday-aware slot generation."""
+
+    def test_weekends_have_no_slots(self, write_schedule):
+        """Test that days without weekly hours offer nothing."""
+        write_schedule({"weekly": _weekly(1, 2, 3, 4, 5)})
+
+        assert generate_daily_slots("2024-01-13", "consultation") == []  # Saturday
+        assert generate_daily_slots("2024-01-14", "consultation") == []  # Sunday
+        assert len(generate_daily_slots("2024-01-15", "consultation")) == 16  # Monday
+
+    def test_bare_weekly_list_is_accepted(self, write_schedule):
+        """Test the list format of backend/data/doctor_schedule.json."""
+        write_schedule(_weekly(1))
+
+        assert len(generate_daily_slots("2024-01-15", "consultation")) == 16
+        assert generate_daily_slots("2024-01-16", "consultation") == []
+
+    def test_split_day_skips_the_break(self, write_schedule):
+        """Test that two entries for one weekday give two runs of slots."""
+        write_schedule(
+            _weekly(1, start_time="09:00", end_time="12:00")
+            + _weekly(1, start_time="13:00", end_time="14:00")
+        )
+
+        starts = [slot["start_time"] for slot in generate_daily_slots("2024-01-15", "specialist")]
+        assert starts == ["09:00", "10:00", "11:00", "13:00"]
+
+    def test_closures_and_exceptions(self, write_schedule):
+        """Test that closures remove a day and exceptions replace its hours."""
+        write_schedule(
+            {
+                "weekly": _weekly(1, 2, 3, 4, 5),
+                "closures": [{"date": "2024-01-15", "notes": "Training"}],
+                "exceptions": [
+                    {"date": "2024-01-16", "start_time": "09:00", "end_time": "12:00"},
+                    {"date": "2024-01-20", "start_time": "10:00", "end_time": "11:00"},
+                ],
+            }
+        )
+
+        assert generate_daily_slots("2024-01-15", "consultation") == []
+        assert generate_daily_slots("2024-01-16", "consultation")[-1]["end_time"] == "12:00"
+        starts = [slot["start_time"] for slot in generate_daily_slots("2024-01-20", "consultation")]
+        assert starts == ["10:00", "10:30"]
+
+    def test_schedule_is_compiled_once_per_file_version(self, write_schedule):
+        """Test that an unchanged file reuses the grids and an edit rebuilds them."""
+        write_schedule({"weekly": _weekly(1, 2, 3, 4, 5)})
+        schedule = database.get_schedule()
+        generate_daily_slots("2024-01-15", "consultation")
+
+        assert database.get_schedule() is schedule
+
+        write_schedule({"weekly": _weekly(1, 2, 3, 4, 5, end_time="10:00")})
+
+        assert database.get_schedule() is not schedule
+        assert len(generate_daily_slots("2024-01-15", "consultation")) == 2
+
+    def test_next_available_skips_closed_days(self, write_schedule):
+        """Test that the search moves past the weekend."""
+        write_schedule({"weekly": _weekly(1, 2, 3, 4, 5)})
+
+        slots, searched = find_next_available("consultation", "2024-01-13", limit=1)
+
+        assert slots == [{"date": "2024-01-15", "start_time": "09:00", "end_time": "09:30"}]
+        assert searched == 3
+
+    def test_invalid_schedules_are_rejected(self):
+        """Test that malformed schedules fail to compile."""
+        invalid = [
+            {"weekly": [{"weekday": 0, "start_time": "09:00", "end_time": "17:00"}]},
+            {"weekly": _weekly(1, start_time="17:00", end_time="09:00")},
+            {"weekly": _weekly(1) + _weekly(1, start_time="12:00", end_time="18:00")},
+            {"weekly": _weekly(1), "closures": [{"date": "2024-13-01"}]},
+            {"working_hours": {"start": "09:00"}},
+            {},
+        ]
+        for data in invalid:
+            with pytest.raises(ValueError):
+                compile_schedule(data, database.APPOINTMENT_TYPES)
+
+    def test_malformed_date_is_a_bad_request(self, client, auth_headers):
+        """Test that an unparseable date gets 400 rather than a day of slots."""
+        response = client.get(
+            "/api/calendly/availability",
+            params={"date": "2024-1-5", "appointment_type": "consultation"},
+            headers=auth_headers,
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class TestConditionalAvailability:
+    """Test cases for ETag revalidation of availability polls."""
+
+    def _get(self, client, auth_headers, date="2024-01-15", etag=None, path="/api/calendly/availability"):
+        headers = dict(auth_headers)
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        params = {"date": date}
+        if path == "/api/calendly/availability":
+            params["appointment_type"] = "consultation"
+        return client.get(path, params=params, headers=headers)
+
+    def _book(self, client, auth_headers, date="2024-01-15", start_time="10:00"):
+        response = client.post(
+            "/api/calendly/book",
+            json=make_booking(date, start_time).model_dump(),
+            headers=auth_headers,
+        )
+        assert response.status_code == status.HTTP_200_OK
+        return response.json()["booking_id"]
+
+    def test_unchanged_date_is_not_modified(self, client, auth_headers, empty_cache):
+        """Test that a poll with the current ETag gets 304 without generating slots."""
+        first = self._get(client, auth_headers)
+        etag = first.headers["etag"]
+        misses = empty_cache.misses
+        hits = empty_cache.hits
+
+        second = self._get(client, auth_headers, etag=etag)
+
+        assert first.status_code == status.HTTP_200_OK
+        assert second.status_code == status.HTTP_304_NOT_MODIFIED
+        assert second.content == b""
+        assert second.headers["etag"] == etag
+        assert (empty_cache.hits, empty_cache.misses) == (hits, misses)
+
+    def test_booking_changes_only_its_date(self, client, auth_headers, empty_cache):
+        """Test that a booking invalidates its date's ETag and no other."""
+        etag = self._get(client, auth_headers).headers["etag"]
+        other = self._get(client, auth_headers, date="2024-01-16").headers["etag"]
+
+        self._book(client, auth_headers)
+
+        response = self._get(client, auth_headers, etag=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["etag"] != etag
+        booked = {s["start_time"]: s["available"] for s in response.json()["available_slots"]}
+        assert booked["10:00"] is False
+        assert self._get(client, auth_headers, date="2024-01-16", etag=other).status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_delete_and_reschedule_change_the_etag(self, client, auth_headers, empty_cache):
+        """Test that deleting and rescheduling bump the affected dates."""
+        appointment_id = self._book(client, auth_headers)
+        etag = self._get(client, auth_headers).headers["etag"]
+        target = self._get(client, auth_headers, date="2024-01-16").headers["etag"]
+
+        moved = client.put(
+            f"/api/calendly/appointments/{appointment_id}/reschedule",
+            json={
+                "appointment_id": appointment_id,
+                "appointment_type": "consultation",
+                "date": "2024-01-16",
+                "start_time": "11:00",
+            },
+            headers=auth_headers,
+        )
+        assert moved.status_code == status.HTTP_200_OK
+
+        assert self._get(client, auth_headers, etag=etag).status_code == status.HTTP_200_OK
+        assert self._get(client, auth_headers, date="2024-01-16", etag=target).status_code == status.HTTP_200_OK
+
+        target = self._get(client, auth_headers, date="2024-01-16").headers["etag"]
+        deleted = client.delete(f"/api/calendly/appointments/{appointment_id}", headers=auth_headers)
+        assert deleted.status_code == status.HTTP_200_OK
+
+        assert self._get(client, auth_headers, date="2024-01-16", etag=target).status_code == status.HTTP_200_OK
+
+    def test_cache_clear_never_reuses_an_etag(self, client, auth_headers, empty_cache):
+        """Test that resetting the version counters also changes the ETag."""
+        etag = self._get(client, auth_headers).headers["etag"]
+
+        empty_cache.clear()
+
+        assert self._get(client, auth_headers, etag=etag).status_code == status.HTTP_200_OK
+
+    def test_if_none_match_lists_and_wildcard(self, client, auth_headers, empty_cache):
+        """Test that any listed tag, weak or strong, or * matches."""
+        etag = self._get(client, auth_headers).headers["etag"]
+        strong = etag.removeprefix("W/")
+
+        for header in (f'"other", {etag}', strong, "*"):
+            assert self._get(client, auth_headers, etag=header).status_code == status.HTTP_304_NOT_MODIFIED
+        assert self._get(client, auth_headers, etag='"other"').status_code == status.HTTP_200_OK
+
+    def test_all_types_endpoint_revalidates(self, client, auth_headers, empty_cache):
+        """Test that the multi-type endpoint honours If-None-Match too."""
+        path = "/api/calendly/availability/types"
+        etag = self._get(client, auth_headers, path=path).headers["etag"]
+
+        assert self._get(client, auth_headers, etag=etag, path=path).status_code == status.HTTP_304_NOT_MODIFIED
+        self._book(client, auth_headers)
+        assert self._get(client, auth_headers, etag=etag, path=path).status_code == status.HTTP_200_OK
+
+    def test_invalid_input_is_rejected_before_revalidation(self, client, auth_headers, empty_cache):
+        """Test that a wildcard If-None-Match still gets 400 for a bad date or type."""
+        for path in ("/api/calendly/availability", "/api/calendly/availability/types"):
+            response = self._get(client, auth_headers, date="15-01-2024", etag="*", path=path)
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        bad_type = client.get(
+            "/api/calendly/availability/types",
+            params={"date": "2024-01-15", "appointment_types": "surgery"},
+            headers={**auth_headers, "If-None-Match": "*"},
+        )
+        assert bad_type.status_code == status.HTTP_400_BAD_REQUEST
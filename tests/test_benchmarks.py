@@ -0,0 +1,102 @@
+"""
+Tests for the tools-layer benchmark suite.
+"""
+import io
+import json
+
+from backend.db import database
+from benchmarks import load, suite
+
+OPERATIONS = {
+    "storage.save",
+    "storage.load",
+    "generate_daily_slots",
+    "generate_daily_slots.cached",
+    "generate_slots_by_type",
+    "slot_is_free",
+    "book_appointment",
+    "reschedule_appointment",
+    "delete_appointment",
+}
+
+
+class TestBenchmarkSuite:
+    """Test cases for running and comparing benchmark results."""
+
+    def test_parse_size(self):
+        """Test the k/M size suffixes."""
+        assert suite.parse_size("1k") == 1_000
+        assert suite.parse_size("100K") == 100_000
+        assert suite.parse_size("1M") == 1_000_000
+        assert suite.parse_size("250") == 250
+
+    def test_run_writes_results_and_leaves_store_alone(
+        self, mock_appointments_file, mock_schedule_file, tmp_path
+    ):
+        """Test that a small run times every operation in its own store."""
+        output = tmp_path / "results.json"
+
+        assert suite.main(
+            ["run", "--sizes", "200", "--storage", "json", "--calls", "3", "--repeat", "1", "--output", str(output)]
+        ) == 0
+
+        results = json.loads(output.read_text())
+        assert results["storage"] == "json"
+        timings = results["results"]["200"]["timings"]
+        assert set(timings) == OPERATIONS
+        memory = results["results"]["200"]["memory"]
+        assert 0 < memory["record_bytes"] < memory["dict_bytes"]
+        assert timings["book_appointment"]["calls"] == 3
+        assert database.DB_PATH == mock_appointments_file
+        assert json.loads(mock_appointments_file.read_text()) == []
+
+    def test_compare_flags_regressions(self):
+        """Test that a median growing past the threshold fails the comparison."""
+        def results(median):
+            return {"results": {"1000": {"timings": {"book_appointment": {"median_ms": median}}}}}
+
+        out = io.StringIO()
+        assert suite.compare(results(1.0), results(1.1), threshold=1.2, out=out)
+        assert not suite.compare(results(1.0), results(1.5), threshold=1.2, out=out)
+        assert "REGRESSION" in out.getvalue()
+
+
+class TestLoadGenerator:
+    """Test cases for the end-to-end load generator."""
+
+    def test_find_overlaps_sees_past_neighbours(self):
+        """Test that a long booking overlapping a later one is reported."""
+        def appt(appt_id, start, end):
+            return {"id": appt_id, "date": "2031-01-06", "start_time": start, "end_time": end}
+
+        appointments = [appt("LONG", "09:00", "10:00"), appt("A", "09:00", "09:15"), appt("B", "09:30", "09:45")]
+
+        assert load.find_overlaps(appointments) == [("A", "LONG"), ("LONG", "B")]
+        assert load.find_overlaps([appt("A", "09:00", "09:15"), appt("B", "09:15", "09:30")]) == []
+
+    def test_contended_run_has_no_double_bookings(
+        self, mock_appointments_file, mock_schedule_file, revocation_list
+    ):
+        """Test that concurrent clients on one day never end up overlapping."""
+        import asyncio
+
+        import httpx
+
+        from backend.main import app
+
+        report = asyncio.run(
+            load.run_load(
+                "http://test",
+                clients=8,
+                duration=60,
+                max_requests=25,
+                days=1,
+                transport=httpx.ASGITransport(app=app),
+            )
+        )
+
+        assert report["routes"]["POST /api/auth/login"]["statuses"]["200"] >= 8
+        assert report["routes"]["POST /api/calendly/book"]["requests"] > 0
+        check = load.check_bookings(report["confirmed"], database.load_appointments())
+        assert check["ok"], check
+        assert len(report["confirmed"]) == len(database.load_appointments())
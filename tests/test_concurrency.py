@@ -0,0 +1,152 @@
+"""
+Stress tests for concurrent booking across threads and worker processes.
+"""
+import multiprocessing
+import random
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+import pytest
+
+from backend.db import database
+from backend.tools.booking_tool import book_appointment
+from backend.utils.time_utils import to_minutes
+from tests.conftest import make_booking
+
+STORAGE_MODES = ["json", "journal", "sharded", "sql"]
+
+
+def _try_book(date: str, start_time: str):
+    try:
+        return book_appointment(make_booking(date, start_time))["id"]
+    except ValueError:
+        return None
+
+
+def _overlaps(appointments: list) -> list:
+    by_date = defaultdict(list)
+    for appt in appointments:
+        by_date[appt["date"]].append(
+            (to_minutes(appt["start_time"]), to_minutes(appt["end_time"]), appt["id"])
+        )
+    clashes = []
+    for intervals in by_date.values():
+        intervals.sort()
+        for prev, cur in zip(intervals, intervals[1:]):
+            if cur[0] < prev[1]:
+                clashes.append((prev[2], cur[2]))
+    return clashes
+
+
+def _reload_from_disk(monkeypatch) -> list:
+    monkeypatch.setattr(database, "_store", None)
+    return database.load_appointments()
+
+
+@pytest.fixture(params=STORAGE_MODES)
+def storage_mode(request, mock_appointments_file, test_db_dir, monkeypatch):
+    """Run against each storage backend on fresh files."""
+    monkeypatch.setattr(database, "STORAGE_MODE", request.param)
+    monkeypatch.setattr(
+        database, "DATABASE_URL", f"sqlite:///{test_db_dir / 'appointments.sqlite3'}"
+    )
+    database.get_store().load()
+    return request.param
+
+
+def _worker(db_path, mode, url, contested, own_date, results):
+    database.DB_PATH = Path(db_path)
+    database.STORAGE_MODE = mode
+    database.DATABASE_URL = url
+    database._store = None
+    booked = []
+    for date, start in contested:
+        booked.append(_try_book(date, start))
+    for hour in range(9, 17):
+        booked.append(_try_book(own_date, f"{hour:02}:00"))
+    results.put([b for b in booked if b])
+
+
+class TestThreadedBooking:
+    """Concurrent bookings from threads within one worker."""
+
+    def test_same_slot_is_booked_once(self, storage_mode, monkeypatch):
+        """Test that racing threads cannot double-book one slot."""
+        threads = 24
+        barrier = threading.Barrier(threads)
+        results = []
+
+        def run():
+            barrier.wait()
+            results.append(_try_book("2024-03-04", "10:00"))
+
+        workers = [threading.Thread(target=run) for _ in range(threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+        assert len([r for r in results if r]) == 1
+        assert len(_reload_from_disk(monkeypatch)) == 1
+
+    def test_no_lost_updates(self, storage_mode, monkeypatch):
+        """Test that parallel bookings on different dates all persist."""
+        threads = 24
+        barrier = threading.Barrier(threads)
+        results = []
+
+        def run(day):
+            barrier.wait()
+            for hour in (9, 10, 11):
+                results.append(_try_book(f"2024-04-{day:02}", f"{hour:02}:00"))
+
+        workers = [threading.Thread(target=run, args=(d + 1,)) for d in range(threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+        assert all(results)
+        stored = _reload_from_disk(monkeypatch)
+        assert sorted(a["id"] for a in stored) == sorted(results)
+
+
+class TestMultiProcessBooking:
+    """Concurrent bookings from several worker processes sharing one store."""
+
+    def test_workers_never_double_book_or_lose_writes(self, storage_mode, mock_appointments_file, monkeypatch):
+        """Test that forked workers racing on shared slots stay consistent."""
+        ctx = multiprocessing.get_context("fork")
+        results = ctx.Queue()
+        contested = [("2024-05-06", f"{h:02}:{m:02}") for h in range(9, 17) for m in (0, 30)]
+        processes = []
+        for n in range(4):
+            order = contested[:]
+            random.Random(n).shuffle(order)
+            processes.append(
+                ctx.Process(
+                    target=_worker,
+                    args=(
+                        str(mock_appointments_file),
+                        storage_mode,
+                        database.DATABASE_URL,
+                        order,
+                        f"2024-06-{n + 1:02}",
+                        results,
+                    ),
+                )
+            )
+        for p in processes:
+            p.start()
+        booked = [appt_id for _ in processes for appt_id in results.get(timeout=60)]
+        for p in processes:
+            p.join(timeout=60)
+            assert p.exitcode == 0
+
+        stored = _reload_from_disk(monkeypatch)
+
+        assert _overlaps(stored) == []
+        assert sorted(a["id"] for a in stored) == sorted(booked)
+        assert len([a for a in stored if a["date"] == "2024-05-06"]) == len(contested)
+        assert len(stored) == len(contested) + 4 * 8
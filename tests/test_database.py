@@ -0,0 +1,586 @@
+"""
+Tests for the appointment storage layer.
+"""
+import json
+import os
+import time
+
+import pytest
+
+from backend.db import database
+from backend.db.index import DateIndex
+from backend.db.record import Appointment, day_ordinal
+from backend.db.storage import SlotUnavailableError
+from tests.conftest import make_appointment
+
+
+def _record(appt_id: str, **kwargs) -> Appointment:
+    return Appointment.from_dict(make_appointment(appt_id, **kwargs))
+
+
+DAY = day_ordinal("2024-01-15")
+
+
+class TestResidentStore:
+    """Test cases for the process-resident appointment store."""
+
+    def test_reads_are_served_from_memory(self, mock_appointments_file, monkeypatch):
+        """Test that the file is parsed once and not on every load."""
+        calls = []
+        original = database._read_json
+
+        def counting_read(path):
+            calls.append(path)
+            return original(path)
+
+        monkeypatch.setattr(database, "_read_json", counting_read)
+        monkeypatch.setattr(database, "_store", None)
+
+        for _ in range(5):
+            assert database.load_appointments() == []
+
+        assert len(calls) == 1
+
+    def test_save_writes_through(self, mock_appointments_file):
+        """Test that saved appointments reach the file and the memory copy."""
+        database.save_appointments([make_appointment("APPT-1")])
+
+        on_disk = json.loads(mock_appointments_file.read_text())
+        assert [a["id"] for a in on_disk] == ["APPT-1"]
+        assert [a["id"] for a in database.load_appointments()] == ["APPT-1"]
+
+    def test_external_change_is_picked_up(self, mock_appointments_file):
+        """Test that a change made by another writer triggers a reload."""
+        assert database.load_appointments() == []
+
+        mock_appointments_file.write_text(json.dumps([make_appointment("APPT-EXT")]))
+        st = mock_appointments_file.stat()
+        os.utime(mock_appointments_file, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+        assert [a["id"] for a in database.load_appointments()] == ["APPT-EXT"]
+
+    def test_load_returns_a_copy(self, mock_appointments_file):
+        """Test that mutating the returned list does not leak into the store."""
+        appointments = database.load_appointments()
+        appointments.append(make_appointment("APPT-LEAK"))
+
+        assert database.load_appointments() == []
+
+
+class TestJournalStorage:
+    """Test cases for the append-only journal storage mode."""
+
+    @pytest.fixture
+    def journal_store(self, mock_appointments_file, monkeypatch):
+        """Switch the database module to journal mode on a fresh store."""
+        monkeypatch.setattr(database, "STORAGE_MODE", "journal")
+        return database.get_store()
+
+    def test_mutations_append_to_journal(self, journal_store, mock_appointments_file):
+        """Test that each mutation appends a line and leaves the snapshot alone."""
+        snapshot_before = mock_appointments_file.read_text()
+
+        database.upsert_appointment(make_appointment("APPT-1"))
+        database.upsert_appointment(
+            make_appointment("APPT-2", start_time="11:00", end_time="11:30")
+        )
+        database.remove_appointment("APPT-1")
+
+        journal = journal_store.storage.journal_path.read_text().splitlines()
+        assert len(journal) == 3
+        assert mock_appointments_file.read_text() == snapshot_before
+        assert [a["id"] for a in database.load_appointments()] == ["APPT-2"]
+
+    def test_journal_is_replayed_on_load(self, journal_store, monkeypatch):
+        """Test that a fresh process sees snapshot plus journal records."""
+        database.upsert_appointment(make_appointment("APPT-1"))
+        database.upsert_appointment(
+            make_appointment("APPT-2", start_time="11:00", end_time="11:30")
+        )
+
+        monkeypatch.setattr(database, "_store", None)
+        assert sorted(a["id"] for a in database.load_appointments()) == ["APPT-1", "APPT-2"]
+
+    def test_torn_record_is_ignored(self, journal_store, monkeypatch):
+        """Test that a partially written final record does not break loading."""
+        database.upsert_appointment(make_appointment("APPT-1"))
+        with journal_store.storage.journal_path.open("ab") as f:
+            f.write(b'{"op":"put","appointment":{"id":"APPT-TO')
+
+        monkeypatch.setattr(database, "_store", None)
+        assert [a["id"] for a in database.load_appointments()] == ["APPT-1"]
+
+        database.upsert_appointment(
+            make_appointment("APPT-2", start_time="11:00", end_time="11:30")
+        )
+        monkeypatch.setattr(database, "_store", None)
+        assert sorted(a["id"] for a in database.load_appointments()) == ["APPT-1", "APPT-2"]
+
+    def test_compaction_folds_journal_into_snapshot(self, journal_store, mock_appointments_file):
+        """Test that compaction writes the snapshot and empties the journal."""
+        database.upsert_appointment(make_appointment("APPT-1"))
+        database.upsert_appointment(
+            make_appointment("APPT-2", start_time="11:00", end_time="11:30")
+        )
+
+        journal_store.compact()
+
+        assert journal_store.storage.journal_path.read_text() == ""
+        snapshot = json.loads(mock_appointments_file.read_text())
+        assert sorted(a["id"] for a in snapshot) == ["APPT-1", "APPT-2"]
+
+    def test_compaction_respects_threshold(self, journal_store):
+        """Test that compaction is skipped below the record threshold."""
+        database.upsert_appointment(make_appointment("APPT-1"))
+
+        journal_store.compact(min_records=10)
+
+        assert journal_store.storage.pending() == 1
+
+
+class TestShardedStorage:
+    """Test cases for the per-month sharded storage mode."""
+
+    @pytest.fixture
+    def shard_dir(self, mock_appointments_file, monkeypatch):
+        """Switch the database module to sharded mode on fresh files."""
+        monkeypatch.setattr(database, "STORAGE_MODE", "sharded")
+        return mock_appointments_file.parent / "shards"
+
+    def _fresh_storage(self, shard_dir):
+        from backend.db.shards import ShardedStorage
+
+        storage = ShardedStorage(shard_dir)
+        storage.load()
+        return storage
+
+    def test_write_touches_only_its_month(self, shard_dir):
+        """Test that a booking rewrites its own shard and the manifest only."""
+        database.upsert_appointment(make_appointment("JAN"))
+        database.upsert_appointment(make_appointment("FEB", date="2024-02-01"))
+        january = (shard_dir / "2024-01.json").stat().st_mtime_ns
+        os.utime(shard_dir / "2024-01.json", ns=(january - 10**9, january - 10**9))
+
+        database.upsert_appointment(
+            make_appointment(
+                "FEB-2", date="2024-02-01", start_time="11:00", end_time="11:30"
+            )
+        )
+
+        assert (shard_dir / "2024-01.json").stat().st_mtime_ns == january - 10**9
+        manifest = json.loads((shard_dir / "manifest.json").read_text())
+        assert manifest["shards"] == {
+            "2024-01": {"count": 1, "version": 1},
+            "2024-02": {"count": 2, "version": 2},
+        }
+
+    def test_reads_load_only_the_requested_month(self, shard_dir, monkeypatch):
+        """Test that a fresh store reads a shard only when a date needs it."""
+        database.upsert_appointment(make_appointment("JAN"))
+        database.upsert_appointment(make_appointment("FEB", date="2024-02-01"))
+        monkeypatch.setattr(database, "_store", None)
+        storage = database.get_store().storage
+        read = []
+        original = storage._read_shard
+        monkeypatch.setattr(storage, "_read_shard", lambda key: read.append(key) or original(key))
+
+        assert [a["id"] for a in database.appointments_on("2024-02-01")] == ["FEB"]
+        assert database.appointments_on("2024-02-02") == []
+        assert read == ["2024-02"]
+
+        assert sorted(a["id"] for a in database.load_appointments()) == ["FEB", "JAN"]
+        assert read == ["2024-02", "2024-01"]
+
+    def test_other_writers_are_polled_per_shard(self, shard_dir):
+        """Test that another worker's write reaches this store, moves included."""
+        database.upsert_appointment(make_appointment("APPT-1"))
+        assert database.appointments_on("2024-01-15") != []
+        other = self._fresh_storage(shard_dir)
+        other.fetch(None)
+
+        database.get_store().lock.bump()
+        other.write([("put", make_appointment("APPT-1", date="2024-02-01"))], [])
+
+        assert database.appointments_on("2024-01-15") == []
+        assert [a["id"] for a in database.appointments_on("2024-02-01")] == ["APPT-1"]
+        assert not (shard_dir / "2024-01.json").exists()
+
+    def test_reschedule_moves_between_shards(self, shard_dir):
+        """Test that moving a booking to another month leaves no copy behind."""
+        database.upsert_appointment(make_appointment("APPT-1"))
+
+        database.replace_appointment(make_appointment("APPT-1", date="2024-03-04"))
+
+        storage = self._fresh_storage(shard_dir)
+        assert [appt["id"] for _, appt in storage.fetch(None)] == ["APPT-1"]
+        assert sorted(p.name for p in shard_dir.glob("2024-*.json")) == ["2024-03.json"]
+
+    def _count_reads(self, monkeypatch):
+        monkeypatch.setattr(database, "_store", None)
+        storage = database.get_store().storage
+        read = []
+        original = storage._read_shard
+        monkeypatch.setattr(
+            storage, "_read_shard", lambda key: read.append(key) or original(key)
+        )
+        return read
+
+    def test_id_lookups_load_only_their_month(self, shard_dir, monkeypatch):
+        """Test that a fresh worker finds, moves and deletes by id via one shard."""
+        for month in range(1, 7):
+            date = f"2024-0{month}-03"
+            database.upsert_appointment(make_appointment(f"M{month}", date=date))
+        read = self._count_reads(monkeypatch)
+
+        assert database.get_appointment("M2")["date"] == "2024-02-03"
+        assert database.get_appointment("UNKNOWN") is None
+        assert read == ["2024-02"]
+
+        assert database.replace_appointment(make_appointment("M3", date="2024-02-05"))
+        assert database.remove_appointment("M4")["id"] == "M4"
+        assert database.remove_appointment("UNKNOWN") is None
+        # Writes re-read the shards they rewrite; no other month is touched
+        assert sorted(set(read)) == ["2024-02", "2024-03", "2024-04"]
+
+        read = self._count_reads(monkeypatch)
+        assert database.get_appointment("M3")["date"] == "2024-02-05"
+        assert database.get_appointment("M4") is None
+        assert read == ["2024-02"]
+
+    def test_other_writers_ids_are_found(self, shard_dir, monkeypatch):
+        """Test that ids another worker adds or moves are found in their new month."""
+        database.upsert_appointment(make_appointment("JAN"))
+        database.upsert_appointment(make_appointment("FEB", date="2024-02-01"))
+        read = self._count_reads(monkeypatch)
+        assert database.get_appointment("FEB")["id"] == "FEB"
+
+        other = self._fresh_storage(shard_dir)
+        other.fetch(None)
+        database.get_store().lock.bump()
+        other.write(
+            [
+                ("put", make_appointment("NEW", date="2024-03-01")),
+                ("put", make_appointment("JAN", date="2024-04-01")),
+            ],
+            [],
+        )
+
+        assert database.get_appointment("NEW")["date"] == "2024-03-01"
+        assert database.get_appointment("JAN")["date"] == "2024-04-01"
+        assert read == ["2024-02", "2024-03", "2024-04"]
+
+    def test_shards_without_id_log_fall_back(self, shard_dir, monkeypatch):
+        """Test that shards older than the id log load fully until the next write."""
+        database.upsert_appointment(make_appointment("JAN"))
+        database.upsert_appointment(make_appointment("FEB", date="2024-02-01"))
+        for path in shard_dir.glob("ids-*.ndjson"):
+            path.unlink()
+        read = self._count_reads(monkeypatch)
+
+        assert database.get_appointment("FEB")["id"] == "FEB"
+        assert sorted(read) == ["2024-01", "2024-02"]
+
+        database.upsert_appointment(make_appointment("MAR", date="2024-03-01"))
+        read = self._count_reads(monkeypatch)
+        assert database.get_appointment("JAN")["id"] == "JAN"
+        assert read == ["2024-01"]
+
+    def test_legacy_file_is_migrated(self, shard_dir, mock_appointments_file):
+        """Test that an existing appointments.json is split on first load."""
+        mock_appointments_file.write_text(
+            json.dumps(
+                [make_appointment("JAN"), make_appointment("FEB", date="2024-02-01")]
+            )
+        )
+
+        assert sorted(a["id"] for a in database.load_appointments()) == ["FEB", "JAN"]
+        assert sorted(p.name for p in shard_dir.glob("2024-*.json")) == [
+            "2024-01.json",
+            "2024-02.json",
+        ]
+
+    def test_save_all_starts_a_new_epoch(self, shard_dir):
+        """Test that replacing everything makes other workers drop old data."""
+        database.upsert_appointment(make_appointment("OLD"))
+        other = self._fresh_storage(shard_dir)
+        other.fetch(None)
+
+        database.save_appointments([make_appointment("NEW", date="2024-05-01")])
+
+        assert other.poll() == [("reset", [])]
+        assert [appt["id"] for _, appt in other.fetch(None)] == ["NEW"]
+        assert not (shard_dir / "2024-01.json").exists()
+
+
+class TestAppointmentRecord:
+    """Test cases for the compact in-memory appointment record."""
+
+    def test_round_trip(self):
+        """Test that a record converts back to the same dict."""
+        appt = make_appointment("APPT-1", start_time="09:45", end_time="10:15")
+        record = Appointment.from_dict(appt)
+
+        assert (record.day, record.start, record.end) == (DAY, 585, 615)
+        assert record.date == "2024-01-15"
+        assert record.to_dict() == appt
+
+    def test_records_compare_by_value_and_are_unhashable(self):
+        """Test that equal records compare equal but cannot be hashed."""
+        appt = make_appointment("APPT-1")
+
+        assert Appointment.from_dict(appt) == Appointment.from_dict(appt)
+        with pytest.raises(TypeError):
+            hash(Appointment.from_dict(appt))
+
+    def test_unknown_keys_survive(self):
+        """Test that keys outside the known format are not dropped."""
+        appt = dict(make_appointment("APPT-1"), source="import")
+        appt["patient"] = dict(appt["patient"], dob="1990-01-01")
+
+        assert Appointment.from_dict(appt).to_dict() == appt
+
+    def test_malformed_date_is_rejected(self):
+        """Test that records can only be built for real dates."""
+        with pytest.raises(ValueError):
+            Appointment.from_dict(make_appointment("APPT-1", date="2024-02-30"))
+
+    def test_store_keeps_records(self, mock_appointments_file):
+        """Test that the store holds slotted records and returns dicts."""
+        database.upsert_appointment(make_appointment("APPT-1"))
+        store = database.get_store()
+
+        assert isinstance(store.get_record("APPT-1"), Appointment)
+        assert not hasattr(store.get_record("APPT-1"), "__dict__")
+        assert database.get_appointment("APPT-1") == make_appointment("APPT-1")
+        assert database.booked_intervals("not-a-date") == []
+
+
+class TestDateIndex:
+    """Test cases for the per-date interval index."""
+
+    def test_adjacent_bookings_do_not_conflict(self):
+        """Test that touching intervals are not reported as overlaps."""
+        index = DateIndex()
+        index.add(_record("APPT-1", start_time="10:00", end_time="10:30"))
+
+        assert index.overlapping(DAY, 570, 600) == []
+        assert index.overlapping(DAY, 630, 660) == []
+        assert [i[2] for i in index.overlapping(DAY, 615, 645)] == ["APPT-1"]
+
+    def test_long_booking_starting_earlier_is_found(self):
+        """Test that a long interval starting well before the query is caught."""
+        index = DateIndex()
+        index.add(_record("APPT-LONG", start_time="09:00", end_time="10:00"))
+        index.add(_record("APPT-SHORT", start_time="09:40", end_time="09:50"))
+
+        found = index.overlapping(DAY, 575, 580)
+
+        assert [i[2] for i in found] == ["APPT-LONG"]
+
+    def test_other_dates_are_ignored(self):
+        """Test that bookings on other dates never conflict."""
+        index = DateIndex()
+        index.add(_record("APPT-1", date="2024-01-16"))
+
+        assert index.overlapping(DAY, 600, 630) == []
+
+    def test_remove(self):
+        """Test that removed bookings stop conflicting."""
+        index = DateIndex()
+        appt = _record("APPT-1")
+        index.add(appt)
+        index.remove(appt)
+
+        assert index.overlapping(DAY, 600, 630) == []
+        assert index.day(DAY) == []
+
+    def test_occupancy_marks_booked_minutes(self):
+        """Test that the bitset has exactly the booked minutes set."""
+        index = DateIndex()
+        index.add(_record("APPT-1", start_time="10:00", end_time="10:30"))
+
+        occupancy = index.occupancy(DAY)
+        assert [minute for minute in range(24 * 60) if occupancy >> minute & 1] == list(range(600, 630))
+        assert index.occupancy(DAY + 1) == 0
+
+    def test_removing_overlapping_booking_keeps_the_other(self):
+        """Test that minutes shared with a remaining booking stay busy."""
+        index = DateIndex()
+        first = _record("APPT-1", start_time="10:00", end_time="10:30")
+        index.add(first)
+        index.add(_record("APPT-2", start_time="10:15", end_time="10:45"))
+        index.remove(first)
+
+        assert index.is_free(DAY, 600, 615)
+        assert not index.is_free(DAY, 615, 630)
+        assert index.occupancy(DAY) == ((1 << 30) - 1) << 615
+
+    def test_is_free_excludes_id(self):
+        """Test that the booking being moved doesn't block itself."""
+        index = DateIndex()
+        index.add(_record("APPT-1", start_time="10:00", end_time="10:30"))
+        index.add(_record("APPT-2", start_time="10:30", end_time="11:00"))
+
+        assert not index.is_free(DAY, 600, 630)
+        assert index.is_free(DAY, 600, 630, exclude_id="APPT-1")
+        assert not index.is_free(DAY, 615, 645, exclude_id="APPT-1")
+        assert index.is_free(DAY, 570, 600)
+
+    def test_store_conflicts_exclude_id(self, mock_appointments_file):
+        """Test that the store can ignore the appointment being rescheduled."""
+        database.upsert_appointment(make_appointment("APPT-1"))
+
+        assert [a["id"] for a in database.find_conflicts("2024-01-15", 600, 630)] == ["APPT-1"]
+        assert database.find_conflicts("2024-01-15", 600, 630, exclude_id="APPT-1") == []
+
+    def test_store_index_follows_reschedule(self, mock_appointments_file):
+        """Test that replacing an appointment moves it in the index."""
+        database.upsert_appointment(make_appointment("APPT-1"))
+        database.upsert_appointment(make_appointment("APPT-1", date="2024-01-16"))
+
+        assert database.appointments_on("2024-01-15") == []
+        assert [a["id"] for a in database.appointments_on("2024-01-16")] == ["APPT-1"]
+
+
+class TestSqlStorage:
+    """Test cases for the SQLAlchemy storage backend on SQLite."""
+
+    @pytest.fixture
+    def sql_url(self, test_db_dir, monkeypatch):
+        """Point the database module at a fresh SQLite file in sql mode."""
+        url = f"sqlite:///{test_db_dir / 'appointments.sqlite3'}"
+        monkeypatch.setattr(database, "STORAGE_MODE", "sql")
+        monkeypatch.setattr(database, "DATABASE_URL", url)
+        return url
+
+    def _fresh_storage(self, url):
+        from backend.db.sql_storage import SqlStorage, make_engine
+
+        return SqlStorage(make_engine(url, 1, 0), database.APPOINTMENT_TYPES)
+
+    def test_round_trip(self, sql_url, monkeypatch):
+        """Test that appointments survive a reload from the database."""
+        database.upsert_appointment(make_appointment("APPT-1"))
+        database.upsert_appointment(make_appointment("APPT-2", date="2024-01-16"))
+        database.remove_appointment("APPT-1")
+
+        monkeypatch.setattr(database, "_store", None)
+        loaded = database.load_appointments()
+
+        assert loaded == [make_appointment("APPT-2", date="2024-01-16")]
+
+    def test_booking_ending_at_midnight(self, sql_url):
+        """Test that a 24:00 end time round-trips and still blocks overlaps."""
+        late = make_appointment("LATE", start_time="23:30", end_time="24:00")
+        database.upsert_appointment(late)
+
+        assert self._fresh_storage(sql_url).load() == [late]
+        with pytest.raises(SlotUnavailableError):
+            database.upsert_appointment(
+                make_appointment("CLASH", start_time="23:45", end_time="24:00")
+            )
+
+    def test_reschedule_updates_row(self, sql_url):
+        """Test that putting an existing id updates it in place."""
+        database.upsert_appointment(make_appointment("APPT-1"))
+        database.upsert_appointment(
+            make_appointment("APPT-1", start_time="11:00", end_time="11:30")
+        )
+
+        rows = self._fresh_storage(sql_url).load()
+
+        assert [(r["id"], r["start_time"]) for r in rows] == [("APPT-1", "11:00")]
+
+    def test_other_writers_are_polled_incrementally(self, sql_url):
+        """Test that a write through another connection reaches the store."""
+        assert database.load_appointments() == []
+        other = self._fresh_storage(sql_url)
+        other.load()
+
+        other.write([("put", make_appointment("APPT-OTHER"))], [])
+        assert [a["id"] for a in database.load_appointments()] == ["APPT-OTHER"]
+
+        other.write([("delete", "APPT-OTHER")], [])
+        assert database.load_appointments() == []
+
+    def test_save_all_replaces_rows(self, sql_url):
+        """Test that save_appointments replaces the table contents."""
+        database.upsert_appointment(make_appointment("APPT-1"))
+        database.save_appointments(
+            [make_appointment("APPT-2", start_time="12:00", end_time="12:30")]
+        )
+
+        rows = self._fresh_storage(sql_url).load()
+
+        assert [r["id"] for r in rows] == ["APPT-2"]
+
+    def test_booking_api_in_sql_mode(self, sql_url, client, auth_headers):
+        """Test that the booking flow works end to end on the SQL backend."""
+        booking = {
+            "appointment_type": "general",
+            "date": "2024-01-15",
+            "start_time": "10:00",
+            "patient": {"name": "John Doe", "email": "john.doe@example.com", "phone": "1"},
+            "reason": "Checkup",
+        }
+
+        first = client.post("/api/calendly/book", json=booking, headers=auth_headers)
+        second = client.post("/api/calendly/book", json=booking, headers=auth_headers)
+
+        assert first.status_code == 200
+        assert second.status_code == 400
+        rows = self._fresh_storage(sql_url).load()
+        assert [r["id"] for r in rows] == [first.json()["booking_id"]]
+
+    def test_compaction_prunes_change_log(self, sql_url):
+        """Test that pruning keeps the newest change so polling can resume."""
+        from datetime import timedelta
+
+        from sqlalchemy import func, select
+
+        from backend.db.sql_storage import appointment_changes
+
+        database.upsert_appointment(make_appointment("APPT-1"))
+        database.upsert_appointment(
+            make_appointment("APPT-2", start_time="12:00", end_time="12:30")
+        )
+        storage = database.get_store().storage
+        storage.change_retention = timedelta(seconds=-60)
+
+        database.get_store().compact()
+
+        with storage.engine.connect() as conn:
+            remaining = conn.execute(select(func.count()).select_from(appointment_changes)).scalar()
+        assert remaining == 1
+        assert storage.pending() == 0
+
+    def test_sql_mode_prunes_without_the_journal_compactor(self, sql_url, monkeypatch):
+        """Test that sql mode runs the change-log pruner, not the compactor."""
+        from datetime import timedelta
+
+        from sqlalchemy import func, select
+
+        from backend.db.sql_storage import appointment_changes
+
+        monkeypatch.setattr(database, "SQL_PRUNE_INTERVAL", 0.01)
+        database.upsert_appointment(make_appointment("APPT-1"))
+        database.upsert_appointment(
+            make_appointment("APPT-2", start_time="12:00", end_time="12:30")
+        )
+        storage = database.get_store().storage
+        storage.change_retention = timedelta(seconds=-60)
+
+        assert database.start_compactor() is None
+        pruner = database.start_change_log_pruner()
+        try:
+            for _ in range(200):
+                with storage.engine.connect() as conn:
+                    remaining = conn.execute(
+                        select(func.count()).select_from(appointment_changes)
+                    ).scalar()
+                if remaining == 1:
+                    break
+                time.sleep(0.01)
+        finally:
+            pruner.stop()
+        assert remaining == 1
@@ -0,0 +1,97 @@
+"""
+Tests for the Prometheus metrics endpoint.
+"""
+from fastapi import status
+
+from backend.utils import metrics
+from backend.utils.metrics import Counter, Histogram, Registry
+
+
+def _sample(text: str, prefix: str) -> float:
+    """Value of the first exposition line starting with ``prefix``."""
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"no sample {prefix!r}")
+
+
+BOOKING = {
+    "appointment_type": "consultation",
+    "date": "2024-01-15",
+    "start_time": "10:00",
+    "patient": {"name": "John Doe", "email": "john.doe@example.com", "phone": "1"},
+    "reason": "Checkup",
+}
+
+
+class TestMetricTypes:
+    """Test cases for the in-process metric types."""
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that observations land in every bucket at or above them."""
+        registry = Registry()
+        histogram = registry.register(Histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0)))
+
+        histogram.observe(0.05, route="/a")
+        histogram.observe(0.1, route="/a")
+        histogram.observe(5.0, route="/a")
+
+        text = registry.render()
+        assert 'latency_seconds_bucket{route="/a",le="0.1"} 2' in text
+        assert 'latency_seconds_bucket{route="/a",le="1"} 2' in text
+        assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+        assert 'latency_seconds_count{route="/a"} 3' in text
+        assert "# TYPE latency_seconds histogram" in text
+
+    def test_label_values_are_escaped(self):
+        """Test that quotes and backslashes cannot break the exposition format."""
+        registry = Registry()
+        counter = registry.register(Counter("odd_total", "Odd labels."))
+
+        counter.inc(2, path='a"b\\c')
+
+        assert 'odd_total{path="a\\"b\\\\c"} 2' in registry.render()
+
+
+class TestMetricsEndpoint:
+    """Test cases for GET /metrics."""
+
+    def test_routes_are_labelled_by_template(self, client, auth_headers):
+        """Test that request latency is recorded per route template and status."""
+        labels = 'method="DELETE",route="/api/calendly/appointments/{appointment_id}",status="404"'
+        before = metrics.request_duration.count(
+            method="DELETE", route="/api/calendly/appointments/{appointment_id}", status=404
+        )
+
+        client.delete("/api/calendly/appointments/APPT-MISSING", headers=auth_headers)
+        response = client.get("/metrics")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert _sample(response.text, f"http_request_duration_seconds_count{{{labels}}}") == before + 1
+        assert "APPT-MISSING" not in response.text
+
+    def test_storage_and_store_metrics(self, client, auth_headers):
+        """Test that a booking shows up in storage timings, bytes and counts."""
+        written = metrics.storage_bytes.value(direction="write")
+
+        assert client.post("/api/calendly/book", json=BOOKING, headers=auth_headers).status_code == 200
+        text = client.get("/metrics").text
+
+        assert _sample(text, 'storage_operation_duration_seconds_count{backend="JsonFileStorage",op="write"}') >= 1
+        assert _sample(text, 'storage_bytes_total{direction="write"}') > written
+        assert _sample(text, 'appointments_resident{storage="json"}') == 1
+
+    def test_cache_hit_ratio(self, client, auth_headers):
+        """Test that availability cache hits are reflected in the hit ratio."""
+        from backend.tools.availability_tool import slot_cache
+
+        slot_cache.clear()
+        params = {"date": "2024-01-15", "appointment_type": "consultation"}
+        for _ in range(4):
+            client.get("/api/calendly/availability", params=params, headers=auth_headers)
+
+        text = client.get("/metrics").text
+
+        assert _sample(text, 'cache_hit_ratio{cache="availability"}') == 0.75
+        assert _sample(text, 'cache_hits{cache="token"}') >= 3
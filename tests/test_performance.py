@@ -0,0 +1,159 @@
+"""
+Correctness of the hot paths of the tools layer at scale.
+
+Tests that build large synthetic stores are marked ``slow``; deselect them
+with ``pytest -m "not slow"``. Timings are tracked by ``benchmarks.suite``.
+"""
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from backend.db import database
+from backend.tools.availability_tool import _day_slots_by_type, generate_daily_slots
+from backend.utils.time_utils import from_minutes
+from tests.conftest import make_appointment
+
+
+def _synthetic_appointments(count: int, days: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    first = date(2020, 1, 1)
+    appointments = []
+    for i in range(count):
+        start = rng.randrange(9 * 60, 17 * 60 - 15, 15)
+        appointments.append(
+            make_appointment(
+                f"APPT-{i:08d}",
+                date=(first + timedelta(days=rng.randrange(days))).isoformat(),
+                start_time=from_minutes(start),
+                end_time=from_minutes(start + 15),
+                appointment_type="followup",
+            )
+        )
+    return appointments
+
+
+def _nested_loop_slots(date_str: str, duration: int, appointments: list) -> list:
+    """The original slot generator: every slot scans every appointment."""
+    slots = []
+    current = 9 * 60
+    while current + duration <= 17 * 60:
+        s = f"{current // 60:02}:{current % 60:02}"
+        e = f"{(current + duration) // 60:02}:{(current + duration) % 60:02}"
+        available = True
+        for appt in appointments:
+            if appt["date"] != date_str:
+                continue
+            if not (appt["end_time"] <= s or appt["start_time"] >= e):
+                available = False
+        slots.append({"start_time": s, "end_time": e, "available": available})
+        current += duration
+    return slots
+
+
+@pytest.mark.slow
+class TestSlotGenerationAtScale:
+    """Slot generation against the nested-loop baseline on a large store."""
+
+    def test_slots_match_nested_loop_at_100k(
+        self, mock_appointments_file, mock_schedule_file
+    ):
+        """Test that slots with 100k stored appointments match the nested loop."""
+        appointments = _synthetic_appointments(100_000, days=2_000)
+        database.save_appointments(appointments)
+        target = appointments[0]["date"]
+
+        slots = generate_daily_slots(target, "followup")
+
+        assert slots == _nested_loop_slots(target, 15, appointments)
+
+
+class TestRecordRoundTrip:
+    """Slotted records against the dict format they replace.
+
+    Their memory per appointment is tracked by ``benchmarks.suite``.
+    """
+
+    def test_records_round_trip_to_the_same_dicts(self):
+        """Test that synthetic appointments survive a record round trip."""
+        from backend.db.record import Appointment
+
+        appointments = _synthetic_appointments(1_000, days=50)
+
+        records = [Appointment.from_dict(appt) for appt in appointments]
+
+        assert [record.to_dict() for record in records] == appointments
+
+
+def _dense_followups(day: str) -> list:
+    """Back-to-back 15-minute followups from 09:00 to 17:00, every fourth left free."""
+    return [
+        make_appointment(
+            f"DENSE-{i:03d}",
+            date=day,
+            start_time=from_minutes(start),
+            end_time=from_minutes(start + 15),
+            appointment_type="followup",
+        )
+        for i, start in enumerate(range(9 * 60, 17 * 60, 15))
+        if i % 4 != 3
+    ]
+
+
+def _string_scan_conflicts(appointments: list, day: str, start: str, end: str) -> bool:
+    """The original conflict check: compare HH:MM strings of every booking."""
+    return any(
+        appt["date"] == day
+        and not (appt["end_time"] <= start or appt["start_time"] >= end)
+        for appt in appointments
+    )
+
+
+class TestOccupancyBitsets:
+    """Occupancy bitsets agree with string-comparison scans on a dense day.
+
+    Their timings are tracked by ``benchmarks.suite`` (``slot_is_free`` and
+    ``generate_slots_by_type``).
+    """
+
+    def test_masked_conflict_checks_match_string_scan(self):
+        """Test that bitset conflict checks on dense 15-minute followups are exact."""
+        from backend.db.index import DateIndex
+        from backend.db.record import Appointment
+
+        day = "2024-01-15"
+        appointments = _dense_followups(day)
+        index = DateIndex()
+        for appt in appointments:
+            index.add(Appointment.from_dict(appt))
+        ordinal = Appointment.from_dict(appointments[0]).day
+        candidates = [
+            (start, start + duration)
+            for duration in database.APPOINTMENT_TYPES.values()
+            for start in range(9 * 60, 17 * 60 - duration + 1, 15)
+        ]
+
+        expected = [
+            _string_scan_conflicts(appointments, day, from_minutes(s), from_minutes(e))
+            for s, e in candidates
+        ]
+        found = [not index.is_free(ordinal, s, e) for s, e in candidates]
+
+        assert found == expected
+        assert any(found) and not all(found)
+
+    def test_all_types_from_one_bitset_match_string_scan(
+        self, mock_appointments_file, mock_schedule_file
+    ):
+        """Test that every type's slots on a dense day match the nested-loop scan."""
+        day = "2024-01-15"
+        appointments = _dense_followups(day)
+        database.save_appointments(appointments)
+        types = database.APPOINTMENT_TYPES
+
+        slots = _day_slots_by_type(day, database.get_schedule(), types)
+
+        assert slots == {
+            name: _nested_loop_slots(day, duration, appointments)
+            for name, duration in types.items()
+        }
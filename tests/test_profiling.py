@@ -0,0 +1,133 @@
+"""
+Tests for the opt-in request profiling middleware.
+"""
+import cProfile
+import json
+import pstats
+
+import pytest
+
+from backend.utils import profiling
+
+BOOKING = {
+    "appointment_type": "consultation",
+    "date": "2024-01-15",
+    "start_time": "10:00",
+    "patient": {"name": "John Doe", "email": "john.doe@example.com", "phone": "1"},
+    "reason": "Checkup",
+}
+
+
+@pytest.fixture
+def profile_dir(test_db_dir, monkeypatch):
+    """Write profiles to a temporary directory and allow the admin user."""
+    directory = test_db_dir / "profiles"
+    monkeypatch.setattr(profiling, "PROFILE_DIR", directory)
+    monkeypatch.setattr(profiling, "PROFILE_USERS", {"admin"})
+    return directory
+
+
+class _OneProfilerAtATime(cProfile.Profile):
+    """A profiler that, like Python 3.12+, refuses to start beside another."""
+
+    active = 0
+
+    def enable(self, *args, **kwargs):
+        if _OneProfilerAtATime.active:
+            raise ValueError("Another profiling tool is already active")
+        _OneProfilerAtATime.active += 1
+        self.running = True
+        super().enable(*args, **kwargs)
+
+    def disable(self):
+        super().disable()
+        if getattr(self, "running", False):
+            self.running = False
+            _OneProfilerAtATime.active -= 1
+
+
+def _dump(directory, response) -> dict:
+    profile_id = response.headers["x-profile-id"]
+    return json.loads((directory / f"{profile_id}.json").read_text())
+
+
+class TestProfiling:
+    """Test cases for per-request profiles."""
+
+    def test_unrequested_requests_are_not_profiled(self, client, auth_headers, profile_dir):
+        """Test that requests without the header leave no trace."""
+        response = client.get(
+            "/api/calendly/availability",
+            params={"date": "2024-01-15", "appointment_type": "consultation"},
+            headers=auth_headers,
+        )
+
+        assert response.status_code == 200
+        assert "server-timing" not in response.headers
+        assert not profile_dir.exists()
+
+    def test_header_profiles_authorized_users(self, client, auth_headers, profile_dir):
+        """Test that X-Profile writes a dump with a per-layer breakdown."""
+        response = client.get(
+            "/api/calendly/availability",
+            params={"date": "2024-01-15", "appointment_type": "consultation"},
+            headers={**auth_headers, "X-Profile": "1"},
+        )
+
+        assert response.status_code == 200
+        timing = response.headers["server-timing"]
+        for name in ("storage", "slots", "jwt", "total"):
+            assert f"{name};dur=" in timing
+        dump = _dump(profile_dir, response)
+        assert dump["route"] == "/api/calendly/availability"
+        assert dump["status"] == 200
+        assert set(dump["layers_ms"]) == {"storage", "slots", "jwt", "other"}
+        assert dump["layers_ms"]["slots"] > 0
+        assert dump["layers_ms"]["jwt"] > 0
+        assert dump["top_functions"]
+        stats = pstats.Stats(str(profile_dir / f"{dump['id']}.prof"))
+        assert any(name == "generate_daily_slots" for _, _, name in stats.stats)
+
+    def test_offloaded_writes_are_profiled(self, client, auth_headers, profile_dir):
+        """Test that work on the storage write pool lands in the profile."""
+        response = client.post(
+            "/api/calendly/book", json=BOOKING, headers={**auth_headers, "X-Profile": "1"}
+        )
+
+        assert response.status_code == 200
+        dump = _dump(profile_dir, response)
+        assert dump["layers_ms"]["storage"] > 0
+        stats = pstats.Stats(str(profile_dir / f"{dump['id']}.prof"))
+        assert any(name == "book_appointment" for _, _, name in stats.stats)
+
+    def test_one_profiler_per_process(self, client, auth_headers, profile_dir, monkeypatch):
+        """Test that a profiled booking succeeds when only one profiler may run."""
+        monkeypatch.setattr(profiling.cProfile, "Profile", _OneProfilerAtATime)
+
+        response = client.post(
+            "/api/calendly/book", json=BOOKING, headers={**auth_headers, "X-Profile": "1"}
+        )
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "confirmed"
+        dump = _dump(profile_dir, response)
+        assert dump["event_loop_profiled"]
+        assert dump["layers_ms"]["storage"] > 0
+        assert _OneProfilerAtATime.active == 0
+
+    def test_header_is_ignored_for_other_users(self, client, auth_headers, profile_dir, monkeypatch):
+        """Test that only users in PROFILE_USERS can ask for a profile."""
+        monkeypatch.setattr(profiling, "PROFILE_USERS", {"someone-else"})
+
+        response = client.get("/", headers={**auth_headers, "X-Profile": "1"})
+
+        assert "x-profile-id" not in response.headers
+        assert not profile_dir.exists()
+
+    def test_sampling_needs_no_header(self, client, profile_dir, monkeypatch):
+        """Test that PROFILE_SAMPLE_RATE profiles requests on its own."""
+        monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+
+        response = client.get("/")
+
+        assert _dump(profile_dir, response)["path"] == "/"
@@ -0,0 +1,230 @@
+"""
+Tests for the NDJSON import/export CLI.
+"""
+import io
+import json
+from datetime import date
+
+import pytest
+
+from backend.db import database, transfer
+from backend.db.record import Appointment
+from backend.db.storage import SlotUnavailableError
+from tests.conftest import make_appointment
+from tests.test_concurrency import STORAGE_MODES, _overlaps
+
+
+def _row(appt_id: str, start: str = "10:00", **changes) -> dict:
+    # Import rows leave end_time to be derived from the appointment type
+    changes.setdefault("end_time", None)
+    return make_appointment(appt_id, start_time=start, **changes)
+
+
+def _record_calls(monkeypatch, name: str, calls: list, label=None) -> None:
+    """Wrap ``database.<name>`` to append the size of each batch it writes."""
+    original = getattr(database, name)
+
+    def wrapper(rows):
+        calls.append(len(rows) if label is None else (label, len(rows)))
+        return original(rows)
+
+    monkeypatch.setattr(database, name, wrapper)
+
+
+def _lines(rows) -> io.StringIO:
+    return io.StringIO("".join(json.dumps(row) + "\n" for row in rows))
+
+
+@pytest.fixture
+def store_files(mock_appointments_file, mock_schedule_file):
+    """Run against empty temporary store files."""
+    return mock_appointments_file
+
+
+class TestImportExport:
+    """Test cases for streaming appointments in and out."""
+
+    def test_round_trip(self, store_files):
+        """Test that exported rows import back unchanged."""
+        rows = [_row("A1", "09:00"), _row("A2", "10:00")]
+        assert transfer.import_ndjson(_lines(rows)) == (2, 0)
+
+        out = io.StringIO()
+        assert transfer.export_ndjson(out) == 2
+        exported = [json.loads(line) for line in out.getvalue().splitlines()]
+
+        assert [row["end_time"] for row in exported] == ["09:30", "10:30"]
+        database.save_appointments([])
+        transfer.import_ndjson(io.StringIO(out.getvalue()))
+        assert sorted(database.load_appointments(), key=lambda a: a["id"]) == exported
+
+    def test_export_streams_records(self, store_files, monkeypatch):
+        """Test that export encodes each record as it is read, never the full list."""
+        transfer.seed_store(50, date(2030, 1, 1), seed=3)
+        store = database.get_store()
+        monkeypatch.setattr(store, "all", lambda: pytest.fail("export built the full list"))
+        converted = []
+        to_dict = Appointment.to_dict
+        monkeypatch.setattr(
+            Appointment, "to_dict", lambda self: converted.append(self.id) or to_dict(self)
+        )
+        lines = []
+
+        class Out:
+            def write(self, line):
+                # Only the row being written has been converted so far
+                assert len(converted) == len(lines) + 1
+                lines.append(line)
+
+        assert transfer.export_ndjson(Out()) == 50
+        assert len(lines) == 50
+
+    def test_invalid_rows_are_skipped_and_reported(self, store_files):
+        """Test that bad rows are rejected with their line numbers."""
+        rows = [
+            _row("A1"),
+            _row("A2", patient={"name": "X", "email": "not-an-email", "phone": "1"}),
+            _row("A3", appointment_type="invalid_type"),
+            _row("A4", end_time="12:00"),
+            _row("", start="11:00"),
+            _row("A6", "23:45"),
+        ]
+        lines = io.StringIO(_lines(rows).getvalue() + "not json\n")
+        log = io.StringIO()
+
+        assert transfer.import_ndjson(lines, log=log) == (1, 6)
+        report = log.getvalue()
+        assert "line 2: patient.email" in report
+        assert "line 3: invalid appointment type" in report
+        assert "line 4: end_time does not match" in report
+        assert "line 5: missing id" in report
+        assert "line 6: appointment must end by midnight" in report
+        assert "line 7: not a JSON object" in report
+        assert [a["id"] for a in database.load_appointments()] == ["A1"]
+
+    def test_one_write_per_batch(self, store_files, monkeypatch):
+        """Test that imports write whole batches, not single rows."""
+        writes = []
+        store = database.get_store()
+        write = store.storage.write
+        monkeypatch.setattr(
+            store.storage, "write", lambda ops, appts: writes.append(len(ops)) or write(ops, appts)
+        )
+        rows = [_row(f"A{n}", f"{9 + n // 2:02}:{30 * (n % 2):02}") for n in range(5)]
+
+        transfer.import_ndjson(_lines(rows), batch_size=2)
+
+        assert writes == [2, 2, 1]
+
+    def test_replace_discards_existing(self, store_files):
+        """Test that --replace swaps the existing appointments for the file's."""
+        transfer.import_ndjson(_lines([_row("OLD")]))
+
+        transfer.import_ndjson(_lines([_row("NEW", "11:00")]), replace=True)
+
+        assert [a["id"] for a in database.load_appointments()] == ["NEW"]
+
+    def test_replace_streams_batches(self, store_files, monkeypatch):
+        """Test that --replace resets with the first batch and upserts the rest."""
+        transfer.import_ndjson(_lines([_row("OLD", "16:00")]))
+        calls = []
+        _record_calls(monkeypatch, "save_appointments", calls, "reset")
+        _record_calls(monkeypatch, "upsert_appointments", calls, "put")
+        rows = [_row(f"A{n}", f"{9 + n // 2:02}:{30 * (n % 2):02}") for n in range(5)]
+
+        imported = transfer.import_ndjson(_lines(rows), batch_size=2, replace=True)
+
+        assert imported == (5, 0)
+
+        assert calls == [("reset", 2), ("put", 2), ("put", 1)]
+        stored = sorted(a["id"] for a in database.load_appointments())
+        assert stored == [f"A{n}" for n in range(5)]
+
+    def test_overlapping_rows_are_rejected_in_every_mode(
+        self, store_files, test_db_dir, monkeypatch
+    ):
+        """Test that double bookings are reported by line, never stored or raised."""
+        for mode in STORAGE_MODES:
+            monkeypatch.setattr(database, "STORAGE_MODE", mode)
+            url = f"sqlite:///{test_db_dir / 'transfer.sqlite3'}"
+            monkeypatch.setattr(database, "DATABASE_URL", url)
+            monkeypatch.setattr(database, "_store", None)
+            database.save_appointments([])
+            transfer.import_ndjson(_lines([_row("STORED", "09:00")]))
+            rows = [
+                _row("A1", "10:00"),
+                _row("A2", "10:15"),            # overlaps line 1
+                _row("A3", "09:15"),            # overlaps the stored booking
+                _row("STORED", "11:00"),        # moving a booking never blocks itself
+                _row("A4", "09:00"),            # the slot STORED just left
+                _row("A5", "11:15"),            # overlaps STORED's new time
+            ]
+            log = io.StringIO()
+
+            imported = transfer.import_ndjson(_lines(rows), batch_size=3, log=log)
+
+            assert imported == (3, 3), mode
+            report = log.getvalue()
+            assert "line 2: overlaps an earlier row" in report, mode
+            assert "line 3: overlaps a stored appointment" in report, mode
+            assert "line 6: overlaps an earlier row" in report, mode
+            assert _overlaps(database.load_appointments()) == [], mode
+            stored = sorted(a["id"] for a in database.load_appointments())
+            assert stored == ["A1", "A4", "STORED"], mode
+
+    def test_rows_blocked_at_write_time_are_reported(self, store_files, monkeypatch):
+        """Test that a conflict raised by the storage write is reported per line."""
+        upsert = database.upsert_appointment
+
+        def fail_batch(rows):
+            raise SlotUnavailableError()
+
+        def fail_second(record):
+            if record["id"] == "A2":
+                raise SlotUnavailableError()
+            upsert(record)
+
+        monkeypatch.setattr(database, "upsert_appointments", fail_batch)
+        monkeypatch.setattr(database, "upsert_appointment", fail_second)
+        log = io.StringIO()
+
+        rows = [_row("A1", "09:00"), _row("A2", "10:00")]
+
+        assert transfer.import_ndjson(_lines(rows), log=log) == (1, 1)
+        assert "line 2: Time slot not available" in log.getvalue()
+
+
+class TestSeed:
+    """Test cases for synthetic data generation."""
+
+    def test_seeded_rows_are_valid_and_never_overlap(self, store_files):
+        """Test that generated rows pass import validation without clashes."""
+        out = io.StringIO()
+        assert transfer.seed_ndjson(500, out) == 500
+
+        out.seek(0)
+        assert transfer.import_ndjson(out) == (500, 0)
+        assert _overlaps(database.load_appointments()) == []
+
+    def test_seed_store_writes_batches(self, store_files, monkeypatch):
+        """Test that seeding writes one batch at a time."""
+        sizes = []
+        _record_calls(monkeypatch, "upsert_appointments", sizes)
+
+        assert transfer.seed_store(25, batch_size=10) == 25
+
+        assert sizes == [10, 10, 5]
+        assert len(database.load_appointments()) == 25
+
+    def test_cli_seeds_and_exports(self, store_files, tmp_path, capsys):
+        """Test the command line entry point end to end."""
+        path = tmp_path / "backup.ndjson"
+
+        assert transfer.main(["seed", "50"]) == 0
+        assert transfer.main(["export", str(path)]) == 0
+
+        assert len(path.read_text().splitlines()) == 50
+        assert "rows/s" in capsys.readouterr().err
+        database.save_appointments([])
+        assert transfer.main(["import", str(path), "--replace"]) == 0
+        assert len(database.load_appointments()) == 50